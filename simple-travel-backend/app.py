@@ -1,15 +1,31 @@
-from flask import Flask, request
+from flask import Flask, Response, g, request, stream_with_context
+from flask.logging import default_handler
 from flask_cors import CORS
+import hmac
 import json
 from dotenv import load_dotenv
 import os
+import threading
 import chat_config
+import filter_engine
+import filter_shards
+import listing_json
+import listings_store
+import llm_client
+import master_dataset
+import pagination
+import prompt_builder
+import query_cache
+import query_parser
+import ranking
+import rendered_responses
+import request_metrics
 import pandas as pd
-import re
-from langchain_core.output_parsers import StrOutputParser
+from collections import Counter
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
 
+
 app = Flask(__name__)
 load_dotenv()
 
@@ -20,159 +36,474 @@ else:
     CORS(app)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATASET_PATH = os.path.join(BASE_DIR, "clean", "dataset_airbnb-scraper_2024-04-26_08-50-51-029.csv")
+# The merged master snapshot (see master_dataset.py) once the transformer has built it, else the original single dump;
+# the store checks for the master on every freshness check, so one built after startup is picked up like a reload
+MASTER_DATASET_PATH = master_dataset.master_path_for(os.path.join(BASE_DIR, "clean"))
+LEGACY_DATASET_PATH = os.path.join(BASE_DIR, "clean", "dataset_airbnb-scraper_2024-04-26_08-50-51-029.csv")
+DATASET_PATH = os.getenv("DATASET_PATH") or MASTER_DATASET_PATH
 DEFAULT_MODEL = "llama-3.1-8b-instant"
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "20"))
+CHAT_MAX_PAGE_SIZE = int(os.getenv("CHAT_MAX_PAGE_SIZE", "100"))
+CHAT_COMPRESS_MIN_BYTES = int(os.getenv("CHAT_COMPRESS_MIN_BYTES", "1024"))
+CHAT_STREAM_CHUNK_SIZE = int(os.getenv("CHAT_STREAM_CHUNK_SIZE", "500"))
+# "relevant": describe the core and query-relevant columns in full and list the others by name; "full": describe all
+LLM_PROMPT_SCHEMA = os.getenv("LLM_PROMPT_SCHEMA", "relevant")
+# Free-text (cache / llm path) queries without sort_by are ordered by description similarity
+SEMANTIC_RANKING = os.getenv("SEMANTIC_RANKING", "1") == "1"
+# Queries with no other order (firstcall, rule-parsed, or without semantic ranking) are ranked by ranking.py's blend
+RECOMMENDED_RANKING = os.getenv("RECOMMENDED_RANKING", "1") == "1"
+# "auto", "exact" (brute force) or "ivf"
+SEMANTIC_SEARCH_MODE = os.getenv("SEMANTIC_SEARCH_MODE", "auto")
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "20"))
+SEARCH_MAX_LIMIT = 1000
+# Shared caches (Vercel's edge) may keep deterministic /chat GET responses this long; browsers revalidate with the ETag
+CHAT_CDN_MAX_AGE = int(os.getenv("CHAT_CDN_MAX_AGE", "300"))
+# firstcall page sizes rendered and compressed whenever a dataset loads ("all" for the unpaged response)
+FIRSTCALL_PRERENDER = [size.strip() for size in os.getenv("FIRSTCALL_PRERENDER", "10,20").split(",") if size.strip()]
+# One JSON log line per request (method, path, status, duration and per-stage timings)
+REQUEST_LOG = os.getenv("REQUEST_LOG", "1") == "1"
+# Level of the app log: the per-request lines are INFO, so WARNING keeps only the problems
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Braces in the JSON examples are escaped so LangChain only substitutes {context} and {query}
 LLM_PROMPT_TEMPLATE = (
-    chat_config.HOTEL_QUERY_PROMPT.replace("$context", "{context}").replace("$query", "{query}")
+    chat_config.HOTEL_QUERY_PROMPT.replace("{", "{{").replace("}", "}}")
+    .replace("$context", "{context}").replace("$query", "{query}")
 )
+app.logger.setLevel(LOG_LEVEL)
+default_handler.setLevel(LOG_LEVEL)
+# The listings store and filter shards log to their module loggers; they go out with the app log
+for module_logger in (listings_store.logger, filter_shards.logger):
+    module_logger.setLevel(LOG_LEVEL)
+    module_logger.addHandler(default_handler)
 query_chain = None
+# gthread workers serve requests on many threads: the first LLM queries may race to build the chain
+query_chain_lock = threading.Lock()
+listings_store_instance = listings_store.ListingsStore(
+    DATASET_PATH,
+    check_interval=float(os.getenv("DATASET_CHECK_INTERVAL", "5")),
+    watch=os.getenv("DATASET_WATCH", "1") == "1",
+    fallback_path=None if os.getenv("DATASET_PATH") else LEGACY_DATASET_PATH,
+)
+# Shared secret for /admin endpoints; they are disabled when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+query_cache_instance = query_cache.QueryCache(
+    maxsize=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("QUERY_CACHE_TTL", "3600")),
+    responses_maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "256")),
+)
+listings_store_instance.reload_listeners.append(query_cache_instance.on_dataset_reload)
+listings_store_instance.reload_listeners.append(lambda listings: prerender_firstcall(listings))
+# Which path produced the filter expression for each /chat query: rules, cache or llm
+query_path_counts = Counter()
+# Prompt size of LLM-path /chat requests: local estimate and the prompt_tokens Groq reports
+prompt_token_counts = Counter()
+# Guards both counters: Counter updates are read-modify-write, not atomic across request threads
+counts_lock = threading.Lock()
+# Groq calls run on a per-process event loop: deadline per call, bounded concurrency, identical queries coalesced
+llm_client_instance = llm_client.LLMClient(
+    lambda: get_query_chain(),
+    timeout=float(os.getenv("LLM_TIMEOUT", "20")),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+)
 
 
 def get_query_chain():
     global query_chain
-    if query_chain is None:
+    if query_chain is not None:
+        return query_chain
+    with query_chain_lock:
+        if query_chain is not None:
+            return query_chain
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise RuntimeError("GROQ_API_KEY is required for /chat queries other than firstcall.")
         llm = ChatGroq(
             model=os.getenv("GROQ_MODEL", DEFAULT_MODEL),
             api_key=api_key,
+            # Points the client at another Groq-compatible server, e.g. benchmarks/fake_llm.py
+            groq_api_base=os.getenv("GROQ_API_BASE") or None,
             max_tokens=1000,
             temperature=0,
         )
         prompt = ChatPromptTemplate.from_messages([("human", LLM_PROMPT_TEMPLATE)])
-        query_chain = prompt | llm | StrOutputParser()
+        query_chain = prompt | llm
         app.logger.info("Created LangChain query generator")
     return query_chain
 
+def count_query_path(query_path):
+    with counts_lock:
+        query_path_counts[query_path] += 1
+
 def load_original():
-    df = pd.read_csv(DATASET_PATH)
-
-    # List of columns expected to be numeric
-    numeric_columns = [
-        'bathroom_count',
-        'bed_count',
-        'bedroom_count',
-        'guestControls/personCapacity',
-        'idStr',
-        'maxNights',
-        'minNights',
-        'numberOfGuests',
-        'pricing/rate/amount'
+    return listings_store_instance.get()
+
+def admin_authorized():
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN)
+
+def collect_metrics():
+    # Values the caches, the LLM client and the listings store keep themselves, read at scrape time
+    cache = query_cache_instance.stats()
+    llm = llm_client_instance.stats()
+    listings = listings_store_instance.stats()
+    return [
+        ("query_cache_hits_total", "counter", "Query cache hits by level (filters or results).",
+         [({"level": level}, values["hits"]) for level, values in cache.items()]),
+        ("query_cache_misses_total", "counter", "Query cache misses by level (filters or results).",
+         [({"level": level}, values["misses"]) for level, values in cache.items()]),
+        ("query_cache_entries", "gauge", "Entries in the query cache by level.",
+         [({"level": level}, values["size"]) for level, values in cache.items()]),
+        ("llm_calls_total", "counter", "Groq calls by outcome; coalesced calls shared another call's answer.",
+         [({"outcome": outcome}, llm[outcome]) for outcome in ("calls", "coalesced", "timeouts", "errors")]),
+        ("llm_in_flight", "gauge", "Groq calls in flight.", [({}, llm["in_flight"])]),
+        ("listings_rows", "gauge", "Listings in the loaded dataset.", [({}, listings.get("rows"))]),
+        ("listings_version", "gauge", "Dataset version loaded by this process.", [({}, listings.get("version"))]),
+        ("listings_reload_errors_total", "counter", "Failed dataset reloads.", [({}, listings["reload_errors"])]),
+        ("process_resident_memory_bytes", "gauge", "Resident memory of this process.",
+         [({}, listings["process_rss_bytes"])]),
     ]
 
-    # Convert specified columns to numeric types
-    for col in numeric_columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+request_metrics.registry.collectors.append(collect_metrics)
 
-    return df
+@app.before_request
+def start_request_metrics():
+    profiler = request.headers.get("X-Profile", "").strip().lower() or None
+    g.profile_error = None
+    if profiler is not None and not admin_authorized():
+        g.profile_error, profiler = "X-Profile needs a valid X-Admin-Token", None
+    g.profile_error = request_metrics.start_request(profiler) or g.profile_error
 
-def strip_code_fences(text):
-    cleaned_text = text.strip()
-    if cleaned_text.startswith("```"):
-        cleaned_text = re.sub(r"^```(?:python)?\s*", "", cleaned_text, flags=re.IGNORECASE)
-        cleaned_text = re.sub(r"\s*```$", "", cleaned_text)
-    return cleaned_text.strip()
+@app.after_request
+def finish_request_metrics(response):
+    if g.get("profile_error"):
+        response.headers["X-Profile-Error"] = g.profile_error
+    return request_metrics.finish_request(
+        response, request.endpoint, request.method, request.path, app.logger if REQUEST_LOG else None
+    )
+
+def generate_filter(user_query, listings):
+    with request_metrics.stage("prompt"):
+        context = listings.prompt_schema.context(None if LLM_PROMPT_SCHEMA == "full" else user_query)
+        estimated_tokens = prompt_builder.estimate_tokens(LLM_PROMPT_TEMPLATE.format(context=context, query=user_query))
+    with request_metrics.stage("llm"):
+        message = llm_client_instance.invoke(query_cache.normalize_query(user_query), {"context": context, "query": user_query})
+    usage = message.response_metadata.get("token_usage") or {}
+    g.prompt_tokens = usage.get("prompt_tokens") or estimated_tokens
+    request_metrics.LLM_TOKENS.inc(g.prompt_tokens, kind="prompt")
+    request_metrics.LLM_TOKENS.inc(usage.get("completion_tokens") or 0, kind="completion")
+    with counts_lock:
+        prompt_token_counts.update(
+            requests=1, estimated_tokens=estimated_tokens,
+            prompt_tokens=usage.get("prompt_tokens") or 0, completion_tokens=usage.get("completion_tokens") or 0,
+        )
+    app.logger.warning("LLM prompt: %d tokens (estimated %d)", g.prompt_tokens, estimated_tokens)
+    return filter_engine.validate(filter_engine.parse_filter(message.content), listings.columns)
 
-def generate_dataframe_query(user_query):
-    generated = get_query_chain().invoke({"context": "", "query": user_query})
-    return strip_code_fences(generated)
+def resolve_filter(user_query, listings):
+    columns = listings.columns
+    with request_metrics.stage("parse"):
+        conditions = query_parser.parse_query(user_query, columns)
+        if conditions is not None:
+            return filter_engine.validate(query_parser.build_filter(conditions), columns), "rules"
+    filter_ast = query_cache_instance.get_filter(user_query)
+    if filter_ast is not None:
+        return filter_ast, "cache"
+    filter_ast = generate_filter(user_query, listings)
+    query_cache_instance.put_filter(user_query, filter_ast)
+    return filter_ast, "llm"
 
-def build_chat_response(filters, listings, error=None):
+def build_chat_response(filters, listings, error=None, page=None):
     payload = {"filters": filters, "listings": listings}
+    if page:
+        payload.update(page)
     if error:
         payload["error"] = error
     return json.dumps(payload, ensure_ascii=False)
 
-def easy_variable_names(query):
-    def extract_variable_names(query):
-        # Regex pattern to match content within [' and ']
-        pattern = r"\['([^']+?)'\]"
-        matches = re.findall(pattern, query)
-        return matches
+def matched_rows(listings, filter_ast, page_request):
+    """
+    Returns the row positions matched by `filter_ast` in the requested order, from the query cache when possible.
+    """
+    filter_key = filter_engine.canonical_key(filter_ast)
+    sort_key = page_request.sort_key
+    if page_request.sort_by == pagination.RECOMMENDED:
+        # Only the top of the ranking is put in order; deeper pages select (and cache) a larger top
+        limit = ranking.top_k(page_request.needed_rows())
+        sort_key = f"{sort_key}:{limit}"
+    rows = query_cache_instance.get_rows(listings.version, filter_key, sort_key)
+    if rows is None:
+        if page_request.sort_by == pagination.RELEVANCE:
+            rows = matched_rows(listings, filter_ast, pagination.PageRequest())
+            if listings.semantic is not None and page_request.text:
+                with request_metrics.stage("rank"):
+                    rows = listings.semantic.rank(page_request.text, rows, SEMANTIC_SEARCH_MODE)
+        elif page_request.sort_by == pagination.DISTANCE:
+            rows = matched_rows(listings, filter_ast, pagination.PageRequest())
+            with request_metrics.stage("rank"):
+                rows = listings.engine.sort_by_distance(rows, filter_ast)
+        elif page_request.sort_by == pagination.RECOMMENDED:
+            rows = matched_rows(listings, filter_ast, pagination.PageRequest())
+            with request_metrics.stage("rank"):
+                rows = listings.ranking.rank(rows, limit)
+        elif page_request.sort_by:
+            rows = matched_rows(listings, filter_ast, pagination.PageRequest())
+            with request_metrics.stage("rank"):
+                rows = pagination.sort_rows(listings.engine, rows, page_request.sort_by, page_request.order)
+        else:
+            with request_metrics.stage("filter"):
+                rows = listings.evaluate(filter_ast)
+            app.logger.warning('Executed QUERY')
+        query_cache_instance.put_rows(listings.version, filter_key, rows, sort_key)
+    return rows
+
+def prompt_headers():
+    # Token count of the LLM prompt this request sent, if it called the LLM
+    return {"X-Prompt-Tokens": str(g.prompt_tokens)} if "prompt_tokens" in g else {}
+
+def wants_stream(request_json):
+    # Opt-in: {"stream": true} in the body or an NDJSON Accept header
+    if request_json.get('stream') is True:
+        return True
+    return request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"]) == "application/x-ndjson"
+
+def stream_listings(serializer, header, rows, fields):
+    """
+    Yields the NDJSON /chat response: the header object (filters, total, paging) first, then one listing per line.
+    """
+    yield listing_json.dumps(header) + b"\n"
+    yield from serializer.iter_lines(rows, fields, CHAT_STREAM_CHUNK_SIZE)
+
+def page_fields(filter_ast, page_request, total):
+    # total / page / cursor fields of a paged /chat response
+    if not page_request.paged:
+        return None
+    return {
+        "total": total,
+        "page": page_request.page,
+        "page_size": page_request.page_size,
+        "cursor": pagination.encode_cursor(filter_ast, page_request),
+        "next_cursor": (
+            pagination.encode_cursor(filter_ast, page_request, page_request.page + 1)
+            if page_request.has_next(total) else None
+        ),
+    }
+
+def response_extras(listings, filter_ast, page_request, rows, with_facets):
+    # Fields of the /chat response after `listings`: paging, then facet counts over every match
+    extras = page_fields(filter_ast, page_request, len(rows)) or {}
+    if with_facets:
+        with request_metrics.stage("facets"):
+            extras["facets"] = listings.facets.facets(rows)
+    return extras
+
+def render_chat_page(listings, filter_ast, page_request, rows, easy_filters, key, with_facets=False):
+    """
+    Encodes one /chat page (only the requested listings and fields) and keeps it in the response cache.
+
+    Returns:
+        rendered_responses.RenderedResponse: The body, compressed lazily per encoding.
+    """
+    extras = response_extras(listings, filter_ast, page_request, rows, with_facets)
+    with request_metrics.stage("encode"):
+        listings_json = listings.serializer.encode(page_request.page_rows(rows), page_request.fields)
+        body = listing_json.chat_payload(easy_filters, listings_json, extras)
+    rendered = rendered_responses.RenderedResponse(body, len(rows))
+    query_cache_instance.put_response(listings.version, key, rendered)
+    return rendered
+
+def prerender_firstcall(listings):
+    """
+    Renders and compresses the firstcall pages of a newly loaded dataset, so page loads never encode them.
+    """
+    filter_ast = {"and": []}
+    try:
+        for size in FIRSTCALL_PRERENDER:
+            page_request = pagination.PageRequest() if size == "all" else pagination.PageRequest(1, min(int(size), CHAT_MAX_PAGE_SIZE))
+            default_order(page_request, filter_ast, "firstcall")
+            key = rendered_responses.response_key(filter_engine.canonical_key(filter_ast), page_request)
+            rows = matched_rows(listings, filter_ast, page_request)
+            rendered = render_chat_page(listings, filter_ast, page_request, rows, [], key)
+            rendered.precompress(CHAT_COMPRESS_MIN_BYTES)
+            app.logger.debug("Pre-rendered firstcall (%s): %.1f kB with its compressed variants", size, rendered.nbytes() / 1e3)
+    except Exception:
+        # The first requests render the pages themselves
+        app.logger.exception("Failed to pre-render firstcall")
+
+def send_rendered(rendered, headers, shared):
+    """
+    Answers with `rendered` in the best encoding the client accepts (brotli, then gzip), or 304 if its ETag matches.
+
+    Parameters:
+        rendered (rendered_responses.RenderedResponse): The /chat body.
+        headers (dict): Response headers; ETag, Cache-Control and Vary are added.
+        shared (bool): Whether the body follows from the request alone (not from an LLM answer), so CDNs may keep it.
+    """
+    encoding = None
+    if len(rendered.body) >= CHAT_COMPRESS_MIN_BYTES:
+        encoding = request.accept_encodings.best_match(rendered_responses.ENCODINGS)
+    headers["Vary"] = "Accept-Encoding"
+    headers["ETag"] = rendered.etag(encoding)
+    headers["Cache-Control"] = f"public, max-age=0, s-maxage={CHAT_CDN_MAX_AGE}" if shared else "no-cache"
+    if rendered_responses.etag_matches(request.headers.get("If-None-Match"), headers["ETag"]):
+        return "", 304, headers
+    if encoding is None:
+        return rendered.body, 200, headers
+    with request_metrics.stage("compress"):
+        body = rendered.encoded(encoding)
+    headers["Content-Encoding"] = encoding
+    return body, 200, headers
 
-    variable_names = extract_variable_names(query)
-    easy_variable_names = [chat_config.EASY_NAME_MAP.get(varname, varname) for varname in variable_names]
+def easy_variable_names(filter_ast):
+    variable_names = filter_engine.filter_columns(filter_ast)
+    easy_variable_names = []
+    for varname in variable_names:
+        mapped = filter_engine.resolve_column(varname, chat_config.EASY_NAME_MAP)
+        easy_variable_names.append(chat_config.EASY_NAME_MAP.get(mapped, varname))
     return easy_variable_names
 
-@app.route('/chat', methods=['POST'])
+def default_order(page_request, filter_ast, query_path):
+    """
+    Sets the order of a request without `sort_by`: distance for `near` queries, description relevance for free
+    text the LLM turned into a filter, else the recommended blend.
+    """
+    if page_request.sort_by is not None:
+        return
+    if filter_engine.near_condition(filter_ast) is not None:
+        page_request.sort_by, page_request.order = pagination.DISTANCE, "asc"
+    elif query_path in ("cache", "llm") and SEMANTIC_RANKING:
+        # The filter narrows the listings down, the description match orders them
+        page_request.sort_by, page_request.order = pagination.RELEVANCE, "desc"
+    elif RECOMMENDED_RANKING:
+        page_request.sort_by, page_request.order = pagination.RECOMMENDED, "desc"
+
+def chat_params():
+    """
+    The /chat options: the JSON body of a POST, or the query string of a GET (`fields` comma-separated).
+
+    GET requests exist so CDNs can cache deterministic responses such as firstcall.
+    """
+    if request.method == 'POST':
+        return request.get_json(silent=True) or {}
+    params = request.args.to_dict()
+    if 'fields' in params:
+        params['fields'] = [field for field in params['fields'].split(',') if field]
+    for flag in ('stream', 'facets'):
+        if flag in params:
+            params[flag] = params[flag].lower() in ('1', 'true')
+    return params
+
+@app.route('/chat', methods=['GET', 'POST'])
 def chat():
-    request_json = request.get_json(silent=True) or {}
+    request_json = chat_params()
     query = request_json.get('query')
-    if not query:
+    cursor = request_json.get('cursor')
+    if not query and not cursor:
         return (
             build_chat_response([], [], {"type": "validation_error", "message": "Missing required field: query"}),
             400,
             {"Content-Type": "application/json; charset=utf-8"},
         )
 
-    if query=="firstcall":
-        print('LOADING THE INITIAL TABLE')
-        filtered_df = load_original()
-        easy_filters = []
-    else:
-        try:
-            dataframe_query = generate_dataframe_query(query)
-            app.logger.warning(dataframe_query)
-        except Exception as exc:
-            app.logger.exception("Failed to generate dataframe query from LLM")
-            return (
-                build_chat_response([], [], {"type": "llm_error", "message": str(exc)}),
-                502,
-                {"Content-Type": "application/json; charset=utf-8"},
-            )
-
-        try:
-            df = load_original()
-            local_vars = {'df': df}
-            # Execute the code
-            exec_string = "mydf=" + dataframe_query
-            exec(exec_string, globals(), local_vars)
-            # Get easy variable names for frontend filters
-            easy_filters = easy_variable_names(dataframe_query)
-            app.logger.warning('Executed QUERY')
-            filtered_df = local_vars['mydf']
-        except Exception as exc:
-            app.logger.exception("Failed to execute dataframe query")
-            return (
-                build_chat_response([], [], {"type": "query_execution_error", "message": str(exc)}),
-                400,
-                {"Content-Type": "application/json; charset=utf-8"},
-            )
-    # rtype = 'text'
+    with request_metrics.stage("load"):
+        listings = listings_store_instance.snapshot()
+    try:
+        if cursor:
+            # Follow-up page: the cursor carries the validated filter, so no LLM call is needed
+            filter_ast, page_request = pagination.decode_cursor(cursor, listings.columns, request_json.get('page'), CHAT_MAX_PAGE_SIZE)
+            query_path = "cursor"
+        else:
+            page_request = pagination.parse_page_request(request_json, CHAT_PAGE_SIZE, CHAT_MAX_PAGE_SIZE)
+    except (pagination.PageError, filter_engine.FilterError) as exc:
+        return (
+            build_chat_response([], [], {"type": "invalid_cursor" if cursor else "validation_error", "message": str(exc)}),
+            400,
+            {"Content-Type": "application/json; charset=utf-8"},
+        )
+
+    # A cursor already carries the validated filter; otherwise the query text is turned into one
+    if not cursor:
+        if query == "firstcall":
+            app.logger.debug("Loading the initial table")
+            filter_ast = {"and": []}
+            query_path = "firstcall"
+        else:
+            try:
+                filter_ast, query_path = resolve_filter(query, listings)
+                app.logger.warning("[%s] %s", query_path, filter_engine.canonical_key(filter_ast))
+            except filter_engine.FilterError as exc:
+                app.logger.warning("LLM returned an invalid filter: %s", exc)
+                return (
+                    build_chat_response([], [], {"type": "invalid_filter", "message": str(exc)}),
+                    502,
+                    {"Content-Type": "application/json; charset=utf-8"},
+                )
+            except llm_client.LLMTimeout as exc:
+                app.logger.warning("LLM timed out: %s", exc)
+                return (
+                    build_chat_response([], [], {"type": "llm_timeout", "message": str(exc)}),
+                    504,
+                    {"Content-Type": "application/json; charset=utf-8"},
+                )
+            except Exception as exc:
+                app.logger.exception("Failed to generate filter from LLM")
+                return (
+                    build_chat_response([], [], {"type": "llm_error", "message": str(exc)}),
+                    502,
+                    {"Content-Type": "application/json; charset=utf-8"},
+                )
+
+    if page_request.sort_by == pagination.DISTANCE and filter_engine.near_condition(filter_ast) is None:
+        return (
+            build_chat_response([], [], {"type": "validation_error", "message": "'sort_by': 'distance' needs a distance (near) query"}),
+            400,
+            {"Content-Type": "application/json; charset=utf-8"},
+        )
+    if not cursor:
+        default_order(page_request, filter_ast, query_path)
+        page_request.text = None if query_path == "firstcall" else query
+
+    # The body only depends on the dataset, filter and page options: repeated pages skip matching and encoding
+    stream = wants_stream(request_json)
+    with_facets = request_json.get('facets') is True
+    key = rendered_responses.response_key(filter_engine.canonical_key(filter_ast), page_request, with_facets)
+    rendered = None if stream else query_cache_instance.get_response(listings.version, key)
+    headers = {"Content-Type": "application/json; charset=utf-8", "X-Query-Path": query_path, **prompt_headers()}
+    # Cursors, firstcall and rule-parsed queries map to the same body every time; LLM answers may change
+    shared = request.method == 'GET' and query_path in ("cursor", "firstcall", "rules")
+    if rendered is not None:
+        g.query_path, g.result_rows = query_path, rendered.total
+        count_query_path(query_path)
+        app.logger.debug("Returning a rendered page of %d", rendered.total)
+        return send_rendered(rendered, headers, shared)
+
     try:
-        filter_df = filtered_df[
-            [
-                'idStr',
-                'name',
-                'sectionedDescription/summary',
-                'url',
-                'photos/0/thumbnailUrl',
-                'pricing/rate/amount',
-                'stars',
-                'reviewDetailsInterface/reviewCount',
-                'Accuracy',
-                'Communication',
-                'Cleanliness',
-                'Location',
-                'Check-in',
-                'Value',
-                'bedroom_count',
-                'bathroom_count',
-                'bed_count',
-                'guestControls/personCapacity',
-                'roomType',
-                'city',
-            ]
-        ].rename(columns={
-        "photos/0/thumbnailUrl" : "image_url",
-        "pricing/rate/amount" : "price",
-        "sectionedDescription/summary" : "description",
-        'reviewDetailsInterface/reviewCount' : "review_count",
-        'Check-in' : "checkIn",
-        'guestControls/personCapacity': "guest_capacity",
-        'roomType': "room_type",
-        })
+        rows = matched_rows(listings, filter_ast, page_request)
+        # Get easy variable names for frontend filters
+        easy_filters = easy_variable_names(filter_ast)
+    except Exception as exc:
+        if query_path in ("cache", "llm"):
+            query_cache_instance.discard_filter(query)
+        app.logger.exception("Failed to execute filter")
+        return (
+            build_chat_response([], [], {"type": "query_execution_error", "message": str(exc)}),
+            400,
+            {"Content-Type": "application/json; charset=utf-8"},
+        )
+
+    g.query_path, g.result_rows = query_path, len(rows)
+    page_rows = page_request.page_rows(rows)
+    count_query_path(query_path)
+    app.logger.debug("Returning %d of %d", len(page_rows), len(rows))
+    if stream:
+        header = {"filters": easy_filters, "total": len(rows), **response_extras(listings, filter_ast, page_request, rows, with_facets)}
+        return Response(
+            stream_with_context(stream_listings(listings.serializer, header, page_rows, page_request.fields)),
+            200,
+            {"Content-Type": "application/x-ndjson; charset=utf-8", "X-Query-Path": query_path, **prompt_headers()},
+        )
+
+    # Only the requested page and fields are encoded, from the per-listing JSON fragments when possible
+    try:
+        rendered = render_chat_page(listings, filter_ast, page_request, rows, easy_filters, key, with_facets)
     except Exception as exc:
         app.logger.exception("Failed to build response payload")
         return (
@@ -180,11 +511,102 @@ def chat():
             500,
             {"Content-Type": "application/json; charset=utf-8"},
         )
+    return send_rendered(rendered, headers, shared)
 
-    filter_df.index.name = "index"
-    print("Returning:", filtered_df.shape)
+@app.route('/search', methods=['GET', 'POST'])
+def search():
+    # Full-text search over names, addresses, cities and descriptions; returns ranked listing ids only
+    params = request.get_json(silent=True) or request.args
+    text = params.get('q') or params.get('query')
+    limit = params.get('limit', SEARCH_LIMIT)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        limit = 0
+    if not isinstance(text, str) or not text.strip() or limit < 1:
+        return (
+            json.dumps({"error": {"type": "validation_error", "message": "Expected a non-empty 'q' and a positive integer 'limit'"}}),
+            400,
+            {"Content-Type": "application/json; charset=utf-8"},
+        )
+    with request_metrics.stage("load"):
+        listings = listings_store_instance.snapshot()
+    with request_metrics.stage("search"):
+        rows, scores, total = listings.engine.text.search(text, limit=min(limit, SEARCH_MAX_LIMIT))
+    ids = listings.engine.array('idStr')[rows].tolist()
     return (
-        build_chat_response(easy_filters, filter_df.fillna("").to_dict('records')),
+        json.dumps({
+            "query": text,
+            "total": total,
+            "results": [{"idStr": listing_id, "score": round(float(score), 4)} for listing_id, score in zip(ids, scores)],
+        }, ensure_ascii=False),
+        200,
+        {"Content-Type": "application/json; charset=utf-8"},
+    )
+
+@app.route('/listings/<int:listing_id>', methods=['GET'])
+def listing_detail(listing_id):
+    # Every column of one listing, including the descriptions and photos /chat leaves out
+    with request_metrics.stage("load"):
+        listings = listings_store_instance.snapshot()
+    row = listings.row_for_id(listing_id)
+    if row is None:
+        return (
+            json.dumps({"error": {"type": "not_found", "message": f"No listing with idStr {listing_id}"}}),
+            404,
+            {"Content-Type": "application/json; charset=utf-8"},
+        )
+    with request_metrics.stage("encode"):
+        body = listings.serializer.detail(row)
+    return body, 200, {"Content-Type": "application/json; charset=utf-8"}
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    with counts_lock:
+        query_paths, llm_prompt = dict(query_path_counts), dict(prompt_token_counts)
+    return (
+        json.dumps({
+            "listings": listings_store_instance.stats(),
+            "query_cache": query_cache_instance.stats(),
+            "query_paths": query_paths,
+            "llm": llm_client_instance.stats(),
+            "llm_prompt": llm_prompt,
+        }),
+        200,
+        {"Content-Type": "application/json; charset=utf-8"},
+    )
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus text format, for this worker process (see request_metrics.py)
+    return request_metrics.registry.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    if not admin_authorized():
+        return (
+            json.dumps({"error": {"type": "forbidden", "message": "Missing or invalid X-Admin-Token"}}),
+            403,
+            {"Content-Type": "application/json; charset=utf-8"},
+        )
+    force = bool((request.get_json(silent=True) or {}).get("force"))
+    try:
+        current, reloaded = listings_store_instance.reload(force=force)
+    except Exception as exc:
+        app.logger.exception("Failed to reload listings")
+        return (
+            json.dumps({"error": {"type": "reload_error", "message": str(exc)}}),
+            500,
+            {"Content-Type": "application/json; charset=utf-8"},
+        )
+    return (
+        json.dumps({
+            "reloaded": reloaded,
+            "version": current.version,
+            "rows": len(current.frame),
+            "reload_seconds": current.reload_seconds,
+            "pid": os.getpid(),
+        }),
         200,
         {"Content-Type": "application/json; charset=utf-8"},
     )
@@ -213,7 +635,8 @@ def test_data():
                 df = pd.read_csv(sample_path, index_col=0)
             else:
                 # Fallback keeps /test functional even when sample artifact is missing.
-                df = load_original()
+                listings = listings_store_instance.snapshot()
+                df = listings.details.attach(load_original().head(10), ['photos/0/thumbnailUrl'])
             filter_df = df[['idStr', 'name', 'url', 'photos/0/thumbnailUrl',  'pricing/rate/amount']].head(10).rename(columns={
             "photos/0/thumbnailUrl" : "image_url", "pricing/rate/amount" : "price"})
             response = json.dumps(filter_df.to_dict('records'), ensure_ascii=False)
@@ -230,5 +653,9 @@ def test_data():
         stat.insert(0, ({'df_name' : df_name}))
         return json.dumps(stat, ensure_ascii=False)
 
+# Startup hook: parse the dataset at import so gunicorn --preload shares it across forked workers
+if os.getenv("PRELOAD_DATASET", "1") == "1":
+    listings_store_instance.preload()
+
 # if __name__ == '__main__':
 #     app.run(host="0.0.0.0", debug=True)
@@ -0,0 +1,64 @@
+"""
+/chat facet counts: facets.FacetIndex vs pandas value_counts / sums over the matched rows.
+
+Both are run on the match set of every benchmarks/queries.json filter (and of firstcall) over a synthetic
+dataset, and their counts are checked against each other.
+
+    python -m benchmarks.facets --rows 100000
+"""
+from argparse import ArgumentParser
+
+import numpy as np
+
+import facets
+import filter_engine
+import listings_store
+from benchmarks import fake_llm, synthetic
+from benchmarks.bitmap_filters import best_of
+
+
+def pandas_facets(listings, rows):
+    matched = listings.frame.iloc[rows]
+    flags = listings.facets.flag_names
+    result = {"flags": {col: int(count) for col, count in (matched[flags] == 1).sum().items() if count}}
+    for column in facets.CATEGORY_FACETS:
+        result[column] = {key: int(count) for key, count in matched[column].value_counts().items() if count}
+    for column, largest in facets.COUNT_FACETS.items():
+        values = matched[column].dropna().clip(0, largest)
+        labels = values.map(lambda value: f"{largest}+" if value >= largest else str(int(value)))
+        result[column] = labels.value_counts().to_dict()
+    prices = matched[facets.PRICE_COLUMN].dropna().to_numpy(dtype=np.float64)
+    bins = np.bincount(np.searchsorted(listings.facets.price_edges, prices, side='right'),
+                       minlength=len(listings.facets.price_edges) + 1)
+    result["price"] = [int(count) for count in bins if count]
+    return result
+
+
+def comparable(result):
+    # Flag counts regardless of order, price bins by count only
+    return {**result, "flags": dict(sorted(result["flags"].items())),
+            "price": [entry["count"] if isinstance(entry, dict) else entry for entry in result["price"]]}
+
+
+def main(rows, seed, repeat):
+    listings = listings_store.ListingsStore(synthetic.write_dataset(rows, seed), watch=False).preload()
+    index = listings.facets
+    print(f"{len(listings.frame)} listings, {len(index.flag_names)} flags, facet codes {index.nbytes() / 1e6:.1f} MB, "
+          f"flag bitmaps {listings.engine.flags.nbytes() / 1e6:.1f} MB")
+    queries = [("firstcall", {"and": []})] + [(entry["name"], entry["filter"]) for entry in fake_llm.load_corpus()]
+    print(f"{'query':<22} {'matches':>8} {'FacetIndex ms':>14} {'pandas ms':>10}")
+    for name, node in queries:
+        matched = listings.engine.evaluate(filter_engine.validate(node, listings.columns))
+        seconds, result = best_of(lambda: index.facets(matched), repeat)
+        baseline_seconds, baseline = best_of(lambda: pandas_facets(listings, matched), max(repeat // 10, 1))
+        assert comparable(result) == comparable(baseline), name
+        print(f"{name:<22} {len(matched):8d} {seconds * 1000:14.3f} {baseline_seconds * 1000:10.1f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark facet counting over /chat match sets")
+    parser.add_argument("--rows", type=int, default=100000, help="Listings in the synthetic dataset")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic dataset")
+    parser.add_argument("--repeat", type=int, default=50, help="Runs per query, best time is reported")
+    args = parser.parse_args()
+    main(args.rows, args.seed, args.repeat)
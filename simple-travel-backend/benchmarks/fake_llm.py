@@ -0,0 +1,149 @@
+"""
+Local stand-in for the Groq chat completions API, for load-testing the LLM path offline.
+
+Answers `POST /openai/v1/chat/completions` after a fixed latency with a deterministic JSON filter: the
+canned filter of the query in the benchmark corpus (`benchmarks/queries.json`), else the rule-based parser's
+filter when it understands the query, `{"and": []}` otherwise. Point the backend at it with
+`GROQ_API_BASE=http://127.0.0.1:8011` (any non-empty `GROQ_API_KEY` works), or set `app.query_chain` to a
+`FakeChain` to answer in-process without HTTP.
+
+    python -m benchmarks.fake_llm --port 8011 --latency 0.8
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.messages import AIMessage
+
+import query_parser
+from chat_config import FINAL_COLUMNS
+from query_cache import normalize_query
+
+QUERY_LINE = re.compile(r"User's query:[ \t]*(.*)")
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "queries.json")
+
+
+def load_corpus(path=CORPUS_PATH):
+    """
+    Returns the benchmark query corpus: a list of {"name", "query", "filter"} entries.
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+CANNED_FILTERS = {normalize_query(entry["query"]): entry["filter"] for entry in load_corpus()}
+
+
+def query_filter(query):
+    canned = CANNED_FILTERS.get(normalize_query(query))
+    if canned is not None:
+        return canned
+    conditions = query_parser.parse_query(query, FINAL_COLUMNS)
+    return query_parser.build_filter(conditions) if conditions else {"and": []}
+
+
+def fake_filter(prompt):
+    # The prompt's examples use the same marker, the user's query is the last one
+    queries = QUERY_LINE.findall(prompt)
+    return query_filter(queries[-1]) if queries else {"and": []}
+
+
+class FakeChain:
+    """
+    In-process stand-in for the LangChain query chain: `ainvoke` answers with the same filters as the server.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+
+    async def ainvoke(self, payload):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        content = json.dumps(query_filter(payload["query"]))
+        prompt_tokens = (len(payload.get("context", "")) + len(payload["query"])) // 4
+        return AIMessage(content=content, response_metadata={"token_usage": {
+            "prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+        }})
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.5):
+        super().__init__(address, FakeLLMHandler)
+        self.latency = latency
+        self.requests = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def track(self, delta):
+        with self._lock:
+            self._in_flight += delta
+            if delta > 0:
+                self.requests += 1
+                self.max_in_flight = max(self.max_in_flight, self._in_flight)
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.track(1)
+        try:
+            time.sleep(self.server.latency)
+            prompt = body.get("messages", [{}])[-1].get("content", "")
+            content = json.dumps(fake_filter(prompt))
+        finally:
+            self.server.track(-1)
+        payload = json.dumps({
+            "id": f"fake-{self.server.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (deadline) before the answer arrived
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, latency=0.5):
+    """
+    Starts the fake server on a background thread and returns it (`.base_url`, `.requests`, `.shutdown()`).
+    """
+    server = FakeLLMServer(("127.0.0.1", port), latency)
+    threading.Thread(target=server.serve_forever, name="fake-llm", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Fake Groq chat completions server")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before each response")
+    args = parser.parse_args()
+    server = FakeLLMServer(("127.0.0.1", args.port), args.latency)
+    print(f"Fake LLM listening on {server.base_url} with {args.latency}s latency")
+    server.serve_forever()
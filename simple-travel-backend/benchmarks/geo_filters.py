@@ -0,0 +1,64 @@
+"""
+Radius and bounding-box filters: a full haversine scan vs the grid index, as the number of listings grows.
+
+Synthetic listings are scattered around Bangkok, Phuket and Krabi (plus a uniform background over
+Thailand), so matches grow with the dataset, as they would with more scraped listings.
+
+    python -m benchmarks.geo_filters --rows 10000 100000 300000 1000000
+"""
+from argparse import ArgumentParser
+
+import numpy as np
+import pandas as pd
+
+import chat_config
+import listing_indexes
+from benchmarks.bitmap_filters import best_of
+
+CENTERS = [(13.74, 100.54, 0.08), (7.90, 98.33, 0.08), (8.05, 98.85, 0.06)]
+QUERIES = {
+    "1 km of Siam": ("near", (13.7456, 100.5347, 1.0)),
+    "5 km of Patong Beach": ("near", (7.8961, 98.2960, 5.0)),
+    "central Bangkok box": ("within", (13.70, 100.50, 13.78, 100.58)),
+}
+
+
+def synthetic_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    center = rng.integers(0, len(CENTERS) + 1, rows)
+    lat = rng.uniform(6.0, 20.0, rows)
+    lng = rng.uniform(98.0, 105.0, rows)
+    for index, (center_lat, center_lng, spread) in enumerate(CENTERS):
+        chosen = center == index
+        lat[chosen] = rng.normal(center_lat, spread, chosen.sum())
+        lng[chosen] = rng.normal(center_lng, spread, chosen.sum())
+    return pd.DataFrame({chat_config.LATITUDE_COLUMN: lat, chat_config.LONGITUDE_COLUMN: lng})
+
+
+def main(sizes, repeat):
+    print(f"{'listings':>9} {'build ms':>9} {'scan ms':>9} {'grid ms':>9} {'matches':>8}  query")
+    for rows in sizes:
+        frame = synthetic_frame(rows)
+        build_seconds, index = best_of(lambda: listing_indexes.GeoGridIndex(frame), 1)
+        everything = np.arange(rows)
+        for label, (kind, args) in QUERIES.items():
+            if kind == "near":
+                scan = lambda: everything[listing_indexes.haversine_km(index.lat, index.lng, args[0], args[1]) <= args[2]]
+                grid = lambda: index.near(*args)
+            else:
+                south, west, north, east = args
+                scan = lambda: everything[(index.lat >= south) & (index.lat <= north) & (index.lng >= west) & (index.lng <= east)]
+                grid = lambda: index.within(*args)
+            scan_seconds, expected = best_of(scan, repeat)
+            grid_seconds, matched = best_of(grid, repeat)
+            assert np.array_equal(expected, matched)
+            print(f"{rows:9d} {build_seconds * 1000:9.1f} {scan_seconds * 1000:9.2f} {grid_seconds * 1000:9.3f} "
+                  f"{len(matched):8d}  {label}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark radius and bounding-box filters")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 300000, 1000000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
@@ -0,0 +1,98 @@
+"""
+hotel-data-transformer.py ingestion: synthetic scraper dumps processed serially and with --workers.
+
+Raw dumps are rebuilt from the cleaned dataset with the scraper's wide layout (100 `listingAmenities/*`
+slots, 6 `reviewSummary/*` slots, photo captions, bed/bath labels and a few thousand unused columns).
+
+    python -m benchmarks.ingestion --files 4 --rows 2000 --workers 4
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import pandas as pd
+
+import app
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REVIEW_LABELS = ['Accuracy', 'Communication', 'Cleanliness', 'Location', 'Check-in', 'Value']
+UNUSED_PREFIXES = ['seeAllAmenitySections', 'listingRooms', 'highlights', 'pdpSections', 'reviews', 'Host']
+
+
+def load_transformer():
+    # The script name has dashes; register it so worker processes can unpickle its functions
+    spec = importlib.util.spec_from_file_location("hotel_data_transformer", os.path.join(BASE_DIR, "hotel-data-transformer.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["hotel_data_transformer"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_raw_dump(rows, unused_columns, seed=0, base=None):
+    # Cleaned listings to rebuild the dump from: the loaded dataset unless given (e.g. benchmarks.synthetic)
+    rng = np.random.default_rng(seed)
+    if base is None:
+        base = app.listings_store_instance.snapshot().full_frame()
+    clean = base.iloc[rng.integers(0, len(base), rows)].reset_index(drop=True)
+    clean['idStr'] = rng.integers(10**6, 10**18, rows)
+    columns = {}
+    for col in clean.columns:
+        if col.startswith('amenity_') or col in REVIEW_LABELS or col in ('bed_count', 'bathroom_count', 'bedroom_count'):
+            continue
+        columns[col] = clean[col]
+    amenities = [col for col in clean.columns if col.startswith('amenity_')]
+    for slot in range(100):
+        if slot < len(amenities):
+            name = amenities[slot][len('amenity_'):].replace('_', ' ')
+            present = clean[amenities[slot]].map({1: True, 0: False})
+        else:
+            name = f'Unused amenity {slot}'
+            present = pd.Series(np.where(rng.random(rows) < 0.05, True, None))
+        columns[f'listingAmenities/{slot}/id'] = slot
+        columns[f'listingAmenities/{slot}/name'] = name
+        columns[f'listingAmenities/{slot}/isPresent'] = present
+        columns[f'listingAmenities/{slot}/description'] = f'{name} description'
+    for slot, label in enumerate(REVIEW_LABELS):
+        columns[f'reviewDetailsInterface/reviewSummary/{slot}/label'] = label
+        columns[f'reviewDetailsInterface/reviewSummary/{slot}/localizedRating'] = clean[label]
+        columns[f'reviewDetailsInterface/reviewSummary/{slot}/value'] = clean[label] * 20
+    columns['bedLabel'] = clean['bed_count'].map(lambda count: f'{count} beds')
+    columns['bathroomLabel'] = clean['bathroom_count'].map(lambda count: f'{count:.0f} baths')
+    columns['bedroomLabel'] = clean['bedroom_count'].map(lambda count: f'{count:.0f} bedrooms')
+    for photo in range(60):
+        columns[f'photos/{photo}/caption'] = 'Photo caption'
+        columns[f'photos/{photo}/pictureUrl'] = f'https://example.com/{photo}.jpg'
+        columns[f'photos/{photo}/thumbnailUrl'] = f'https://example.com/{photo}_t.jpg'
+    for i in range(unused_columns):
+        columns[f'{UNUSED_PREFIXES[i % len(UNUSED_PREFIXES)]}/{i}/text'] = f'unused text {i}'
+    return pd.DataFrame(columns)
+
+
+def main(files, rows, unused_columns, workers):
+    transformer = load_transformer()
+    with tempfile.TemporaryDirectory() as workdir:
+        references = os.path.join(workdir, "references")
+        os.makedirs(references)
+        for index in range(files):
+            synthetic_raw_dump(rows, unused_columns, seed=index).to_csv(os.path.join(references, f"dump-{index}.csv"), index=False)
+        print(f"{files} dumps x {rows} listings, {unused_columns} unused columns each")
+        for count in sorted({1, workers}):
+            clean = os.path.join(workdir, f"clean-{count}")
+            os.makedirs(clean)
+            started = time.perf_counter()
+            transformer.process_new_files(references, clean, os.path.join(clean, "processed_files.json"), workers=count)
+            print(f"--workers {count:<3} {time.perf_counter() - started:8.2f} s")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark raw scraper dump ingestion")
+    parser.add_argument("--files", type=int, default=4, help="Number of raw dumps")
+    parser.add_argument("--rows", type=int, default=2000, help="Listings per dump")
+    parser.add_argument("--unused-columns", type=int, default=3000, help="Columns per dump the pipeline drops")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes for the parallel run")
+    args = parser.parse_args()
+    main(args.files, args.rows, args.unused_columns, args.workers)
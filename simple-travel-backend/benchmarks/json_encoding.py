@@ -0,0 +1,70 @@
+"""
+/chat listing payload encoding: fillna + to_dict + json.dumps vs the column encoder and the per-listing fragment cache.
+
+    python -m benchmarks.json_encoding --rows 100000
+"""
+import gzip
+import json
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import pandas as pd
+
+import chat_config
+import listing_json
+from benchmarks.bitmap_filters import best_of, tiled_frame
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def main(rows, repeat):
+    df = tiled_frame(rows)
+    positions = np.arange(len(df))
+    # What the frame held before the typed profile: float64 numbers and object text
+    previous = df[list(chat_config.RESPONSE_COLUMNS)]
+    previous = previous.assign(**{
+        col: previous[col].astype(str).astype(np.float64) if previous[col].dtype == np.float32 else previous[col].astype(object)
+        for col in previous.columns if previous[col].dtype == np.float32 or isinstance(previous[col].dtype, pd.CategoricalDtype)
+    })
+
+    def legacy():
+        projected = previous.take(positions).rename(columns=chat_config.RESPONSE_COLUMNS)
+        return json.dumps(projected.fillna("").to_dict('records'), ensure_ascii=False).encode("utf-8")
+
+    started = time.perf_counter()
+    serializer = listing_json.ListingSerializer(df)
+    build_seconds = time.perf_counter() - started
+    uncached = listing_json.ListingSerializer(df, max_cached_rows=0)
+
+    print(f"{len(df)} listings, orjson {'on' if listing_json.orjson else 'off'}, fragment cache "
+          f"{serializer.nbytes() / 1e6:.1f} MB built in {build_seconds * 1000:.0f} ms")
+    expected = None
+    for name, func in [
+        ("fillna + to_dict + json", legacy),
+        ("column encoder", lambda: uncached.encode(positions)),
+        ("fragment cache", lambda: serializer.encode(positions)),
+    ]:
+        seconds, body = best_of(func, repeat)
+        decoded = json.loads(body)
+        expected = decoded if expected is None else expected
+        assert decoded == expected, name
+        print(f"{name:<26} {seconds * 1000:9.2f} ms  ({len(body) / 1e6:.2f} MB)")
+
+    codecs = [("gzip -5", lambda: gzip.compress(body, compresslevel=5))]
+    if brotli is not None:
+        codecs.append(("brotli -5", lambda: brotli.compress(body, quality=5)))
+    for name, func in codecs:
+        seconds, compressed = best_of(func, max(1, repeat // 5))
+        print(f"{name:<26} {seconds * 1000:9.2f} ms  ({len(compressed) / 1e6:.2f} MB)")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark /chat listing JSON encoding")
+    parser.add_argument("--rows", type=int, default=100000, help="Number of listings (the dataset is tiled)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per variant, best time is reported")
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
@@ -0,0 +1,78 @@
+"""
+Bytes per listing of the loaded dataset: the previous all-in-memory profile (int64 / float64 numbers,
+one Python string per text value) vs the typed profile (int32 / float32, categoricals, detail columns
+memory-mapped from the snapshot).
+
+    python -m benchmarks.listing_memory --rows 100000
+"""
+import os
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import chat_config
+import snapshot
+from benchmarks.bitmap_filters import tiled_frame
+
+# The storage dtypes before the typed profile
+PREVIOUS_DTYPES = {
+    col: 'Int8' if dtype == 'Int8'
+    else 'int64' if dtype.startswith('int')
+    else 'float64' if dtype.startswith('float')
+    else 'string'
+    for col, dtype in chat_config.COLUMN_DTYPES.items()
+}
+
+
+def column_group(col):
+    if col in chat_config.DETAIL_COLUMNS:
+        return "descriptions" if col.startswith('sectionedDescription/') else "photos"
+    if col.startswith(chat_config.FLAG_COLUMN_PREFIXES):
+        return "flags"
+    if col in chat_config.CATEGORY_COLUMNS:
+        return "categories"
+    dtype = chat_config.COLUMN_DTYPES.get(col)
+    return "numbers" if dtype and dtype != 'string' else "text"
+
+
+def grouped_bytes(frame):
+    groups = {}
+    for col, nbytes in frame.memory_usage(deep=True, index=False).items():
+        groups[column_group(col)] = groups.get(column_group(col), 0) + nbytes
+    return groups
+
+
+def main(rows):
+    frame = tiled_frame(rows)
+    previous = snapshot.apply_schema(frame, PREVIOUS_DTYPES)
+    before = grouped_bytes(previous)
+    del previous
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "listings.snapshot")
+        snapshot.write_snapshot(frame, path)
+        del frame
+        started = time.perf_counter()
+        details = snapshot.read_details(path, chat_config.DETAIL_COLUMNS)
+        names = [column["name"] for column in snapshot.read_schema(path)["columns"]]
+        typed = snapshot.read_snapshot(path, [col for col in names if col not in details])
+        load_seconds = time.perf_counter() - started
+        after = grouped_bytes(typed)
+        mapped = {}
+        for col in details.columns:
+            mapped[column_group(col)] = mapped.get(column_group(col), 0) + details.nbytes([col])
+
+        print(f"{rows} listings, typed snapshot loaded in {load_seconds * 1000:.0f} ms")
+        print(f"{'bytes per listing':<18} {'previous':>9} {'resident':>9} {'mapped':>9}")
+        for group in ["flags", "numbers", "categories", "text", "descriptions", "photos"]:
+            print(f"{group:<18} {before.get(group, 0) / rows:9.0f} {after.get(group, 0) / rows:9.0f} "
+                  f"{mapped.get(group, 0) / rows:9.0f}")
+        print(f"{'total':<18} {sum(before.values()) / rows:9.0f} {sum(after.values()) / rows:9.0f} "
+              f"{sum(mapped.values()) / rows:9.0f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark memory per listing of the loaded dataset")
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+    main(args.rows)
@@ -0,0 +1,60 @@
+"""
+LLM path under concurrent load, against the local fake Groq server (benchmarks/fake_llm.py).
+
+Fires `--requests` /chat-style filter generations from `--clients` threads through app.llm_client_instance,
+once with distinct queries and once with every client asking the same few queries, and reports throughput,
+upstream calls per request (single-flight coalescing) and the peak upstream concurrency.
+
+    python -m benchmarks.llm_concurrency --requests 64 --clients 32 --latency 0.5
+"""
+import os
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import fake_llm
+
+QUERIES = ["cozy place with a sauna", "somewhere quiet for remote work", "family friendly with a garden",
+           "romantic weekend getaway", "great view and a fireplace", "close to the beach with parking"]
+
+
+def run(client, server, queries, clients):
+    requests_before = server.requests
+    server.max_in_flight = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(lambda query: client.invoke(query, {"context": "", "query": query}), queries))
+    elapsed = time.perf_counter() - started
+    return elapsed, server.requests - requests_before, server.max_in_flight
+
+
+def main(requests, clients, latency, max_concurrency):
+    server = fake_llm.start_server(latency=latency)
+    os.environ["GROQ_API_BASE"] = server.base_url
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+    import app
+    client = app.llm_client_instance
+    client.max_concurrency = max_concurrency
+    client.invoke("warm up", {"context": "", "query": "warm up"})
+
+    print(f"{requests} requests from {clients} threads, {latency}s upstream latency, max_concurrency {max_concurrency}")
+    print(f"serial estimate: {requests * latency:.1f} s")
+    workloads = {
+        "distinct": [f"{QUERIES[i % len(QUERIES)]} #{i}" for i in range(requests)],
+        "duplicate": [QUERIES[i % len(QUERIES)] for i in range(requests)],
+    }
+    for name, queries in workloads.items():
+        elapsed, upstream, peak = run(client, server, queries, clients)
+        print(f"{name:<10} {elapsed:6.2f} s  {requests / elapsed:7.1f} req/s  upstream calls {upstream:>4}  peak in flight {peak}")
+    print(client.stats())
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark concurrent LLM filter generation")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent request threads")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake upstream latency in seconds")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="LLM_MAX_CONCURRENCY for the run")
+    args = parser.parse_args()
+    main(args.requests, args.clients, args.latency, args.max_concurrency)
@@ -0,0 +1,45 @@
+"""
+LLM prompt size per query: every column described ("full") vs. only the relevant ones ("relevant").
+
+Counts are local estimates (prompt_builder.estimate_tokens); Groq's reported prompt_tokens are logged and
+exposed under `llm_prompt` in GET /stats when the backend runs.
+
+    python -m benchmarks.prompt_tokens
+    python -m benchmarks.prompt_tokens --query "villa in patong with a sea view"
+"""
+from argparse import ArgumentParser
+
+import app
+import prompt_builder
+
+QUERIES = [
+    "cozy villa in patong with a sea view",
+    "quiet place for remote work with a good rating",
+    "2 beds near the beach with a fireplace and a dishwasher",
+    "somewhere cheap for a long stay, pets welcome",
+    "family friendly condo with a pool and a gym, well reviewed",
+]
+
+
+def prompt_tokens(context, query):
+    return prompt_builder.estimate_tokens(app.LLM_PROMPT_TEMPLATE.format(context=context, query=query))
+
+
+def main(queries):
+    schema = app.listings_store_instance.snapshot().prompt_schema
+    print(f"{'full':>6} {'relevant':>9} {'columns':>8}  query")
+    totals = [0, 0]
+    for query in queries:
+        full = prompt_tokens(schema.context(), query)
+        relevant = prompt_tokens(schema.context(query), query)
+        totals[0] += full
+        totals[1] += relevant
+        print(f"{full:>6} {relevant:>9} {len(schema.relevant_columns(query)):>8}  {query}")
+    print(f"relevant prompts are {1 - totals[1] / totals[0]:.0%} smaller than full ones")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compare LLM prompt sizes")
+    parser.add_argument("--query", action="append", help="Query to measure (repeatable); defaults to a sample set")
+    args = parser.parse_args()
+    main(args.query or QUERIES)
@@ -0,0 +1,61 @@
+"""
+Price / capacity range filtering: pandas boolean indexing vs FilterEngine with and without the sorted range indexes.
+
+    python -m benchmarks.range_filters --rows 300000
+"""
+from argparse import ArgumentParser
+
+import numpy as np
+
+import filter_engine
+from benchmarks.bitmap_filters import best_of, tiled_frame
+
+QUERIES = {
+    "price 800-1000": {"and": [
+        {"column": "pricing/rate/amount", "op": ">=", "value": 800},
+        {"column": "pricing/rate/amount", "op": "<=", "value": 1000},
+    ]},
+    "price < 600, 4+ guests, pool": {"and": [
+        {"column": "pricing/rate/amount", "op": "<", "value": 600},
+        {"column": "guestControls/personCapacity", "op": ">=", "value": 4},
+        {"column": "amenity_Pool", "op": "==", "value": True},
+    ]},
+    "3+ bedrooms, 100+ reviews": {"and": [
+        {"column": "bedroom_count", "op": ">=", "value": 3},
+        {"column": "reviewDetailsInterface/reviewCount", "op": ">=", "value": 100},
+    ]},
+}
+
+
+def pandas_rows(df, ast):
+    mask = np.ones(len(df), dtype=bool)
+    for leaf in ast["and"]:
+        mask &= filter_engine.COMPARISON_OPS[leaf["op"]](df[leaf["column"]], leaf["value"]).to_numpy()
+    return df[mask].index.to_numpy()
+
+
+def main(rows, repeat):
+    df = tiled_frame(rows)
+    indexed = filter_engine.FilterEngine(df)
+    scan = filter_engine.FilterEngine(df, build_indexes=False)
+    print(f"{len(df)} listings, range index {indexed.ranges.nbytes() / 1e6:.1f} MB")
+    for label, ast in QUERIES.items():
+        print(label)
+        expected = None
+        for name, func in [
+            ("pandas boolean indexing", lambda: pandas_rows(df, ast)),
+            ("engine without indexes", lambda: scan.evaluate(ast)),
+            ("engine with indexes", lambda: indexed.evaluate(ast)),
+        ]:
+            seconds, result = best_of(func, repeat)
+            expected = result if expected is None else expected
+            assert np.array_equal(result, expected), name
+            print(f"  {name:<24} {seconds * 1000:8.3f} ms  ({len(result)} matches)")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark numeric range filtering")
+    parser.add_argument("--rows", type=int, default=300000, help="Number of listings (the dataset is tiled)")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per variant, best time is reported")
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
@@ -0,0 +1,50 @@
+"""
+Recommended order: ranking.RankingIndex top-k selection vs a full sort of the match set.
+
+For the match set of every benchmarks/queries.json filter (and of firstcall) over a synthetic dataset, times
+the first page (top `MIN_TOP_K`), a full `np.argsort` of the blended scores and a pandas `sort_values` of the
+matched frame, and checks that the top-k rows are the head of the full order.
+
+    python -m benchmarks.ranking --rows 100000
+"""
+from argparse import ArgumentParser
+
+import numpy as np
+
+import filter_engine
+import listings_store
+import ranking
+from benchmarks import fake_llm, synthetic
+from benchmarks.bitmap_filters import best_of
+
+
+def pandas_rank(listings, rows):
+    # The blend computed on the matched frame and sorted in full, as a per-query DataFrame pipeline would
+    matched = listings.frame.iloc[rows].assign(_score=listings.ranking.scores(rows), _row=rows)
+    return matched.sort_values(["_score", "_row"], ascending=[False, True])["_row"].to_numpy()
+
+
+def main(rows, seed, repeat):
+    listings = listings_store.ListingsStore(synthetic.write_dataset(rows, seed), watch=False).preload()
+    index = listings.ranking
+    print(f"{len(listings.frame)} listings, weights {index.weights}, static scores {index.nbytes() / 1e6:.1f} MB")
+    queries = [("firstcall", {"and": []})] + [(entry["name"], entry["filter"]) for entry in fake_llm.load_corpus()]
+    print(f"{'query':<22} {'matches':>8} {'top-k ms':>9} {'argsort ms':>11} {'pandas ms':>10}")
+    for name, node in queries:
+        matched = listings.engine.evaluate(filter_engine.validate(node, listings.columns))
+        top_seconds, top = best_of(lambda: index.rank(matched, ranking.MIN_TOP_K), repeat)
+        full_seconds, full = best_of(lambda: index.rank(matched), repeat)
+        baseline_seconds, baseline = best_of(lambda: pandas_rank(listings, matched), max(repeat // 10, 1))
+        assert np.array_equal(full, baseline), name
+        assert np.array_equal(top[:ranking.MIN_TOP_K], full[:ranking.MIN_TOP_K]), name
+        assert np.array_equal(np.sort(top), matched), name
+        print(f"{name:<22} {len(matched):8d} {top_seconds * 1000:9.3f} {full_seconds * 1000:11.3f} {baseline_seconds * 1000:10.1f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark top-k recommended ranking over /chat match sets")
+    parser.add_argument("--rows", type=int, default=100000, help="Listings in the synthetic dataset")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic dataset")
+    parser.add_argument("--repeat", type=int, default=50, help="Runs per query, best time is reported")
+    args = parser.parse_args()
+    main(args.rows, args.seed, args.repeat)
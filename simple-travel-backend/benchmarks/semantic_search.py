@@ -0,0 +1,57 @@
+"""
+Semantic ranking: index build time, and brute-force vs IVF query latency and recall on a tiled dataset.
+
+The tiled frame repeats the real listings, so recall@k counts an IVF result as a hit when its score reaches
+the exact k-th best score (duplicates make the exact top-k ambiguous).
+
+    python -m benchmarks.semantic_search --rows 100000
+"""
+from argparse import ArgumentParser
+
+import numpy as np
+
+import filter_engine
+import semantic_index
+from benchmarks.bitmap_filters import best_of, tiled_frame
+
+QUERIES = [
+    "quiet place near the river with a view",
+    "beach front villa with a private pool",
+    "close to the BTS skytrain and shopping malls",
+    "rooftop bar and gym in the city center",
+    "family house with a garden near the night market",
+]
+
+
+def main(rows, repeat, k, nprobe):
+    frame = tiled_frame(rows)
+    build_seconds, index = best_of(lambda: semantic_index.SemanticIndex.build(frame), 1)
+    clusters = len(index.centroids) if index.centroids is not None else 0
+    print(f"{rows} listings: built in {build_seconds:.2f} s, {len(index.vocabulary)} terms, "
+          f"{index.vectors.shape[1]} dimensions, {clusters} IVF clusters, {index.nbytes() / 1e6:.1f} MB")
+    engine = filter_engine.FilterEngine(frame)
+    candidate_sets = {
+        "all listings": np.arange(len(frame)),
+        "pool + wifi": engine.evaluate({"and": [{"column": "amenity_Pool", "op": "==", "value": True},
+                                                {"column": "amenity_Wifi", "op": "==", "value": True}]}),
+    }
+    for label, candidates in candidate_sets.items():
+        print(f"\n{label} ({len(candidates)} rows)")
+        print(f"{'exact ms':>9} {'ivf ms':>8} {'recall@' + str(k):>10}  query")
+        for query in QUERIES:
+            exact_seconds, exact = best_of(lambda: index.rank(query, candidates, "exact"), repeat)
+            ivf_seconds, ivf = best_of(lambda: index.rank(query, candidates, "ivf", nprobe), repeat)
+            embedded = index.embed(query)
+            threshold = index.vectors[exact[k - 1]] @ embedded
+            recall = float(np.mean(index.vectors[ivf[:k]] @ embedded >= threshold - 1e-6))
+            print(f"{exact_seconds * 1000:9.2f} {ivf_seconds * 1000:8.2f} {recall:10.2f}  {query}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark semantic ranking")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--k", type=int, default=10, help="Depth for recall")
+    parser.add_argument("--nprobe", type=int, default=semantic_index.IVF_NPROBE, help="IVF clusters probed per query")
+    args = parser.parse_args()
+    main(args.rows, args.repeat, args.k, args.nprobe)
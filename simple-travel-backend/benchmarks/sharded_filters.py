@@ -0,0 +1,92 @@
+"""
+Filter evaluation in-process vs fanned out to 1..N shard worker processes (filter_shards.ShardedEngine).
+
+Runs the benchmarks/queries.json filters over a synthetic dataset and reports, per shard count, the summed
+median latency of the corpus and the throughput of `--clients` threads querying at once. Speed-ups need as
+many free cores as shards; `os.cpu_count()` is printed with the results.
+
+    python -m benchmarks.sharded_filters --rows 1000000 --shards 1 2 4 8
+    python -m benchmarks.sharded_filters --rows 300000 --by hash
+"""
+import os
+import statistics
+import threading
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+import filter_engine
+import filter_shards
+import listings_store
+from benchmarks import fake_llm, synthetic
+
+
+def corpus_latency(evaluate, filters, repeat):
+    # Sum over the corpus of each filter's median time
+    total = 0.0
+    for node in filters:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            evaluate(node)
+            timings.append(time.perf_counter() - started)
+        total += statistics.median(timings)
+    return total
+
+
+def throughput(evaluate, filters, clients, seconds):
+    # Queries per second with `clients` threads going through the corpus until `seconds` pass
+    done = [0] * clients
+    deadline = time.perf_counter() + seconds
+
+    def client(index):
+        position = index
+        while time.perf_counter() < deadline:
+            evaluate(filters[position % len(filters)])
+            position += 1
+            done[index] += 1
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(done) / (time.perf_counter() - started)
+
+
+def main(rows, seed, shard_counts, by, repeat, clients, seconds):
+    path = synthetic.write_dataset(rows, seed)
+    listings = listings_store.ListingsStore(path, watch=False).preload()
+    filters = [filter_engine.validate(entry["filter"], listings.columns) for entry in fake_llm.load_corpus()]
+    expected = [listings.engine.evaluate(node) for node in filters]
+    print(f"{len(listings.frame)} listings, {len(filters)} filters, {os.cpu_count()} CPUs, shards by {by}")
+    print(f"{'engine':<16} {'corpus ms':>10} {'queries/s':>10} {'build s':>8}")
+    latency = corpus_latency(listings.engine.evaluate, filters, repeat)
+    print(f"{'in-process':<16} {latency * 1000:10.2f} {throughput(listings.engine.evaluate, filters, clients, seconds):10.1f}")
+    for count in shard_counts:
+        sharded = filter_shards.ShardedEngine(listings.source_key[0], listings.engine, listings_store.read_listings, count, by)
+        started = time.perf_counter()
+        if not sharded.wait_ready():
+            raise RuntimeError(f"Shard workers failed: {sharded.last_error}")
+        build_seconds = time.perf_counter() - started
+        for node, rows in zip(filters, expected):
+            assert np.array_equal(sharded.evaluate(node), rows), node
+        latency = corpus_latency(sharded.evaluate, filters, repeat)
+        rate = throughput(sharded.evaluate, filters, clients, seconds)
+        print(f"{f'{count} shards':<16} {latency * 1000:10.2f} {rate:10.1f} {build_seconds:8.1f}")
+        sharded.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark filter evaluation on 1..N shard worker processes")
+    parser.add_argument("--rows", type=int, default=300000, help="Listings in the synthetic dataset")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic dataset")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4], help="Shard counts to compare")
+    parser.add_argument("--by", choices=filter_shards.PARTITIONS, default="city", help="Partition of the listings")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per filter, the median is summed")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent threads of the throughput test")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each throughput test")
+    args = parser.parse_args()
+    main(args.rows, args.seed, args.shards, args.by, args.repeat, args.clients, args.seconds)
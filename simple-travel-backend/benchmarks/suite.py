@@ -0,0 +1,275 @@
+"""
+Benchmark suite over synthetic listings: dataset loading, filter evaluation, /chat responses and ingestion.
+
+Datasets come from benchmarks.synthetic (generated once per size under benchmarks/data/), queries and their
+filters from the corpus in benchmarks/queries.json and LLM answers from benchmarks.fake_llm.FakeChain, so no
+Groq key or network is needed and every run does the same work. Each benchmark runs once to warm up, then
+`--repeat` times; the timings (min / median / mean seconds) are written with the commit, library versions and
+machine to benchmarks/results/<commit>.json, and `--compare` reports the change between two result files.
+
+    python -m benchmarks.suite --rows 10000 100000
+    python -m benchmarks.suite --rows 1000000 --suites load filters
+    python -m benchmarks.suite --compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+
+Suites:
+    load       a cold ListingsStore load of the snapshot (frame, indexes, JSON fragments), and load_original()
+    filters    FilterEngine.evaluate of each corpus filter
+    chat       POST /chat of each corpus query (fake LLM, query cache cleared before each run), firstcall pages
+    serialize  listing JSON of one page and of every listing, and the /chat payload around it
+    ingestion  hotel-data-transformer.py process_csv of a raw scraper dump (`--ingest-rows` listings)
+"""
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+
+# The suite installs its own dataset; nothing is loaded from clean/ and no watcher thread runs
+os.environ.setdefault("PRELOAD_DATASET", "0")
+os.environ.setdefault("DATASET_WATCH", "0")
+
+import numpy as np
+import pandas as pd
+
+import app
+import filter_engine
+import listing_json
+import listings_store
+from benchmarks import fake_llm, synthetic
+from benchmarks.ingestion import load_transformer, synthetic_raw_dump
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results")
+SUITES = ["load", "filters", "chat", "serialize", "ingestion"]
+# Loads take seconds at 1M listings; they are repeated at most this often
+LOAD_REPEAT = 3
+PAGE_SIZE = 20
+
+
+def measure(func, repeat, warmup=1):
+    """
+    Times `func` after `warmup` untimed calls.
+
+    Returns:
+        dict: min / median / mean seconds over `repeat` calls, plus the dict `func` returned on its last call.
+    """
+    for _ in range(warmup):
+        func()
+    timings = []
+    info = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        info = func()
+        timings.append(time.perf_counter() - started)
+    return {"min": min(timings), "median": statistics.median(timings), "mean": statistics.fmean(timings),
+            "repeat": repeat, **(info or {})}
+
+
+def use_dataset(path):
+    # Serve the synthetic dataset from the app's module-level store, as a gunicorn worker would
+    store = listings_store.ListingsStore(path, watch=False)
+    store.reload_listeners.append(app.query_cache_instance.on_dataset_reload)
+    app.listings_store_instance = store
+    return store.preload()
+
+
+def clear_query_cache():
+    app.query_cache_instance.filters.clear()
+    app.query_cache_instance.results.clear()
+    app.query_cache_instance.responses.clear()
+
+
+def load_suite(path, repeat):
+    def cold():
+        loaded = listings_store.ListingsStore(path, watch=False).preload()
+        return {"rows": len(loaded.frame), "frame_bytes": loaded.frame_bytes}
+
+    return {
+        "load.snapshot": measure(cold, min(repeat, LOAD_REPEAT), warmup=0),
+        "load.load_original": measure(lambda: {"rows": len(app.load_original())}, repeat),
+    }
+
+
+def filters_suite(listings, corpus, repeat):
+    results = {}
+    for entry in corpus:
+        filter_ast = filter_engine.validate(entry["filter"], listings.columns)
+        results[f"filters.{entry['name']}"] = measure(lambda: {"matches": len(listings.engine.evaluate(filter_ast))}, repeat)
+    return results
+
+
+def chat_suite(corpus, repeat):
+    client = app.app.test_client()
+    app.query_chain = fake_llm.FakeChain()
+
+    def post(body, cached=False):
+        def run():
+            if not cached:
+                clear_query_cache()
+            response = client.post("/chat", json=body)
+            if response.status_code != 200:
+                raise RuntimeError(f"/chat {body} failed: {response.get_data(as_text=True)}")
+            payload = json.loads(response.data)
+            return {"path": response.headers.get("X-Query-Path"), "total": payload.get("total"), "bytes": len(response.data)}
+        return run
+
+    results = {}
+    for entry in corpus:
+        results[f"chat.{entry['name']}"] = measure(post({"query": entry["query"], "page_size": PAGE_SIZE}), repeat)
+    results["chat.cached_query"] = measure(post({"query": corpus[0]["query"], "page_size": PAGE_SIZE}, cached=True), repeat)
+    results["chat.firstcall"] = measure(post({"query": "firstcall", "page_size": PAGE_SIZE}), repeat)
+    results["chat.firstcall_sorted_page"] = measure(
+        post({"query": "firstcall", "page": 50, "page_size": PAGE_SIZE, "sort_by": "price"}), repeat
+    )
+    return results
+
+
+def serialize_suite(listings, repeat):
+    serializer = listings.serializer
+    everything = np.arange(len(listings.frame))
+    page = everything[:PAGE_SIZE]
+    encoded = serializer.encode(everything)
+    return {
+        "serialize.page": measure(lambda: {"bytes": len(serializer.encode(page))}, repeat),
+        "serialize.all": measure(lambda: {"bytes": len(serializer.encode(everything))}, repeat),
+        "serialize.all_fields": measure(
+            lambda: {"bytes": len(serializer.encode(everything, ["idStr", "name", "price", "stars"]))}, repeat
+        ),
+        "serialize.payload": measure(lambda: {"bytes": len(listing_json.chat_payload([], encoded))}, repeat),
+    }
+
+
+def ingestion_suite(rows, unused_columns, seed, repeat):
+    transformer = load_transformer()
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "dump.csv")
+        base = synthetic.synthetic_listings(rows, seed)
+        synthetic_raw_dump(rows, unused_columns, seed, base=base).to_csv(path, index=False)
+        size = os.path.getsize(path)
+
+        def process():
+            return {"rows": len(transformer.process_csv(path)), "csv_bytes": size}
+
+        return {"ingestion.process_csv": measure(process, min(repeat, LOAD_REPEAT))}
+
+
+def git_commit():
+    # (commit, whether tracked files differ from it), or (None, False) outside a git checkout
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, bool(status.strip())
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run(sizes, suites, repeat, seed, ingest_rows, unused_columns, output):
+    corpus = fake_llm.load_corpus()
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "settings": {"rows": sizes, "suites": suites, "repeat": repeat, "seed": seed,
+                     "ingest_rows": ingest_rows, "unused_columns": unused_columns},
+        "results": {},
+    }
+    app.app.logger.disabled = True
+    print(f"{'listings':>9} {'benchmark':<36} {'median ms':>10} {'min ms':>10}")
+    for rows in sizes:
+        path = synthetic.write_dataset(rows, seed)
+        results = {}
+        # The app and the transformer print per request / file; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            listings = use_dataset(path)
+        for suite in suites:
+            with contextlib.redirect_stdout(io.StringIO()):
+                if suite == "load":
+                    measured = load_suite(path, repeat)
+                elif suite == "filters":
+                    measured = filters_suite(listings, corpus, repeat)
+                elif suite == "chat":
+                    measured = chat_suite(corpus, repeat)
+                elif suite == "serialize":
+                    measured = serialize_suite(listings, repeat)
+                else:
+                    measured = ingestion_suite(min(rows, ingest_rows), unused_columns, seed, repeat)
+            for name, result in measured.items():
+                print(f"{rows:9d} {name:<36} {result['median'] * 1000:10.3f} {result['min'] * 1000:10.3f}")
+            results.update(measured)
+        report["results"][str(rows)] = results
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Results written to {output}")
+
+
+def compare(old_path, new_path, threshold, stat):
+    """
+    Prints the ratio of each benchmark's `stat` time between two result files.
+
+    Returns:
+        int: Exit status, 1 if any benchmark got slower by more than `threshold` (0.1 = 10%).
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    if old["environment"] != new["environment"]:
+        print("Warning: the results come from different environments:", old["environment"], new["environment"])
+    print(f"{(old['commit'] or '?')[:12]} -> {(new['commit'] or '?')[:12]}{' (dirty)' if new.get('dirty') else ''}")
+    print(f"{'listings':>9} {'benchmark':<36} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    regressions = 0
+    for rows, results in new["results"].items():
+        for name, result in results.items():
+            previous = old["results"].get(rows, {}).get(name)
+            if previous is None:
+                continue
+            ratio = result[stat] / previous[stat] if previous[stat] else float("inf")
+            flag = "slower" if ratio > 1 + threshold else "faster" if ratio < 1 / (1 + threshold) else ""
+            regressions += flag == "slower"
+            print(f"{rows:>9} {name:<36} {previous[stat] * 1000:10.3f} {result[stat] * 1000:10.3f} {ratio:6.2f}x {flag}")
+    print(f"{regressions} benchmark(s) slower by more than {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Run the benchmark suite over synthetic listings, or compare two result files")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="Dataset sizes, e.g. 10000 100000 1000000")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=SUITES)
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic datasets")
+    parser.add_argument("--ingest-rows", type=int, default=5000, help="Listings in the raw dump of the ingestion suite")
+    parser.add_argument("--unused-columns", type=int, default=1000, help="Columns of the raw dump the pipeline drops")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change reported as slower / faster")
+    parser.add_argument("--stat", choices=["min", "median", "mean"], default="median", help="Timing compared by --compare")
+    args = parser.parse_args()
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold, args.stat))
+    commit, dirty = git_commit()
+    name = f"{commit[:12]}{'-dirty' if dirty else ''}" if commit else time.strftime("%Y%m%d-%H%M%S")
+    run(args.rows, args.suites, args.repeat, args.seed, args.ingest_rows, args.unused_columns,
+        args.output or os.path.join(RESULTS_DIR, f"{name}.json"))
@@ -0,0 +1,351 @@
+"""
+Synthetic listings with every `chat_config.FINAL_COLUMNS` column, at any size (10k / 100k / 1M rows).
+
+Listings are drawn from a seeded generator, so the same rows and seed give the same dataset on every machine.
+Values follow the scraped Thai dataset: Bangkok, Phuket and Krabi neighbourhoods with coordinates, the same
+room types, house rules and locales, prices, capacities and ratings in the same ranges, and about 45% of the
+amenities present. Ids, names, addresses and URLs are unique per listing; descriptions and photo URLs are
+drawn from a pool of distinct values per neighbourhood, so a million listings fit in memory while they are
+generated.
+
+`write_dataset` stores the listings as a snapshot (with the semantic index, as the master snapshot has)
+under `benchmarks/data/` and reuses it on the next run.
+
+    python -m benchmarks.synthetic --rows 100000
+"""
+import os
+import shutil
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import pandas as pd
+
+import chat_config
+import semantic_index
+import snapshot
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "benchmarks", "data")
+# Bump when the generated values change, so cached datasets are rebuilt
+GENERATOR_VERSION = 1
+# Distinct description / photo values per neighbourhood
+TEXT_VARIANTS = 64
+PHOTO_SLOTS = 31
+
+# (city, address, latitude, longitude, spread in degrees, weight)
+PLACES = [
+    ("Watthana", "Watthana, Krung Thep Maha Nakhon, Thailand", 13.738, 100.560, 0.012, 8),
+    ("Khet Khlong Toei", "Khet Khlong Toei, Krung Thep Maha Nakhon, Thailand", 13.722, 100.556, 0.012, 6),
+    ("Bangkok", "Bangkok, Krung Thep Maha Nakhon, Thailand", 13.750, 100.520, 0.040, 6),
+    ("Khet Ratchathewi", "Khet Ratchathewi, Krung Thep Maha Nakhon, Thailand", 13.758, 100.534, 0.010, 3),
+    ("Khet Bang Rak", "Khet Bang Rak, Krung Thep Maha Nakhon, Thailand", 13.729, 100.524, 0.008, 3),
+    ("Khet Sathon", "Khet Sathon, Krung Thep Maha Nakhon, Thailand", 13.716, 100.528, 0.008, 2),
+    ("Khet Huai Khwang", "Khet Huai Khwang, Krung Thep Maha Nakhon, Thailand", 13.776, 100.579, 0.010, 2),
+    ("Khet Chatuchak", "Khet Chatuchak, Krung Thep Maha Nakhon, Thailand", 13.828, 100.560, 0.012, 2),
+    ("Khet Suan Luang", "Khet Suan Luang, Krung Thep Maha Nakhon, Thailand", 13.733, 100.650, 0.012, 2),
+    ("Khet Phra Nakhon", "Khet Phra Nakhon, Krung Thep Maha Nakhon, Thailand", 13.756, 100.499, 0.006, 2),
+    ("Tambon Patong", "Tambon Patong, Chang Wat Phuket, Thailand", 7.896, 98.297, 0.008, 6),
+    ("Tambon Karon", "Tambon Karon, Chang Wat Phuket, Thailand", 7.847, 98.294, 0.008, 3),
+    ("Tambon Rawai", "Tambon Rawai, Chang Wat Phuket, Thailand", 7.779, 98.325, 0.012, 4),
+    ("Tambon Choeng Thale", "Tambon Choeng Thale, Chang Wat Phuket, Thailand", 8.003, 98.297, 0.012, 5),
+    ("Kamala", "Kamala, Phuket, Thailand", 7.950, 98.283, 0.008, 4),
+    ("Tambon Chalong", "Tambon Chalong, Chang Wat Phuket, Thailand", 7.846, 98.338, 0.010, 2),
+    ("Tambon Talat Yai", "Tambon Talat Yai, Chang Wat Phuket, Thailand", 7.885, 98.388, 0.006, 2),
+    ("Ao Nang", "Ao Nang, Krabi, Thailand", 8.031, 98.823, 0.010, 8),
+    ("Tambon Ao Nang", "Tambon Ao Nang, Chang Wat Krabi, Thailand", 8.040, 98.815, 0.012, 6),
+    ("Tambon Nuea Khlong", "Tambon Nuea Khlong, Chang Wat Krabi, Thailand", 8.075, 98.995, 0.020, 2),
+    ("Ko Lanta", "Ko Lanta, Krabi, Thailand", 7.620, 99.040, 0.030, 2),
+    ("Krabi", "Krabi, Thailand", 8.060, 98.915, 0.010, 2),
+]
+# Area and nearby landmark used in names and descriptions, per place
+PLACE_SIGHTS = [
+    ("Sukhumvit", "BTS Asok"), ("Khlong Toei", "Benjakitti Park"), ("Bangkok", "the Grand Palace"),
+    ("Ratchathewi", "Victory Monument"), ("Silom", "Lumphini Park"), ("Sathorn", "BTS Chong Nonsi"),
+    ("Huai Khwang", "Rama 9"), ("Chatuchak", "Chatuchak Market"), ("Suan Luang", "Seacon Square"),
+    ("Old Town", "Khao San Road"), ("Patong", "Patong Beach"), ("Karon", "Karon Beach"), ("Rawai", "Nai Harn Beach"),
+    ("Bang Tao", "Laguna"), ("Kamala", "Kamala Beach"), ("Chalong", "the Big Buddha"),
+    ("Phuket Town", "Phuket Old Town"), ("Ao Nang", "Ao Nang Beach"), ("Ao Nang", "Railay Beach"),
+    ("Nuea Khlong", "the Emerald Pool"), ("Ko Lanta", "Long Beach"), ("Krabi Town", "the night market"),
+]
+ROOM_TYPES = {
+    "entire_home": (0.75, ["Entire villa", "Entire home", "Entire rental unit", "Entire condo",
+                           "Entire serviced apartment", "Entire townhouse", "Entire bungalow", "Entire place",
+                           "Entire vacation home", "Entire loft"]),
+    "private_room": (0.22, ["Private room in resort", "Private room in rental unit", "Private room in villa",
+                            "Private room in bed and breakfast", "Private room in condo", "Private room in home",
+                            "Private room in hostel", "Private room in guest suite", "Room in hotel",
+                            "Room in boutique hotel"]),
+    "hotel_room": (0.025, ["Room in hotel", "Room in boutique hotel", "Room in aparthotel", "Room in resort"]),
+    "shared_room": (0.005, ["Shared room in hostel"]),
+}
+NAME_WORDS = {
+    "Entire villa": "Pool Villa", "Entire home": "House", "Entire rental unit": "Apartment", "Entire condo": "Condo",
+    "Entire serviced apartment": "Serviced Apartment", "Entire townhouse": "Townhouse", "Entire bungalow": "Bungalow",
+    "Entire place": "Home", "Entire vacation home": "Holiday Home", "Entire loft": "Loft",
+}
+ADJECTIVES = ["Cozy", "Modern", "Luxury", "Spacious", "Charming", "Stylish", "Quiet", "Bright", "Tropical",
+              "Boutique", "Family", "Private", "Deluxe", "Affordable", "Sea View", "Garden", "Rooftop", "Budget"]
+FEATURES = ["with Pool", "near Beach", "with Balcony", "near BTS", "with Sea View", "with Gym", "with Kitchen",
+            "for Families", "with Jacuzzi", "in Old Town", "with Garden", "near Night Market"]
+HOUSE_RULES = [
+    (" ", 0.25), ("No pets", 0.2), ("No smoking", 0.1), ("No smoking, parties, or events", 0.12),
+    ("No parties or events", 0.05), ("Check-in is anytime after 3PM", 0.06),
+    ("Check-in is anytime after 2PM and check out by 11AM", 0.05),
+    ("Check-in is anytime after 2PM and check out by 12PM (noon)", 0.05),
+    ("Check-in is anytime after 3PM and check out by 12PM (noon)", 0.05),
+    ("Not safe or suitable for infants (under 2 years) and pets", 0.02),
+    ("Not safe or suitable for children (0-12) and pets", 0.02),
+    ("Check-in time is 2PM - 10PM and check out by 12PM (noon)", 0.02),
+    ("Check-in is flexible", 0.01),
+]
+LANGUAGES = [("en", "English", 0.68), ("zh", "Chinese (Simplified)", 0.15), ("th", "Thai", 0.13),
+             ("fr", "French", 0.02), ("ru", "Russian", 0.01), ("de", "German", 0.01)]
+# Probability of each guestControls/allows* flag
+ALLOWS = {"allowsChildren": 0.8, "allowsEvents": 0.1, "allowsInfants": 0.5, "allowsPets": 0.15, "allowsSmoking": 0.1}
+REVIEW_COLUMNS = ['Accuracy', 'Communication', 'Cleanliness', 'Location', 'Check-in', 'Value']
+SENTENCES = {
+    "description": [
+        "Welcome to our {adjective} home in {area}, a short walk from {sight}.",
+        "The {bedrooms} bedroom space is fully furnished and cleaned before every stay.",
+        "Enjoy the shared swimming pool, fitness room and a rooftop garden with city views.",
+        "Each bedroom has air conditioning, blackout curtains and a comfortable queen size bed.",
+        "The kitchen comes with a fridge, stove, microwave, kettle, dishes and cutlery.",
+        "High speed wifi and a smart TV with Netflix are included for remote work or movie nights.",
+        "Restaurants, cafes, a 7-Eleven and a local market are just around the corner.",
+        "{sight} is about {minutes} minutes away by taxi, Grab or tuk tuk.",
+        "Fresh towels, shampoo, soap and a hair dryer are provided for every guest.",
+        "The balcony overlooks a quiet garden, perfect for morning coffee or a sunset drink.",
+        "Families are welcome and we can provide a baby cot and high chair on request.",
+        "Free parking is available on site and a 24 hour security guard watches the building.",
+        "Laundry facilities with a washing machine and drying rack are available in the unit.",
+        "Our team speaks English and Thai and is happy to arrange tours, transfers and massages.",
+        "The beach is a {minutes} minute walk, with sunbeds, seafood restaurants and beach bars.",
+        "This is a great base for exploring {area} and the places around it.",
+    ],
+    "summary": [
+        "{adjective} {bedrooms} bedroom place in {area}, close to {sight}.",
+        "Perfect for couples, families and business travellers.",
+        "Private pool, fast wifi and a fully equipped kitchen.",
+        "Walking distance to shops, restaurants and public transport.",
+        "Relax in a peaceful neighbourhood only minutes from the action.",
+    ],
+    "space": [
+        "The living room opens onto a large terrace with outdoor seating.",
+        "Bedrooms have air conditioning, wardrobes and en-suite bathrooms with rain showers.",
+        "The open plan kitchen has a dining table for {guests} guests.",
+        "The building has a lift, a swimming pool, a gym and a sauna.",
+        "A washing machine, iron and ironing board are in the utility room.",
+        "Floor to ceiling windows give plenty of natural light and views over {area}.",
+    ],
+    "neighborhoodOverview": [
+        "{area} is known for its street food, night markets and friendly locals.",
+        "{sight} is nearby, and supermarkets, pharmacies and massage shops are within walking distance.",
+        "The area is quiet at night but lively during the day.",
+    ],
+    "transit": [
+        "Grab and taxis are easy to find, and {sight} is {minutes} minutes away.",
+        "We can arrange an airport pickup for an extra charge.",
+        "Scooter rental is available next to the building.",
+    ],
+    "interaction": [
+        "We are available by message any time during your stay.",
+        "Self check-in with a key box, and our manager lives nearby if you need anything.",
+    ],
+    "notes": [
+        "- Extra-person charge: THB 500 per night.",
+        "- A security deposit is collected at check-in and refunded at check-out.",
+        "- Electricity is included up to 20 units per night.",
+    ],
+    "houseRules": [
+        "- No smoking indoors.",
+        "- Please keep noise down after 10PM.",
+        "- No parties or events.",
+        "- Please take off your shoes inside.",
+    ],
+}
+# Number of sentences per text column: (min, max)
+SENTENCE_COUNTS = {"description": (6, 14), "summary": (2, 4), "space": (3, 6), "neighborhoodOverview": (2, 3),
+                   "transit": (1, 2), "interaction": (1, 2), "notes": (1, 3), "houseRules": (2, 4)}
+
+
+def _weighted(rng, weights, rows):
+    weights = np.asarray(weights, dtype=float)
+    return rng.choice(len(weights), size=rows, p=weights / weights.sum())
+
+
+def _with_missing(rng, values, share):
+    values = values.astype(float)
+    values[rng.random(len(values)) < share] = np.nan
+    return values
+
+
+def _text_pools(rng, column):
+    """
+    Returns TEXT_VARIANTS texts per place for one sectionedDescription column, as an object array indexed by
+    place * TEXT_VARIANTS + variant.
+    """
+    sentences = SENTENCES[column]
+    low, high = SENTENCE_COUNTS[column]
+    separator = "\n" if column in ("houseRules", "notes") else " "
+    pool = []
+    for place, (area, sight) in enumerate(PLACE_SIGHTS):
+        for _ in range(TEXT_VARIANTS):
+            picked = rng.choice(len(sentences), size=min(rng.integers(low, high + 1), len(sentences)), replace=False)
+            values = {"area": area, "sight": sight, "adjective": ADJECTIVES[rng.integers(len(ADJECTIVES))].lower(),
+                      "bedrooms": rng.integers(1, 6), "guests": rng.integers(2, 13), "minutes": rng.integers(3, 25)}
+            text = separator.join(sentences[i].format(**values) for i in sorted(picked))
+            pool.append(text[0].upper() + text[1:])
+    return np.array(pool, dtype=object)
+
+
+def synthetic_listings(rows, seed=0):
+    """
+    Generates `rows` listings with the columns of `chat_config.FINAL_COLUMNS`, in that order.
+
+    Parameters:
+        rows (int): Number of listings.
+        seed (int, optional): Seed of the generator; the same seed and rows give the same listings.
+
+    Returns:
+        pd.DataFrame: Cleaned listings frame, as the transformer writes it (untyped; `snapshot.apply_schema` types it).
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+
+    # Ids: half small legacy ids, half 18-digit ids, both unique and increasing with the row
+    positions = np.arange(rows, dtype=np.int64)
+    legacy = rng.random(rows) < 0.5
+    ids = np.where(legacy, 10**6 + positions * 50 + rng.integers(0, 50, rows),
+                   6 * 10**17 + positions * 10**9 + rng.integers(0, 10**9, rows))
+    columns['idStr'] = ids
+
+    place = _weighted(rng, [weight for *_, weight in PLACES], rows)
+    lat = np.array([p[2] for p in PLACES])[place] + rng.normal(0, 1, rows) * np.array([p[4] for p in PLACES])[place]
+    lng = np.array([p[3] for p in PLACES])[place] + rng.normal(0, 1, rows) * np.array([p[4] for p in PLACES])[place]
+
+    categories = list(ROOM_TYPES)
+    category = _weighted(rng, [share for share, _ in ROOM_TYPES.values()], rows)
+    room_type = np.empty(rows, dtype=object)
+    for index, name in enumerate(categories):
+        chosen = np.flatnonzero(category == index)
+        types = ROOM_TYPES[name][1]
+        room_type[chosen] = np.array(types, dtype=object)[rng.integers(0, len(types), len(chosen))]
+    entire = category == 0
+
+    bedrooms = np.where(entire, np.minimum(rng.geometric(0.4, rows), 12), 1)
+    bathrooms = np.maximum(np.round(bedrooms * rng.uniform(0.6, 1.2, rows) * 2) / 2, 1)
+    beds = bedrooms + rng.integers(0, 3, rows)
+    capacity = np.clip(bedrooms * 2 + rng.integers(0, 3, rows), 1, 22)
+    price = np.clip(np.exp(rng.normal(np.log(600) + 0.6 * np.log(bedrooms), 0.7)), 196, 60000).astype(np.int64)
+    reviews = np.where(rng.random(rows) < 0.55, 0, rng.geometric(0.06, rows))
+
+    adjective = rng.integers(0, len(ADJECTIVES), rows)
+    feature = rng.integers(0, len(FEATURES), rows)
+    names = [
+        f"{ADJECTIVES[a]} {b}BR {NAME_WORDS.get(t, t.split(' in ')[-1].title())} {FEATURES[f]} - {PLACE_SIGHTS[p][0]}"
+        for a, b, t, f, p in zip(adjective.tolist(), bedrooms.tolist(), room_type.tolist(), feature.tolist(), place.tolist())
+    ]
+    columns['name'] = names
+    columns['address'] = np.array([p[1] for p in PLACES], dtype=object)[place]
+    columns['bathroom_count'] = _with_missing(rng, bathrooms, 0.01)
+    columns['bed_count'] = _with_missing(rng, beds, 0.005)
+    columns['bedroom_count'] = _with_missing(rng, bedrooms, 0.008)
+    columns['city'] = np.array([p[0] for p in PLACES], dtype=object)[place]
+    columns['country'] = np.full(rows, "Thailand", dtype=object)
+    columns[chat_config.LATITUDE_COLUMN] = lat
+    columns[chat_config.LONGITUDE_COLUMN] = lng
+    for flag, share in ALLOWS.items():
+        columns[f'guestControls/{flag}'] = (rng.random(rows) < share).astype(np.int8)
+    columns['guestControls/personCapacity'] = capacity
+    rules = np.array([rule for rule, _ in HOUSE_RULES], dtype=object)
+    for slot in range(3):
+        columns[f'guestControls/structuredHouseRules/{slot}'] = rules[_weighted(rng, [w for _, w in HOUSE_RULES], rows)]
+
+    for col in chat_config.FINAL_COLUMNS:
+        if col.startswith('amenity_'):
+            columns[col] = (rng.random(rows) < rng.uniform(0.09, 0.83)).astype(np.int8)
+
+    # Photo URLs: one pool of image ids per place, listings have 20 to 31 photos
+    photo_ids = [rng.bytes(16).hex() for _ in range(len(PLACE_SIGHTS) * TEXT_VARIANTS * 4)]
+    photo_counts = rng.integers(20, PHOTO_SLOTS + 1, rows)
+    pictures = np.array([f"https://a0.muscache.com/im/pictures/{i[:8]}-{i[8:12]}-{i[12:16]}-{i[16:20]}-{i[20:]}.jpg"
+                         for i in photo_ids], dtype=object)
+    large = pictures + "?aki_policy=large"
+    small = pictures + "?aki_policy=small"
+    for slot in range(PHOTO_SLOTS):
+        picked = place * TEXT_VARIANTS * 4 + rng.integers(0, TEXT_VARIANTS * 4, rows)
+        present = photo_counts > slot
+        columns[f'photos/{slot}/pictureUrl'] = np.where(present, large[picked], None)
+        columns[f'photos/{slot}/thumbnailUrl'] = np.where(present, small[picked], None)
+
+    columns['pricing/rate/amount'] = price
+    columns['reviewDetailsInterface/reviewCount'] = reviews
+    reviewed = reviews > 0
+    overall = np.clip(rng.normal(4.8, 0.2, rows), 3.0, 5.0)
+    for label in REVIEW_COLUMNS:
+        columns[label] = np.where(reviewed, np.clip(np.round(overall + rng.normal(0, 0.15, rows), 1), 1.0, 5.0), np.nan)
+    rated = reviews >= 3
+    columns['reviewsModule/localizedOverallRating'] = np.where(rated, np.round(overall, 2), np.nan)
+    columns['stars'] = columns['reviewsModule/localizedOverallRating']
+    columns['roomType'] = room_type
+    columns['roomTypeCategory'] = np.array(categories, dtype=object)[category]
+    language = _weighted(rng, [share for *_, share in LANGUAGES], rows)
+    for col in ['description', 'houseRules', 'interaction', 'neighborhoodOverview', 'notes', 'space', 'summary', 'transit']:
+        pool = _text_pools(rng, col)
+        columns[f'sectionedDescription/{col}'] = pool[place * TEXT_VARIANTS + rng.integers(0, TEXT_VARIANTS, rows)]
+    columns['sectionedDescription/locale'] = np.array([code for code, *_ in LANGUAGES], dtype=object)[language]
+    columns['sectionedDescription/localizedLanguageName'] = np.array([name for _, name, _ in LANGUAGES], dtype=object)[language]
+    columns['sectionedDescription/name'] = names
+    columns['maxNights'] = np.array([365, 1125, 90, 30, 28])[_weighted(rng, [0.6, 0.2, 0.1, 0.05, 0.05], rows)]
+    columns['minNights'] = np.array([1, 2, 3, 7, 30])[_weighted(rng, [0.65, 0.15, 0.1, 0.05, 0.05], rows)]
+    columns['numberOfGuests'] = np.minimum(capacity, 16)
+    columns['url'] = [f"https://www.airbnb.com/rooms/{listing_id}" for listing_id in ids.tolist()]
+    return pd.DataFrame({col: columns[col] for col in chat_config.FINAL_COLUMNS})
+
+
+def dataset_path(rows, seed=0, data_dir=DATA_DIR):
+    return os.path.join(data_dir, f"synthetic-{rows}-{seed}", "listings.csv")
+
+
+def write_dataset(rows, seed=0, data_dir=DATA_DIR, rebuild=False):
+    """
+    Writes the synthetic listings as a snapshot with its semantic index, unless an up-to-date one exists.
+
+    Parameters:
+        rows (int): Number of listings.
+        seed (int, optional): Seed of the generator.
+        data_dir (str, optional): Parent directory of the datasets. Defaults to `benchmarks/data`.
+        rebuild (bool, optional): Regenerate even if the dataset exists.
+
+    Returns:
+        str: Dataset path for `listings_store.ListingsStore` (its snapshot is `<dir>/listings.snapshot`).
+    """
+    path = dataset_path(rows, seed, data_dir)
+    directory = os.path.dirname(path)
+    marker = os.path.join(directory, "generator.version")
+    snapshot_path = snapshot.snapshot_path_for(path)
+    if not rebuild and os.path.exists(os.path.join(snapshot_path, snapshot.SCHEMA_FILE)):
+        with open(marker) as f:
+            if f.read().strip() == str(GENERATOR_VERSION):
+                return path
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    started = time.perf_counter()
+    frame = synthetic_listings(rows, seed)
+    snapshot.write_snapshot(frame, snapshot_path, extras=semantic_index.SemanticIndex.build(frame).extras())
+    with open(marker, "w") as f:
+        f.write(str(GENERATOR_VERSION))
+    print(f"Generated {rows} synthetic listings in {time.perf_counter() - started:.1f} s: {directory}")
+    return path
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Generate a synthetic listings snapshot")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate datasets that already exist")
+    args = parser.parse_args()
+    for rows in args.rows:
+        print(write_dataset(rows, args.seed, args.data_dir, args.rebuild))
@@ -0,0 +1,51 @@
+"""
+Full-text search: pandas `str.contains` scans vs the BM25 inverted index on a tiled dataset.
+
+The scan checks every query word against every indexed column, like a `contains` filter per word would; the
+index also ranks its matches, so match counts can differ where stemming, prefixes or place names apply.
+
+    python -m benchmarks.text_search --rows 100000
+"""
+from argparse import ArgumentParser
+
+import numpy as np
+
+import chat_config
+import text_index
+from benchmarks.bitmap_filters import best_of, tiled_frame
+
+QUERIES = ["Sukhumvit", "rooftop pool", "Huai Khwang", "BTS Asok", "chao phraya river view", "sukhu"]
+
+
+def main(rows, repeat, limit):
+    frame = tiled_frame(rows)
+    build_seconds, index = best_of(lambda: text_index.TextIndex(frame), 1)
+    print(f"{rows} listings: built in {build_seconds:.2f} s, {len(index.terms)} terms, {index.nbytes() / 1e6:.1f} MB")
+    columns = [col for col in chat_config.SEARCH_TEXT_COLUMNS if col in frame.columns]
+    texts = frame[columns].fillna("").astype(str)
+
+    def scan(query):
+        mask = np.ones(len(frame), dtype=bool)
+        for word in query.split():
+            hits = np.zeros(len(frame), dtype=bool)
+            for col in columns:
+                hits |= texts[col].str.contains(word, case=False, regex=False).to_numpy()
+            mask &= hits
+        return np.flatnonzero(mask)
+
+    print(f"{'scan ms':>9} {'match ms':>9} {'top-' + str(limit) + ' ms':>9} {'scan':>7} {'index':>7}  query")
+    for query in QUERIES:
+        scan_seconds, scanned = best_of(lambda: scan(query), 1)
+        match_seconds, matched = best_of(lambda: index.match(query), repeat)
+        search_seconds, _ = best_of(lambda: index.search(query, limit=limit), repeat)
+        print(f"{scan_seconds * 1000:9.1f} {match_seconds * 1000:9.3f} {search_seconds * 1000:9.3f} "
+              f"{len(scanned):7d} {len(matched):7d}  {query}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark full-text search")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20, help="Results ranked by /search")
+    args = parser.parse_args()
+    main(args.rows, args.repeat, args.limit)
@@ -42,98 +42,22 @@ DEFAULT_PROMPT_WITHOUT_HISTORY = """
     Answer:
     """ 
 HOTEL_QUERY_PROMPT = """
-    Empty placeholders, please ignore: $context
-
-    Write a python query for a dataframe of hotel listings. I will provide the column names, example values from each column and the user's query. Your task is to convert the user's query to a pandas query in the format I will specify. Here is the list of column names and data types;
-    'bathroom_count : [1. 5. 6.]',
-    'bed_count : [2 6 4]',
-    'bedroom_count : [2. 1. 6.]',
-    "city : ['Khet Huai Khwang' 'Huai Khwang' 'Huaikhwang']",
-    "country : ['Thailand']",
-    'guestControls/allowsChildren : [ True False]',
-    'guestControls/allowsEvents : [False  True]',
-    'guestControls/allowsInfants : [ True False]',
-    'guestControls/allowsPets : [False  True]',
-    'guestControls/allowsSmoking : [False  True]',
-    'guestControls/personCapacity : [7 5 4]',
-    'amenity_Kitchen : [ True False]',
-    'amenity_Elevator : [ True False]',
-    'amenity_Wifi : [ True False]',
-    'amenity_Heating : [ True False]',
-    'amenity_Iron : [ True False]',
-    'amenity_Cable TV : [ True False]',
-    'amenity_Gym : [ True False]',
-    'amenity_Hair dryer : [ True False]',
-    'amenity_Dryer : [False  True]',
-    'amenity_Hangers : [ True False]',
-    'amenity_Washer : [ True False]',
-    'amenity_Essentials : [True False nan]',
-    'amenity_Shampoo : [True False nan]',
-    'amenity_Pool : [True False nan]',
-    'amenity_Air conditioning : [True nan False]',
-    'amenity_TV : [True nan False]',
-    'amenity_Smoke alarm : [True False nan]',
-    'amenity_Carbon monoxide alarm : [False True nan]',
-    'amenity_Fire extinguisher : [True False nan]',
-    'amenity_Coffee maker : [nan True False]',
-    'amenity_Refrigerator : [nan True False]',
-    'amenity_Dishwasher : [nan True False]',
-    'amenity_Dishes and silverware : [nan True]',
-    'amenity_Oven : [nan True]',
-    'amenity_Stove : [nan True]',
-    'amenity_BBQ grill : [nan True]',
-    'amenity_Patio or balcony : [nan True]',
-    'amenity_Backyard : [nan True]',
-    'amenity_Cleaning available during stay : [nan True]',
-    'amenity_Host greets you : [nan True]',
-    'amenity_Waterfront : [nan True]',
-    'amenity_Safe : [nan True]',
-    'amenity_Board games : [nan True]',
-    'amenity_Hot water kettle : [nan True]',
-    'amenity_Sound system : [nan True]',
-    'amenity_Outdoor shower : [nan True]',
-    'amenity_Hot_water : [False nan True]',
-    'amenity_Outdoor_dining_area : [nan True]',
-    'amenity_Dining_table : [nan True]',
-    'amenity_Outdoor_furniture : [nan True]',
-    'amenity_Freezer : [nan True]',
-    'maxNights : [1125  365   30]',
-    'minNights : [  1 100   3]',
-    'numberOfGuests : [7 5 4]',
-    'pricing/rate/amount : [27001  7776  8100]',
-    'reviewDetailsInterface/reviewCount : [12 40 53]',
-    'Accuracy : [4.5 4.6 4.8]',
-    'Communication : [4.5 4.6 4.8]',
-    'Cleanliness : [4.3 4.2 4.5]',
-    'Location : [4.8 4.7 4.6]',
-    'Check-in : [4.7 4.5 4.8]',
-    'Value : [4.7 4.2 4.5]',
-    'reviewsModule/localizedOverallRating : [4.58 4.33 4.48]',
-    'stars : [4.58 4.33 4.48]',
-    "roomType : ['Entire condo' 'Entire rental unit' 'Private room in hostel']",
-    "roomTypeCategory : ['entire_home' 'private_room' 'hotel_room' 'shared_room']"
+    Write a JSON filter for a table of hotel listings. I will provide the columns with their types and values, and the user's query. Your task is to convert the user's query to a JSON filter in the format I will specify. Here are the columns:
+    $context
 
-    Now I will provide 2 successful examples of this task:
-    User's query; Need at least 2 beds, 3 bathrooms. Price should be under 1000 and pets should be allowed
-    Converted python query:
-    df[
-        (df['bed_count'] >= 2) &
-        (df['bathroom_count'] >= 3) &
-        (df['pricing/rate/amount'] < 1000) &
-        (df['guestControls/allowsPets'] == True)
-    ]
+    A filter is a JSON object. A condition looks like {"column": <column name>, "op": <operator>, "value": <value>},
+    where the operator is one of ==, !=, <, <=, >, >=, in, not_in, contains. Conditions are combined with
+    {"and": [...]}, {"or": [...]} and {"not": {...}}. Use true/false for the true/false columns.
+    For places, landmarks or features that no column covers, use {"column": "text", "op": "text_match", "value": <words>};
+    it matches listings whose name, address, city or description contain all of the words.
 
-    User's query: Looking for rooms with at least 2 beds. Price must be less than 1000. Should have kitchen and wifi.
-    Converted python query:
-    df[
-    (df['bed_count'] >= 2) &
-    (df['pricing/rate/amount'] < 1000) &
-    (df['amenity_Kitchen'] == True) &
-    (df['amenity_Wifi'] == True)
-    ]
+    Example:
+    User's query: Need at least 2 beds, price under 1000, pets allowed and wifi
+    Converted filter:
+    {"and": [{"column": "bed_count", "op": ">=", "value": 2}, {"column": "pricing/rate/amount", "op": "<", "value": 1000}, {"column": "guestControls/allowsPets", "op": "==", "value": true}, {"column": "amenity_Wifi", "op": "==", "value": true}]}
 
-    Now  I will provide the user's query, which you will convert to a python query. 
-    Only return the query and no other text, so that I can directly run the query in a python interpreter.
+    Now  I will provide the user's query, which you will convert to a JSON filter.
+    Only return the JSON and no other text, so that I can directly parse it.
     Also, if a part of the query does not match any columns, then simply ignore that part.
     User's query: $query
     """
@@ -147,6 +71,8 @@ FINAL_COLUMNS = [
  'bedroom_count',
  'city',
  'country',
+ 'location/lat',
+ 'location/lng',
  'guestControls/allowsChildren',
  'guestControls/allowsEvents',
  'guestControls/allowsInfants',
@@ -288,6 +214,62 @@ FINAL_COLUMNS = [
  'url'
  ]
 
+# Explicit storage dtypes for FINAL_COLUMNS, used by the columnar snapshot (see snapshot.py)
+FLAG_COLUMN_PREFIXES = ('amenity_', 'guestControls/allows')
+INT_COLUMNS = [
+ 'idStr',
+ 'bed_count',
+ 'guestControls/personCapacity',
+ 'maxNights',
+ 'minNights',
+ 'numberOfGuests',
+ 'pricing/rate/amount',
+ 'reviewDetailsInterface/reviewCount',
+ ]
+FLOAT_COLUMNS = [
+ 'bathroom_count',
+ 'bedroom_count',
+ 'Accuracy',
+ 'Communication',
+ 'Cleanliness',
+ 'Location',
+ 'Check-in',
+ 'Value',
+ 'reviewsModule/localizedOverallRating',
+ 'stars',
+ 'location/lat',
+ 'location/lng',
+ ]
+# Listing ids need 64 bits; prices, counts and nights fit int32
+WIDE_INT_COLUMNS = ['idStr']
+# Low-cardinality text, stored as categoricals: one small integer code per listing plus the distinct values
+CATEGORY_COLUMNS = [
+ 'city',
+ 'country',
+ 'roomType',
+ 'roomTypeCategory',
+ 'guestControls/structuredHouseRules/0',
+ 'guestControls/structuredHouseRules/1',
+ 'guestControls/structuredHouseRules/2',
+ 'sectionedDescription/locale',
+ 'sectionedDescription/localizedLanguageName',
+ ]
+# Flags are nullable int8 (pandas 'Int8'): 1, 0, or missing when the scrape doesn't say
+COLUMN_DTYPES = {
+    col: 'Int8' if col.startswith(FLAG_COLUMN_PREFIXES)
+    else 'int64' if col in WIDE_INT_COLUMNS
+    else 'int32' if col in INT_COLUMNS
+    else 'float32' if col in FLOAT_COLUMNS
+    else 'category' if col in CATEGORY_COLUMNS
+    else 'string'
+    for col in FINAL_COLUMNS
+}
+# Long descriptions and photo URLs: left out of the in-memory frame and read per listing when a response needs them
+DETAIL_COLUMNS = [
+    col for col in FINAL_COLUMNS
+    if col.startswith(('photos/', 'sectionedDescription/')) and COLUMN_DTYPES[col] == 'string'
+]
+
 EASY_NAME_MAP = {
     # Already defined mappings
     'amenity_Kitchen': 'Kitchen',
@@ -366,6 +348,137 @@ EASY_NAME_MAP = {
     'numberOfGuests': 'Guest Capacity',
     'roomType': 'Room Type',
     'roomTypeCategory': 'Room Category',
-    'url': 'Listing URL'
+    'url': 'Listing URL',
+    'text': 'Text Search',
+    'location': 'Distance'
     # Further additions can be added here as needed
 }
+
+# Columns returned for each listing by /chat, mapped to the field names the frontend reads
+RESPONSE_COLUMNS = {
+    'idStr': 'idStr',
+    'name': 'name',
+    'sectionedDescription/summary': 'description',
+    'url': 'url',
+    'photos/0/thumbnailUrl': 'image_url',
+    'pricing/rate/amount': 'price',
+    'stars': 'stars',
+    'reviewDetailsInterface/reviewCount': 'review_count',
+    'Accuracy': 'Accuracy',
+    'Communication': 'Communication',
+    'Cleanliness': 'Cleanliness',
+    'Location': 'Location',
+    'Check-in': 'checkIn',
+    'Value': 'Value',
+    'bedroom_count': 'bedroom_count',
+    'bathroom_count': 'bathroom_count',
+    'bed_count': 'bed_count',
+    'guestControls/personCapacity': 'guest_capacity',
+    'roomType': 'room_type',
+    'city': 'city',
+}
+
+# Schema section of HOTEL_QUERY_PROMPT (see prompt_builder.py): numeric and true/false columns plus these text columns
+PROMPT_TEXT_COLUMNS = ['city', 'country', 'roomType', 'roomTypeCategory']
+# Always described in full, whatever the query mentions
+PROMPT_CORE_COLUMNS = [
+ 'pricing/rate/amount',
+ 'bed_count',
+ 'bedroom_count',
+ 'bathroom_count',
+ 'guestControls/personCapacity',
+ 'roomTypeCategory',
+ ]
+# Query words that make a column relevant, on top of its EASY_NAME_MAP label and the rule parser's synonyms
+PROMPT_KEYWORDS = {
+    'pricing/rate/amount': ['price', 'cheap', 'cheapest', 'budget', 'expensive', 'cost', 'baht', 'thb', 'usd', 'dollar', 'affordable', 'luxury'],
+    'bed_count': ['bed'],
+    'bedroom_count': ['bedroom', 'br', 'bdrm'],
+    'bathroom_count': ['bathroom', 'bath', 'ba'],
+    'guestControls/personCapacity': ['guest', 'people', 'person', 'pax', 'adult', 'family', 'group', 'friend', 'couple'],
+    'numberOfGuests': ['guest', 'people', 'person', 'pax', 'adult', 'group'],
+    'maxNights': ['stay', 'week', 'month', 'long', 'longer'],
+    'minNights': ['stay', 'week', 'weekend', 'short', 'shorter'],
+    'reviewDetailsInterface/reviewCount': ['review', 'reviewed', 'popular'],
+    'stars': ['star', 'rating', 'rated', 'best', 'top', 'good', 'great', 'excellent'],
+    'reviewsModule/localizedOverallRating': ['rating', 'rated'],
+    'Accuracy': ['accurate', 'accuracy'],
+    'Communication': ['communication', 'responsive', 'host'],
+    'Cleanliness': ['clean', 'cleanliness', 'spotless', 'tidy'],
+    'Location': ['location', 'located', 'central', 'close', 'near'],
+    'Check-in': ['check', 'checkin'],
+    'Value': ['value', 'worth', 'deal'],
+    'roomType': ['condo', 'apartment', 'house', 'villa', 'loft', 'hostel', 'hotel', 'studio', 'townhouse', 'bungalow', 'unit'],
+    'roomTypeCategory': ['entire', 'whole', 'private', 'shared', 'hotel', 'room', 'dorm'],
+    'city': ['city', 'district', 'area', 'neighborhood', 'neighbourhood'],
+    'country': ['country'],
+}
+
+# Listing texts embedded for semantic ranking (see semantic_index.py)
+SEMANTIC_TEXT_COLUMNS = [
+ 'name',
+ 'sectionedDescription/summary',
+ 'sectionedDescription/space',
+ 'sectionedDescription/neighborhoodOverview',
+ 'sectionedDescription/transit',
+ ]
+
+# Full-text index columns (see text_index.py) and the weight of a word found in each
+SEARCH_TEXT_COLUMNS = {
+ 'name': 3.0,
+ 'city': 3.0,
+ 'address': 2.0,
+ 'sectionedDescription/summary': 1.0,
+ 'sectionedDescription/space': 1.0,
+ 'sectionedDescription/neighborhoodOverview': 1.0,
+ 'sectionedDescription/transit': 1.0,
+ }
+# Columns holding comma-separated place names, normalized before they are indexed or compared
+PLACE_COLUMNS = ['city', 'address']
+# Administrative words (district, subdistrict, province) dropped from place names
+PLACE_ADMIN_WORDS = [
+ 'khet', 'khwaeng', 'tambon', 'amphoe', 'amphur', 'ampher', 'changwat', 'district', 'sub', 'subdistrict', 'province',
+ 'a', 'ต', 'อ', 'จ', 'ตำบล', 'เขต', 'แขวง', 'อำเภอ', 'จังหวัด',
+ ]
+# Spellings of the same place, by word or by normalized name (lowercase, no spaces)
+PLACE_ALIASES = {
+    'koh': 'ko',
+    'muang': 'mueang',
+    'mueng': 'mueang',
+    'meaung': 'mueang',
+    'cherngtalay': 'choengthale',
+    'kammala': 'kamala',
+    'huaykwang': 'huaikhwang',
+    'nuaklong': 'nueaklong',
+    'kaothomg': 'khaothong',
+    'kohyao': 'koyao',
+    'kosriboya': 'kosiboya',
+    'krungthepmahanakhon': 'bangkok',
+    'กรุงเทพมหานคร': 'bangkok',
+}
+
+# Listing coordinates, from the scraper's `location` object (see listing_indexes.GeoGridIndex)
+LATITUDE_COLUMN = 'location/lat'
+LONGITUDE_COLUMN = 'location/lng'
+# Radius of "near <place>" when the query gives no distance
+NEAR_RADIUS_KM = 2
+# Points `near` filters can name; other places resolve to the center of the listings in that city
+LANDMARKS = {
+    'Siam': (13.7456, 100.5347),
+    'Asok': (13.7373, 100.5603),
+    'Silom': (13.7286, 100.5343),
+    'Sukhumvit': (13.7380, 100.5600),
+    'Khao San Road': (13.7590, 100.4971),
+    'Chatuchak Market': (13.7999, 100.5507),
+    'ICONSIAM': (13.7266, 100.5103),
+    'Grand Palace': (13.7500, 100.4913),
+    'Suvarnabhumi Airport': (13.6900, 100.7501),
+    'Don Mueang Airport': (13.9126, 100.6068),
+    'Patong Beach': (7.8961, 98.2960),
+    'Kata Beach': (7.8206, 98.2978),
+    'Karon Beach': (7.8476, 98.2941),
+    'Phuket Old Town': (7.8846, 98.3880),
+    'Phuket Airport': (8.1132, 98.3169),
+    'Ao Nang Beach': (8.0306, 98.8226),
+    'Railay Beach': (8.0119, 98.8372),
+}
@@ -0,0 +1,152 @@
+"""
+Facet counts over a /chat match set: amenity and guest-control flags, room category, bedroom and bed counts
+and a price histogram.
+
+`FacetIndex` is built once per loaded dataset. The room category, bedroom / bed count and price bin of every
+listing are combined into one cell code (a few thousand combinations), and the flags are the packed bitmap
+matrix of `listing_indexes.FlagBitmapIndex`. Counting the facets of a match set is then one `np.bincount` of
+the matched cell codes, summed per facet, and one AND + popcount pass over the flag matrix. Large match sets
+are counted through their complement, and the whole dataset (firstcall) is counted once at load.
+"""
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMN = 'pricing/rate/amount'
+# Counts above the last value are grouped: "6+"
+COUNT_FACETS = {'bedroom_count': 6, 'bed_count': 6}
+CATEGORY_FACETS = ['roomTypeCategory']
+PRICE_BINS = 10
+
+
+def popcount(words):
+    """
+    Bits set in each element of a uint64 array (`np.bitwise_count` on NumPy 2, the SWAR sequence before it).
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    words = words - ((words >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    words = (words & np.uint64(0x3333333333333333)) + ((words >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    words = (words + (words >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (words * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def _nice(value):
+    # Two significant digits, so the bin edges read like prices: 1234.5 -> 1200
+    if value <= 0:
+        return 0.0
+    magnitude = 10 ** (int(np.floor(np.log10(value))) - 1)
+    return float(round(value / magnitude) * magnitude)
+
+
+def price_edges(prices, bins=PRICE_BINS):
+    """
+    Returns the inner edges of a price histogram with about `bins` bins of similar size, rounded to nice numbers.
+    """
+    prices = prices[~np.isnan(prices)]
+    if not len(prices):
+        return np.zeros(0)
+    quantiles = np.quantile(prices, np.linspace(0, 1, bins + 1)[1:-1])
+    return np.unique([_nice(value) for value in quantiles])
+
+
+class FacetIndex:
+    """
+    Precomputed facet codes of one listings frame.
+
+    Parameters:
+        frame (pd.DataFrame): Listings frame.
+        flags (listing_indexes.FlagBitmapIndex | None): Flag bitmaps of the same frame.
+    """
+
+    def __init__(self, frame, flags=None):
+        self.size = len(frame)
+        self.flags = flags
+        # (facet name, bin labels, codes); code 0 is a missing value, never reported
+        facets = []
+        for column in CATEGORY_FACETS:
+            if column in frame.columns:
+                values = pd.Categorical(frame[column])
+                facets.append((column, [None] + list(values.categories), values.codes.astype(np.int16) + 1))
+        for column, largest in COUNT_FACETS.items():
+            if column in frame.columns:
+                values = frame[column].to_numpy(dtype=np.float64)
+                codes = np.where(np.isnan(values), 0, np.clip(np.nan_to_num(values), 0, largest) + 1)
+                facets.append((column, [None] + [str(value) for value in range(largest)] + [f"{largest}+"], codes))
+        if PRICE_COLUMN in frame.columns:
+            prices = frame[PRICE_COLUMN].to_numpy(dtype=np.float64)
+            self.price_edges = price_edges(prices)
+            bounds = [None] + [int(edge) if edge.is_integer() else edge for edge in self.price_edges.tolist()] + [None]
+            labels = [None] + [{"min": low, "max": high} for low, high in zip(bounds[:-1], bounds[1:])]
+            codes = np.where(np.isnan(prices), 0, np.searchsorted(self.price_edges, np.nan_to_num(prices), side='right') + 1)
+            facets.append(('price', labels, codes))
+        else:
+            self.price_edges = np.zeros(0)
+        self.names = [name for name, _, _ in facets]
+        self.labels = [labels for _, labels, _ in facets]
+        # Cell of each listing in the (facet 1 bins x facet 2 bins x ...) grid
+        self.shape = tuple(len(labels) for labels in self.labels)
+        cells = np.ravel_multi_index([codes.astype(np.intp) for _, _, codes in facets], self.shape) if facets else np.zeros(self.size, np.intp)
+        self.cells = cells.astype(np.uint16 if int(np.prod(self.shape)) <= 1 << 16 else np.uint32)
+        self.flag_names = [flags.columns[key] for key in flags.keys] if flags is not None else []
+        self._all_cells = self._cell_counts(self.cells)
+        self._all_flags = np.array([flags.counts[key] for key in flags.keys], dtype=np.int64) if flags is not None else None
+
+    def _cell_counts(self, cells):
+        return np.bincount(cells, minlength=int(np.prod(self.shape))).reshape(self.shape)
+
+    def _flag_counts(self, rows, mask):
+        matrix = self.flags.matrix
+        if mask is None:
+            # Few rows: read their bits directly instead of scanning every bitmap
+            shifts = (7 - (rows & 7)).astype(np.uint8)
+            return ((matrix[:, rows >> 3] >> shifts) & 1).sum(axis=1, dtype=np.int64)
+        selected = np.zeros(matrix.shape[1], dtype=np.uint8)
+        packed = np.packbits(mask)
+        selected[:len(packed)] = packed
+        return popcount((matrix & selected).view(np.uint64)).sum(axis=1, dtype=np.int64)
+
+    def counts(self, rows):
+        """
+        Returns (per-facet bin counts, per-flag counts or None) of the listings at `rows`.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == self.size:
+            cells, flags = self._all_cells, self._all_flags
+        else:
+            mask = None
+            if len(rows) * 64 >= self.size:
+                mask = np.zeros(self.size, dtype=bool)
+                mask[rows] = True
+            if mask is not None and len(rows) * 2 > self.size:
+                # Most listings matched: count the ones that didn't and subtract
+                cells = self._all_cells - self._cell_counts(self.cells[~mask])
+            else:
+                cells = self._cell_counts(self.cells[rows])
+            flags = self._flag_counts(rows, mask) if self.flags is not None else None
+        axes = range(len(self.shape))
+        bins = [cells.sum(axis=tuple(other for other in axes if other != axis)) for axis in axes]
+        return bins, flags
+
+    def facets(self, rows):
+        """
+        Returns the facets of the listings at `rows` as a JSON-ready dict. Zero counts are left out.
+
+        Returns:
+            dict: {"flags": {column: count}, <category or count column>: {value: count},
+                "price": [{"min", "max", "count"}, ...]} (open-ended bins have a null bound).
+        """
+        bins, flags = self.counts(rows)
+        result = {}
+        if flags is not None:
+            order = np.argsort(-flags, kind='stable')
+            result["flags"] = {self.flag_names[position]: int(flags[position]) for position in order if flags[position]}
+        for name, labels, counts in zip(self.names, self.labels, bins):
+            counts = counts.tolist()
+            if name == 'price':
+                result[name] = [{**label, "count": count} for label, count in zip(labels[1:], counts[1:]) if count]
+            else:
+                result[name] = {label: count for label, count in zip(labels[1:], counts[1:]) if count}
+        return result
+
+    def nbytes(self):
+        return self.cells.nbytes
@@ -0,0 +1,518 @@
+"""
+JSON filter AST for listings and a vectorized evaluator for it.
+
+A filter is a tree of plain JSON objects:
+
+    {"column": "bed_count", "op": ">=", "value": 2}
+    {"and": [<filter>, ...]}
+    {"or": [<filter>, ...]}
+    {"not": <filter>}
+    {"column": "text", "op": "text_match", "value": "rooftop pool"}
+    {"column": "location", "op": "near", "value": {"place": "Siam", "radius_km": 2}}
+    {"column": "location", "op": "bbox", "value": {"south": 13.7, "west": 100.5, "north": 13.8, "east": 100.6}}
+
+The `text_match` predicate is a full-text search over the listing names, addresses, cities and descriptions
+(see text_index.py). `near` takes a `place` (a `chat_config.LANDMARKS` name or a city in the data) or
+`lat` / `lng`. `{}` and `{"and": []}` match every listing. Filters are validated against
+`chat_config.FINAL_COLUMNS` before they run, so nothing produced by the LLM is executed as code.
+"""
+import json
+import re
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+import chat_config
+import listing_indexes
+import snapshot
+import text_index
+
+COMPARISON_OPS = {
+    '==': np.equal,
+    '!=': np.not_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+}
+OPERATORS = set(COMPARISON_OPS) | {'in', 'not_in', 'contains'}
+KNOWN_COLUMNS = set(chat_config.FINAL_COLUMNS)
+# Pseudo-column of the full-text predicate
+TEXT_COLUMN = 'text'
+# Pseudo-column of the coordinate predicates
+GEO_COLUMN = 'location'
+GEO_OPS = ('near', 'bbox')
+LANDMARK_POINTS = {text_index.place_key(name): point for name, point in chat_config.LANDMARKS.items()}
+
+
+class FilterError(ValueError):
+    pass
+
+
+def parse_filter(text):
+    """
+    Parses LLM output into a filter AST, tolerating a surrounding ```json fence.
+    """
+    cleaned_text = text.strip()
+    if cleaned_text.startswith("```"):
+        cleaned_text = re.sub(r"^```(?:json)?\s*", "", cleaned_text, flags=re.IGNORECASE)
+        cleaned_text = re.sub(r"\s*```$", "", cleaned_text)
+    try:
+        return json.loads(cleaned_text)
+    except json.JSONDecodeError as exc:
+        raise FilterError(f"Filter is not valid JSON: {exc}") from exc
+
+
+def resolve_column(column, columns):
+    # `lose_mostly_empty` stores some amenities with underscores (amenity_Hot_water) while
+    # EASY_NAME_MAP and the LLM may use spaces, so accept either spelling
+    prefix, sep, rest = column.partition('_')
+    for candidate in (column, prefix + sep + rest.replace(' ', '_'), prefix + sep + rest.replace('_', ' ')):
+        if candidate in columns:
+            return candidate
+    return None
+
+
+def _number_field(value, key, low, high):
+    number = value.get(key)
+    if isinstance(number, bool) or not isinstance(number, (int, float)) or not low <= number <= high:
+        raise FilterError(f"'{key}' must be a number between {low} and {high}")
+    return float(number)
+
+
+def _validate_geo(op, value):
+    # Landmark names are resolved here; other places are looked up in the data when the filter runs
+    if not isinstance(value, dict):
+        raise FilterError(f"Operator {op!r} expects an object value")
+    if op == 'bbox':
+        box = {key: _number_field(value, key, -90, 90) for key in ('south', 'north')}
+        box.update({key: _number_field(value, key, -180, 180) for key in ('west', 'east')})
+        if box['south'] > box['north'] or box['west'] > box['east']:
+            raise FilterError("'bbox' needs south <= north and west <= east")
+        return box
+    radius = _number_field(value, 'radius_km', 0, 1000)
+    place = value.get('place')
+    if place is not None:
+        if not isinstance(place, str) or not place.strip():
+            raise FilterError("'place' must be a non-empty string")
+        point = LANDMARK_POINTS.get(text_index.place_key(place))
+        if point is None:
+            return {"place": place, "radius_km": radius}
+        lat, lng = point
+    else:
+        lat, lng = _number_field(value, 'lat', -90, 90), _number_field(value, 'lng', -180, 180)
+    return {"lat": lat, "lng": lng, "radius_km": radius}
+
+
+def near_condition(node):
+    """
+    Returns the first `near` predicate that every match must satisfy (outside `or` / `not`), or None.
+    """
+    if node.get('op') == 'near':
+        return node
+    for child in node.get('and', []):
+        found = near_condition(child)
+        if found is not None:
+            return found
+    return None
+
+
+def validate(node, columns):
+    """
+    Checks a filter AST and returns a normalized copy.
+
+    Parameters:
+        node (dict): Filter AST.
+        columns (iterable): Columns present in the listings frame.
+
+    Returns:
+        dict: The AST with column names resolved to the spelling used in the frame.
+
+    Raises:
+        FilterError: If the AST is malformed or references an unknown column or operator.
+    """
+    if not isinstance(node, dict):
+        raise FilterError(f"Filter nodes must be objects, got {type(node).__name__}")
+    if not node:
+        return {"and": []}
+    if 'and' in node or 'or' in node:
+        key = 'and' if 'and' in node else 'or'
+        children = node[key]
+        if not isinstance(children, list):
+            raise FilterError(f"'{key}' expects a list of filters")
+        return {key: [validate(child, columns) for child in children]}
+    if 'not' in node:
+        return {"not": validate(node['not'], columns)}
+
+    column, op, value = node.get('column'), node.get('op'), node.get('value')
+    if column == TEXT_COLUMN or op == 'text_match':
+        if column != TEXT_COLUMN or op != 'text_match':
+            raise FilterError(f"Full-text search is written as {{\"column\": \"{TEXT_COLUMN}\", \"op\": \"text_match\", ...}}")
+        if not isinstance(value, str):
+            raise FilterError("Operator 'text_match' expects a string value")
+        return {"column": TEXT_COLUMN, "op": op, "value": value}
+    if column == GEO_COLUMN or op in GEO_OPS:
+        if column != GEO_COLUMN or op not in GEO_OPS:
+            raise FilterError(f"Distance filters are written as {{\"column\": \"{GEO_COLUMN}\", \"op\": \"near\" or \"bbox\", ...}}")
+        if chat_config.LATITUDE_COLUMN not in columns or chat_config.LONGITUDE_COLUMN not in columns:
+            raise FilterError(f"Column not available in the current dataset: {column!r}")
+        return {"column": GEO_COLUMN, "op": op, "value": _validate_geo(op, value)}
+    if not isinstance(column, str) or resolve_column(column, KNOWN_COLUMNS) is None:
+        raise FilterError(f"Unknown column: {column!r}")
+    resolved = resolve_column(column, columns)
+    if resolved is None:
+        raise FilterError(f"Column not available in the current dataset: {column!r}")
+    if op not in OPERATORS:
+        raise FilterError(f"Unsupported operator {op!r} for column {column!r}")
+    if op in ('in', 'not_in'):
+        if not isinstance(value, list):
+            raise FilterError(f"Operator {op!r} expects a list value")
+    elif op == 'contains':
+        if not isinstance(value, str):
+            raise FilterError("Operator 'contains' expects a string value")
+    elif isinstance(value, (list, dict)) or value is None:
+        raise FilterError(f"Operator {op!r} expects a scalar value")
+    return {"column": resolved, "op": op, "value": value}
+
+
+def filter_columns(node):
+    """
+    Lists the columns referenced by a filter AST, in order of first appearance.
+    """
+    found = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if 'column' in current:
+            if current['column'] not in found:
+                found.append(current['column'])
+        elif 'not' in current:
+            stack.append(current['not'])
+        else:
+            stack.extend(reversed(current.get('and', current.get('or', []))))
+    return found
+
+
+def canonical_key(node):
+    return json.dumps(node, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class FilterEngine:
+    """
+    Evaluates filter ASTs against one loaded listings frame.
+
+    Predicates run on NumPy arrays over the rows still in play: the children of an `and` are
+    ordered by estimated selectivity, each one only looks at the rows that survived the previous
+    ones, and evaluation stops as soon as no rows are left. Amenity and guest-control predicates
+    are answered together from a `listing_indexes.FlagBitmapIndex`, and the most selective range on
+    price, capacity, bed or review counts from a `listing_indexes.SortedRangeIndex`; both are built
+    when the engine is created, as are the `text_index.TextIndex` behind `text_match` and the
+    `listing_indexes.GeoGridIndex` behind `near` / `bbox` (built on first use without `build_indexes`).
+    Equality on place columns (`city`) compares normalized place names. Predicates on categorical columns
+    are decided once per category and looked up by code; predicates on detail columns (`details`, a
+    `snapshot.DetailColumns`) decode only the rows still in play. A missing (unknown) flag matches neither
+    `== true` nor `== false`.
+    """
+
+    def __init__(self, frame, build_indexes=True, details=None):
+        self.frame = frame
+        self.size = len(frame)
+        self.details = details if details is not None else snapshot.DetailColumns(self.size)
+        self.flags = listing_indexes.FlagBitmapIndex(frame) if build_indexes else None
+        self.ranges = listing_indexes.SortedRangeIndex(frame) if build_indexes else None
+        self._text = text_index.TextIndex(self._text_frame()) if build_indexes else None
+        has_coordinates = chat_config.LATITUDE_COLUMN in frame.columns and chat_config.LONGITUDE_COLUMN in frame.columns
+        self._geo = listing_indexes.GeoGridIndex(frame) if build_indexes and has_coordinates else None
+        self._place_points = {}
+        self._arrays = {}
+        self._missing = {}
+        self._categories = {}
+        self._sorted = {}
+        self._value_counts = {}
+
+    def _text_frame(self):
+        return self.details.attach(self.frame, list(chat_config.SEARCH_TEXT_COLUMNS))
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = text_index.TextIndex(self._text_frame())
+        return self._text
+
+    @property
+    def geo(self):
+        if self._geo is None:
+            self._geo = listing_indexes.GeoGridIndex(self.frame)
+        return self._geo
+
+    def place_point(self, place):
+        """
+        Returns the (lat, lng) of a landmark, or the median position of the listings in a city.
+
+        Raises:
+            FilterError: If the place is neither a landmark nor a city with located listings.
+        """
+        key = text_index.place_key(place)
+        point = LANDMARK_POINTS.get(key) or self._place_points.get(key)
+        if point is None:
+            cities = self.text.place_keys.get('city')
+            located = ~np.isnan(self.geo.lat) & ~np.isnan(self.geo.lng)
+            rows = np.flatnonzero((cities == key) & located) if key and cities is not None else []
+            if not len(rows):
+                raise FilterError(f"Unknown place: {place!r}")
+            point = (float(np.median(self.geo.lat[rows])), float(np.median(self.geo.lng[rows])))
+            self._place_points[key] = point
+        return point
+
+    def _near_args(self, value):
+        lat, lng = self.place_point(value['place']) if 'place' in value else (value['lat'], value['lng'])
+        return lat, lng, value['radius_km']
+
+    def _geo_rows(self, node, rows):
+        # The grid answers on the full frame; once few rows remain, measuring them directly is cheaper
+        scan = rows if len(rows) != self.size else None
+        if node['op'] == 'near':
+            return self.geo.near(*self._near_args(node['value']), rows=scan)
+        box = node['value']
+        return self.geo.within(box['south'], box['west'], box['north'], box['east'], rows=scan)
+
+    def sort_by_distance(self, rows, filter_ast):
+        """
+        Orders rows by distance from the point of the filter's `near` predicate. Ties keep dataset order.
+
+        Raises:
+            FilterError: If the filter has no `near` predicate.
+        """
+        condition = near_condition(filter_ast)
+        if condition is None:
+            raise FilterError("Sorting by distance needs a 'near' filter")
+        lat, lng, _ = self._near_args(condition['value'])
+        return rows[np.argsort(self.geo.distances(rows, lat, lng), kind='stable')]
+
+    def _place_leaf(self, node):
+        return node['column'] in chat_config.PLACE_COLUMNS and node['op'] in ('==', '!=', 'in', 'not_in')
+
+    def _place_targets(self, node):
+        values = node['value'] if isinstance(node['value'], list) else [node['value']]
+        return [text_index.place_key(value) for value in values if isinstance(value, str)]
+
+    def array(self, column):
+        values = self._arrays.get(column)
+        if values is None:
+            series = self.frame[column]
+            if isinstance(series.dtype, pd.Int8Dtype):
+                # Nullable flags: compared as float32, with the missing rows kept apart (see `_missing`)
+                values = series.to_numpy(dtype=np.float32, na_value=np.nan)
+                missing = series.isna().to_numpy()
+                self._missing[column] = missing if missing.any() else None
+            else:
+                values = series.to_numpy()
+                self._missing[column] = None
+            self._arrays[column] = values
+        return values
+
+    def _categorical(self, column):
+        # (codes, categories) of a categorical column, else None
+        if column not in self._categories:
+            dtype = self.frame[column].dtype if column in self.frame.columns else None
+            if isinstance(dtype, pd.CategoricalDtype):
+                series = self.frame[column]
+                self._categories[column] = (series.cat.codes.to_numpy(), series.cat.categories.to_numpy(dtype=object))
+            else:
+                self._categories[column] = None
+        return self._categories[column]
+
+    def _is_numeric(self, column):
+        return column in self.frame.columns and self.frame[column].dtype.kind in 'biuf'
+
+    def _sorted_values(self, column):
+        if self.ranges is not None and column in self.ranges:
+            return self.ranges.sorted_values[column]
+        values = self._sorted.get(column)
+        if values is None:
+            values = self.array(column).astype(np.float64)
+            values = np.sort(values[~np.isnan(values)])
+            self._sorted[column] = values
+        return values
+
+    def selectivity(self, node):
+        """
+        Estimates the fraction of listings matched by `node` from per-column statistics.
+        """
+        if 'and' in node:
+            return float(np.prod([self.selectivity(child) for child in node['and']])) if node['and'] else 1.0
+        if 'or' in node:
+            return min(1.0, sum(self.selectivity(child) for child in node['or']))
+        if 'not' in node:
+            return 1.0 - self.selectivity(node['not'])
+        if not self.size:
+            return 0.0
+        column, op, value = node['column'], node['op'], node['value']
+        if op == 'text_match':
+            return len(self.text.match(value)) / self.size
+        if op in GEO_OPS:
+            if op == 'near':
+                box = self.geo.radius_box(*self._near_args(value))
+            else:
+                box = (value['south'], value['west'], value['north'], value['east'])
+            return self.geo.estimate(*box) / self.size
+        if self._flag_leaf(node):
+            return self.flags.count(column, self._flag_wanted(node)) / self.size
+        if column in self.details:
+            return 0.5
+        if op in COMPARISON_OPS and self._is_numeric(column) and isinstance(value, (int, float)):
+            values = self._sorted_values(column)
+            left = np.searchsorted(values, value, side='left')
+            right = np.searchsorted(values, value, side='right')
+            matched = {
+                '==': right - left, '!=': self.size - (right - left),
+                '<': left, '<=': right, '>': len(values) - right, '>=': len(values) - left,
+            }[op]
+            return matched / self.size
+        if op in ('==', 'in'):
+            counts = self._value_counts.get(column)
+            if counts is None:
+                if column in chat_config.PLACE_COLUMNS:
+                    counts = Counter(self.text.place_keys[column].tolist())
+                else:
+                    counts = self.frame[column].value_counts().to_dict()
+                self._value_counts[column] = counts
+            targets = self._place_targets(node) if column in chat_config.PLACE_COLUMNS else value if op == 'in' else [value]
+            return sum(counts.get(target, 0) for target in targets) / self.size
+        return 0.5
+
+    def _flag_leaf(self, node):
+        return (
+            self.flags is not None and 'column' in node and node['column'] in self.flags
+            and node['op'] in ('==', '!=') and node['value'] in (True, False)
+        )
+
+    def _range_leaf(self, node):
+        return (
+            self.ranges is not None and 'column' in node and node['column'] in self.ranges
+            and node['op'] in ('==', '<', '<=', '>', '>=')
+            and isinstance(node['value'], (int, float)) and not isinstance(node['value'], bool)
+        )
+
+    def _range_rows(self, leaves, rows):
+        # Only the narrowest indexed column is resolved through the index; its other
+        # predicates are folded into the same slice and the rest are scanned on the result
+        by_column = {}
+        for leaf in leaves:
+            by_column.setdefault(leaf['column'], []).append((leaf['op'], leaf['value']))
+        slices = {column: self.ranges.bounds(column, predicates) for column, predicates in by_column.items()}
+        column, (start, stop) = min(slices.items(), key=lambda item: item[1][1] - item[1][0])
+        matched = self.ranges.rows(column, start, stop)
+        if len(rows) != self.size:
+            matched = np.intersect1d(rows, matched, assume_unique=True)
+        return matched, column
+
+    def _flag_wanted(self, node):
+        return bool(node['value']) != (node['op'] == '!=')
+
+    def _flag_rows(self, leaves, rows):
+        required = [leaf['column'] for leaf in leaves if self._flag_wanted(leaf)]
+        excluded = [leaf['column'] for leaf in leaves if not self._flag_wanted(leaf)]
+        mask = self.flags.to_mask(self.flags.match(required, excluded))
+        # `rows` is sorted and unique, so full length means every listing is still in play
+        return np.flatnonzero(mask) if len(rows) == self.size else rows[mask[rows]]
+
+    def _match_leaf(self, node, rows):
+        column, op = node['column'], node['op']
+        if self._place_leaf(node):
+            # 'Khet Huai Khwang' == 'Huai Khwang' == 'Huaikhwang'
+            mask = np.isin(self.text.place_keys[column][rows], self._place_targets(node))
+            return ~mask if op in ('!=', 'not_in') else mask
+        categorical = self._categorical(column)
+        if categorical is not None:
+            codes, categories = categorical
+            # Missing values have code -1, which picks the appended last entry
+            decided = np.append(self._match_values(node, categories), op in ('!=', 'not_in'))
+            return decided[codes[rows]]
+        if column in self.details:
+            return self._match_values(node, self.details.take(column, rows))
+        mask = self._match_values(node, self.array(column)[rows])
+        missing = self._missing[column]
+        # An unknown flag matches no predicate, `!=` and `not_in` included
+        return mask & ~missing[rows] if missing is not None else mask
+
+    def _match_values(self, node, values):
+        op, value = node['op'], node['value']
+        if op in COMPARISON_OPS:
+            if values.dtype.kind in 'biuf':
+                if isinstance(value, str):
+                    try:
+                        value = float(value)
+                    except ValueError:
+                        return np.full(len(values), op == '!=')
+                return COMPARISON_OPS[op](values, value)
+            # Text columns: compare present values as strings; missing values only match '!=' (as in pandas)
+            present = pd.notna(values)
+            mask = np.full(len(values), op == '!=')
+            mask[present] = COMPARISON_OPS[op](values[present].astype(str), str(value))
+            return mask
+        if op in ('in', 'not_in'):
+            if values.dtype.kind == 'f':
+                # Compare at the column's precision, so 4.87 finds the float32 4.87
+                value = np.array([item for item in value if isinstance(item, (int, float))], dtype=values.dtype)
+            mask = np.isin(values, value)
+            return ~mask if op == 'not_in' else mask
+        needle = value.casefold()
+        return np.fromiter(
+            (isinstance(text, str) and needle in text.casefold() for text in values),
+            dtype=bool, count=len(values),
+        )
+
+    def _evaluate(self, node, rows):
+        if not len(rows):
+            return rows
+        if 'and' in node:
+            return self._evaluate_conjunction(node['and'], rows)
+        if 'or' in node:
+            remaining = rows
+            matched = []
+            for child in sorted(node['or'], key=self.selectivity, reverse=True):
+                hits = self._evaluate(child, remaining)
+                matched.append(hits)
+                remaining = np.setdiff1d(remaining, hits, assume_unique=True)
+                if not len(remaining):
+                    break
+            return np.sort(np.concatenate(matched)) if matched else rows[:0]
+        if 'not' in node:
+            return np.setdiff1d(rows, self._evaluate(node['not'], rows), assume_unique=True)
+        if node['op'] == 'text_match':
+            return self.text.match(node['value'], rows)
+        if node['op'] in GEO_OPS:
+            return self._geo_rows(node, rows)
+        if len(rows) == self.size and (self._flag_leaf(node) or self._range_leaf(node)):
+            return self._evaluate_conjunction([node], rows)
+        return rows[self._match_leaf(node, rows)]
+
+    def _evaluate_conjunction(self, children, rows):
+        # Indexes pay off on the full frame; once few rows remain, scanning them is cheaper
+        use_indexes = len(rows) * 16 >= self.size
+        range_leaves = [child for child in children if self._range_leaf(child)] if use_indexes else []
+        if range_leaves:
+            rows, column = self._range_rows(range_leaves, rows)
+            children = [child for child in children if not (self._range_leaf(child) and child['column'] == column)]
+        flag_leaves = [child for child in children if self._flag_leaf(child)] if use_indexes else []
+        if flag_leaves and len(rows):
+            rows = self._flag_rows(flag_leaves, rows)
+        others = [child for child in children if child not in flag_leaves]
+        for child in sorted(others, key=self.selectivity):
+            if not len(rows):
+                break
+            rows = self._evaluate(child, rows)
+        return rows
+
+    def evaluate(self, node):
+        """
+        Returns the sorted row positions of the listings matched by a validated filter AST.
+        """
+        return self._evaluate(node, np.arange(self.size))
+
+    def mask(self, node):
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.evaluate(node)] = True
+        return mask
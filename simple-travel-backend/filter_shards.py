@@ -0,0 +1,380 @@
+"""
+Filter evaluation fanned out to worker processes, one per shard of the listings.
+
+`FilterEngine` runs on one core: its NumPy kernels release the GIL only in short bursts, and a gunicorn
+worker evaluates one filter at a time per thread. With `FILTER_SHARDS` set, the listings are partitioned into
+that many shards, by city (listings of one city stay together; a city larger than a shard is split) or by a
+hash of `idStr`. Each shard is served by a worker process that builds its own `FilterEngine` with all the
+usual indexes over the shard's rows. The shard's fixed-width columns (numbers, flags, category codes) are
+gathered once by the parent into a `multiprocessing.shared_memory` block that the worker maps as read-only
+NumPy views, so they are not copied again into the worker; only its text columns are read from the dataset. A query is sent to every shard at once and the row positions they return are merged.
+A filter that pins `city` (`==` / `in`, at the top level or inside the top-level `and`) only goes to the shards
+holding those cities.
+
+Workers are spawned by the first query in each process, so gunicorn workers own theirs, and queries are
+evaluated in-process until every shard has built its indexes, and for datasets under `FILTER_SHARD_MIN_ROWS`.
+The workers' own memory is their indexes and text columns, split across the processes.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import filter_engine
+import text_index
+
+FILTER_SHARDS = int(os.getenv("FILTER_SHARDS", "0"))
+# "city" or "hash" (of idStr)
+FILTER_SHARD_BY = os.getenv("FILTER_SHARD_BY", "city")
+FILTER_SHARD_MIN_ROWS = int(os.getenv("FILTER_SHARD_MIN_ROWS", "200000"))
+# Seconds to wait for a shard's answer before giving up on the workers and evaluating in-process
+FILTER_SHARD_TIMEOUT = float(os.getenv("FILTER_SHARD_TIMEOUT", "30"))
+PARTITIONS = ("city", "hash")
+
+logger = logging.getLogger(__name__)
+
+
+def enabled(rows):
+    return FILTER_SHARDS > 1 and rows >= FILTER_SHARD_MIN_ROWS
+
+
+def partition(engine, shards, by="city"):
+    """
+    Splits the listings of `engine` into `shards` sorted arrays of row positions.
+
+    By "city", whole cities are assigned to the emptiest shard, largest first; a city with more listings than
+    an even share is cut into share-sized pieces first. By "hash", rows go to `crc32(idStr) % shards`.
+    """
+    if by not in PARTITIONS:
+        raise ValueError(f"Unknown shard partition {by!r}, expected one of: {', '.join(PARTITIONS)}")
+    if by == "hash":
+        ids = engine.frame["idStr"].astype(str).tolist()
+        assignment = np.fromiter((zlib.crc32(value.encode("utf-8")) % shards for value in ids), dtype=np.int64, count=len(ids))
+        return [np.flatnonzero(assignment == shard) for shard in range(shards)]
+    cities = engine.text.place_keys["city"]
+    share = max(-(-engine.size // shards), 1)
+    pieces = []
+    keys, inverse = np.unique(cities, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.cumsum(np.bincount(inverse, minlength=len(keys)))[:-1]
+    for rows in np.split(order, bounds):
+        pieces.extend(rows[start:start + share] for start in range(0, len(rows), share))
+    assigned = [[] for _ in range(shards)]
+    sizes = [0] * shards
+    for rows in sorted(pieces, key=len, reverse=True):
+        shard = sizes.index(min(sizes))
+        assigned[shard].append(rows)
+        sizes[shard] += len(rows)
+    return [np.sort(np.concatenate(rows)) if rows else np.zeros(0, dtype=np.int64) for rows in assigned]
+
+
+def pinned_cities(node):
+    """
+    Returns the normalized city names a filter requires (`city` == / in at its top level), or None if it has none.
+    """
+    leaves = node["and"] if "and" in node else [node]
+    pinned = None
+    for leaf in leaves:
+        if leaf.get("column") == "city" and leaf.get("op") in ("==", "in"):
+            values = leaf["value"] if isinstance(leaf["value"], list) else [leaf["value"]]
+            keys = {text_index.place_key(value) for value in values if isinstance(value, str)}
+            pinned = keys if pinned is None else pinned & keys
+    return pinned
+
+
+def _column_arrays(series):
+    # Fixed-width arrays holding a column (see `_frame_column`), or None for text columns
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return [series.cat.codes.to_numpy()]
+    if isinstance(series.dtype, pd.Int8Dtype):
+        return [series.to_numpy(dtype=np.int8, na_value=0), series.isna().to_numpy()]
+    if series.dtype.kind in 'biuf':
+        return [series.to_numpy()]
+    return None
+
+
+def share_columns(frame, rows):
+    """
+    Copies the fixed-width columns of `frame` at `rows` into one new shared memory block.
+
+    Returns:
+        tuple: (shared_memory.SharedMemory, layout), where layout lists (column, [(dtype, offset)], categories)
+            for `map_columns`. The caller owns the block: close and unlink it when the shard stops.
+    """
+    columns = [(col, _column_arrays(frame[col])) for col in frame.columns]
+    columns = [(col, arrays) for col, arrays in columns if arrays is not None]
+    layout = []
+    size = 0
+    for col, arrays in columns:
+        parts = []
+        for values in arrays:
+            size += -size % values.dtype.itemsize
+            parts.append((values.dtype.str, size))
+            size += values.dtype.itemsize * len(rows)
+        categories = frame[col].cat.categories.tolist() if isinstance(frame[col].dtype, pd.CategoricalDtype) else None
+        layout.append((col, parts, categories))
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for (col, arrays), (_, parts, _) in zip(columns, layout):
+        for values, (dtype, offset) in zip(arrays, parts):
+            np.ndarray(len(rows), dtype=dtype, buffer=memory.buf, offset=offset)[:] = values[rows]
+    return memory, layout
+
+
+def map_columns(memory, layout, rows):
+    """
+    Returns column -> read-only values over a block written by `share_columns`, without copying them.
+    """
+    columns = {}
+    for col, parts, categories in layout:
+        arrays = []
+        for dtype, offset in parts:
+            values = np.ndarray(rows, dtype=dtype, buffer=memory.buf, offset=offset)
+            values.flags.writeable = False
+            arrays.append(values)
+        if categories is not None:
+            columns[col] = pd.Categorical.from_codes(arrays[0], categories=pd.Index(categories, dtype=object))
+        elif len(arrays) == 2:
+            columns[col] = pd.arrays.IntegerArray(*arrays)
+        else:
+            columns[col] = arrays[0]
+    return columns
+
+
+def _serve(conn, reader, source_path, rows, memory_name, layout, order):
+    # Worker process: build the shard's engine, then answer filter ASTs with matching local row positions
+    memory = None
+    try:
+        started = time.perf_counter()
+        memory = shared_memory.SharedMemory(name=memory_name)
+        shared = map_columns(memory, layout, len(rows))
+        text, details = reader(source_path, rows, [col for col in order if col not in shared])
+        data = {col: shared[col] if col in shared else text[col] for col in order}
+        frame = pd.DataFrame(data, index=pd.RangeIndex(len(rows)), copy=False)
+        engine = filter_engine.FilterEngine(frame, details=details)
+        conn.send(("ready", time.perf_counter() - started))
+    except Exception as exc:
+        conn.send(("failed", repr(exc)))
+        return
+    while True:
+        try:
+            node = conn.recv()
+        except EOFError:
+            return
+        if node is None:
+            return
+        try:
+            conn.send(("ok", engine.evaluate(node).astype(np.int32)))
+        except filter_engine.FilterError as exc:
+            conn.send(("filter_error", str(exc)))
+        except Exception as exc:
+            conn.send(("error", repr(exc)))
+
+
+class _Shard:
+    def __init__(self, rows, cities):
+        self.rows = rows
+        self.cities = cities
+        self.memory = None
+        self.process = None
+        self.conn = None
+        self.ready = False
+        self.build_seconds = None
+        self.lock = threading.Lock()
+
+
+class ShardedEngine:
+    """
+    Evaluates filter ASTs on per-shard worker processes, falling back to `engine` until they are ready.
+
+    Parameters:
+        source_path (str): Dataset source the workers read (snapshot directory or CSV).
+        engine (filter_engine.FilterEngine): In-process engine over the whole dataset: the fallback, and the
+            source of the partition and of `near` place coordinates.
+        reader (callable): (source_path, rows, columns) -> (frame, snapshot.DetailColumns), e.g.
+            listings_store.read_listings. The workers read only their text columns through it.
+        shards (int): Number of shards / worker processes.
+        by (str): "city" or "hash".
+    """
+
+    def __init__(self, source_path, engine, reader, shards=FILTER_SHARDS, by=FILTER_SHARD_BY):
+        self.source_path = source_path
+        self.engine = engine
+        self.reader = reader
+        self.shard_count = shards
+        self.by = by
+        self.queries = 0
+        self.fallbacks = 0
+        self.pruned = 0
+        self.last_error = None
+        self._shards = None
+        self._pid = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Partitions the listings and spawns the shard workers of this process (once per process).
+        """
+        with self._lock:
+            if self._closed or self._pid == os.getpid():
+                return
+            cities = self.engine.text.place_keys["city"]
+            self._shards = [_Shard(rows, set(cities[rows].tolist())) for rows in partition(self.engine, self.shard_count, self.by)]
+            # Spawned, not forked: the parent runs request and watcher threads
+            context = multiprocessing.get_context("spawn")
+            order = list(self.engine.frame.columns)
+            for shard in self._shards:
+                shard.memory, layout = share_columns(self.engine.frame, shard.rows)
+                shard.conn, child = context.Pipe()
+                shard.process = context.Process(
+                    target=_serve, args=(child, self.reader, self.source_path, shard.rows, shard.memory.name, layout, order),
+                    daemon=True, name=f"filter-shard-{len(shard.rows)}",
+                )
+                shard.process.start()
+                child.close()
+            self._pid = os.getpid()
+            # The shared memory blocks outlive this process unless they are unlinked
+            atexit.register(self.close)
+
+    def wait_ready(self, timeout=None):
+        """
+        Blocks until every shard has built its engine (or `timeout` seconds pass). Returns whether they all did.
+        """
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.ready():
+            if self._closed or (deadline is not None and time.monotonic() > deadline):
+                return False
+            time.sleep(0.05)
+        return True
+
+    def ready(self):
+        if self._closed or self._shards is None or self._pid != os.getpid():
+            return False
+        for shard in self._shards:
+            if shard.ready:
+                continue
+            status = None
+            with shard.lock:
+                if not shard.ready and shard.conn.poll():
+                    status, value = shard.conn.recv()
+                    if status == "ready":
+                        shard.ready, shard.build_seconds = True, value
+            if status not in (None, "ready"):
+                self._fail(f"Shard worker failed to start: {value}")
+            if not shard.ready:
+                return False
+        return True
+
+    def _fail(self, error):
+        logger.warning("Filter shards disabled, evaluating in-process: %s", error)
+        self.last_error = error
+        self.close()
+
+    def _portable(self, node):
+        # `near` places become coordinates: a city's median position needs all of its listings, not one shard's
+        if "and" in node or "or" in node:
+            key = "and" if "and" in node else "or"
+            return {key: [self._portable(child) for child in node[key]]}
+        if "not" in node:
+            return {"not": self._portable(node["not"])}
+        if node.get("op") == "near" and "place" in node["value"]:
+            lat, lng = self.engine.place_point(node["value"]["place"])
+            return {**node, "value": {"lat": lat, "lng": lng, "radius_km": node["value"]["radius_km"]}}
+        return node
+
+    def evaluate(self, node):
+        """
+        Returns the sorted row positions matched by a validated filter AST, like `FilterEngine.evaluate`.
+
+        Raises:
+            filter_engine.FilterError: If the filter names an unknown place.
+        """
+        self.start()
+        if not self.ready():
+            self.fallbacks += 1
+            return self.engine.evaluate(node)
+        self.queries += 1
+        node = self._portable(node)
+        targets = self._shards
+        cities = pinned_cities(node)
+        if cities is not None:
+            targets = [shard for shard in self._shards if shard.cities & cities]
+            self.pruned += len(self._shards) - len(targets)
+        if not targets:
+            return np.zeros(0, dtype=np.int64)
+        # Every shard gets the query before any answer is read; locks are taken in shard order
+        sent = []
+        answers = []
+        error = None
+        try:
+            for shard in targets:
+                shard.lock.acquire()
+                sent.append(shard)
+                shard.conn.send(node)
+            for shard in sent:
+                if not shard.conn.poll(FILTER_SHARD_TIMEOUT):
+                    raise TimeoutError(f"no answer from a filter shard within {FILTER_SHARD_TIMEOUT:g} s")
+                answers.append(shard.conn.recv())
+        except (OSError, EOFError, TimeoutError) as exc:
+            error = exc
+        finally:
+            for shard in sent:
+                shard.lock.release()
+        if error is not None:
+            self._fail(repr(error))
+            self.fallbacks += 1
+            return self.engine.evaluate(node)
+        matched = []
+        for shard, (status, value) in zip(sent, answers):
+            if status == "filter_error":
+                raise filter_engine.FilterError(value)
+            if status != "ok":
+                raise RuntimeError(f"Filter shard failed: {value}")
+            matched.append(shard.rows[value])
+        return np.sort(np.concatenate(matched)) if len(matched) > 1 else matched[0]
+
+    def close(self):
+        """
+        Stops the shard workers; later queries run in-process. Called when a new dataset version replaces this one.
+        """
+        with self._lock:
+            self._closed = True
+            if self._pid != os.getpid():
+                return
+            atexit.unregister(self.close)
+            for shard in self._shards or []:
+                with shard.lock:
+                    try:
+                        shard.conn.send(None)
+                        shard.conn.close()
+                    except OSError:
+                        pass
+                shard.process.join(timeout=1)
+                if shard.process.is_alive():
+                    shard.process.terminate()
+                if shard.memory is not None:
+                    shard.memory.close()
+                    shard.memory.unlink()
+                    shard.memory = None
+
+    def stats(self):
+        shards = self._shards or []
+        return {
+            "shards": self.shard_count,
+            "by": self.by,
+            "ready": self.ready() if self._pid == os.getpid() else False,
+            "rows": [len(shard.rows) for shard in shards],
+            "build_seconds": [shard.build_seconds for shard in shards],
+            "queries": self.queries,
+            "pruned_shard_queries": self.pruned,
+            "fallbacks": self.fallbacks,
+            "last_error": self.last_error,
+        }
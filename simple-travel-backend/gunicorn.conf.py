@@ -0,0 +1,25 @@
+# Picked up automatically by `gunicorn app:app` when run from this directory.
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8001")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+# Threaded workers: a request waiting on the LLM blocks one thread, not the whole worker
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+
+# Import the app (and parse the listings dataset) once in the master before forking,
+# so workers share the loaded pages copy-on-write instead of each parsing the CSV.
+preload_app = True
+
+
+def when_ready(server):
+    import app
+    server.log.info("Listings store ready: %s", app.listings_store_instance.stats())
+
+
+def post_fork(server, worker):
+    import app
+    # The dataset watcher thread is per process; start it here instead of on the first request
+    if app.listings_store_instance.watch:
+        app.listings_store_instance.start_watcher()
+    server.log.info("Worker %s using listings v%s", worker.pid, app.listings_store_instance.stats().get("version"))
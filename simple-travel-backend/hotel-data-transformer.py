@@ -1,70 +1,81 @@
 import pandas as pd
 import json
 import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from argparse import ArgumentParser
 import chat_config
+import master_dataset
+import snapshot
 
-def reduce_columns(sdf):
-    REMOVE_COLS = ['accessibilityModule', 'Host', 'PreviewAmenities', 'seeAllAmenitySections', 'structuredHouseRulesWithTips', 'highlights',
-                   'Percentage',
-                    'hometourRooms', 'listingExpectations', 'listingRooms', 'localizedListingExpectations', 'caption', 'priceDetails']
-    remove_col_list = []
-    for col in sdf.columns:
-        for removable in REMOVE_COLS:
-            if str.lower(removable) in str.lower(col):
-                remove_col_list.append(col)
-    df = sdf.drop(columns=remove_col_list)
-    return df.dropna(axis='columns', how='all')
-
-def shorten_amenities(df):
-    # First, extract names for renaming 'isPresent' columns
-    num_amenities = 100  # Adjust this based on the actual number of amenities
-    for i in range(num_amenities):
-        is_present_col = f'listingAmenities/{i}/isPresent'
-        name_col = f'listingAmenities/{i}/name'
-        
-        # Check if the necessary columns are in the DataFrame
-        if name_col in df.columns:
-            if is_present_col in df.columns: 
-                # Rename 'isPresent' column based on the 'name' column
-                new_col_name = df[name_col].dropna().iloc[0]
-                df.rename(columns={is_present_col: f'amenity_{new_col_name}'}, inplace=True)
-            df.drop(columns=[name_col], inplace=True)            
-    
-        id_col = f'listingAmenities/{i}/id'
-        if id_col in df.columns:
-            df = df.drop(columns=[id_col])
+REMOVE_COLS = ['accessibilityModule', 'Host', 'PreviewAmenities', 'seeAllAmenitySections', 'structuredHouseRulesWithTips', 'highlights',
+               'Percentage',
+               'hometourRooms', 'listingExpectations', 'listingRooms', 'localizedListingExpectations', 'caption', 'priceDetails']
+NUM_AMENITIES = 100  # Adjust this based on the actual number of amenities
+MAX_PHOTO_ID = 30
+LABEL_COLUMNS = ['bedLabel', 'bathroomLabel', 'bedroomLabel']
+AMENITY_SLOT = re.compile(r"listingAmenities/(\d+)/(isPresent|name)$")
+REVIEW_SLOT = re.compile(r"reviewDetailsInterface/reviewSummary/(\d+)/(label|localizedRating)$")
 
-        desc_col = f"listingAmenities/{i}/description"
-        if desc_col in df.columns:
-            df = df.drop(columns=[desc_col])
-    return df
+def is_removed(col):
+    return any(str.lower(removable) in str.lower(col) for removable in REMOVE_COLS)
 
-def shorten_reviews(df):
-    num_reviews = 6
-    for i in range(num_reviews):
-        label_col = f'reviewDetailsInterface/reviewSummary/{i}/label'
-        rating_col = f'reviewDetailsInterface/reviewSummary/{i}/localizedRating'
-        value_col = f'reviewDetailsInterface/reviewSummary/{i}/value'
-        if label_col in df.columns:
-            new_col_name = df[label_col].dropna().iloc[0]
-            df.rename(columns={rating_col: new_col_name}, inplace=True)
-            df = df.drop(columns=[label_col, value_col])
-    return df
+def get_photo_id(column_name):
+    # Extract the photo ID from a column name
+    parts = column_name.split('/')
+    if len(parts) > 1 and parts[0] == 'photos':
+        try:
+            return int(parts[1])
+        except ValueError:
+            return None
+    return 1
+
+def plan_columns(columns):
+    """
+    Picks the raw columns worth parsing, from the CSV header alone.
+
+    Scraper dumps have thousands of `listingAmenities/*`, `photos/*` and `reviewSummary/*` columns; only
+    columns that can end up in `chat_config.FINAL_COLUMNS` are kept: final columns present as-is, the amenity
+    `isPresent` / `name` slots and review `label` / `localizedRating` slots that get renamed, and the bed / bath /
+    bedroom labels. Removed (`REMOVE_COLS`) columns and photos past `MAX_PHOTO_ID` are never parsed.
 
-def remove_too_many_photos(df, max_id=30):
-    # Define a helper function to extract the photo ID from a column name
-    def get_photo_id(column_name):
-        parts = column_name.split('/')
-        if len(parts) > 1 and parts[0] == 'photos':
-            try:
-                return int(parts[1])
-            except ValueError:
-                return None
-        return 1
-    # Use the helper function to filter out columns
-    cols_to_keep = [col for col in df.columns if get_photo_id(col) <= max_id]
-    return df[cols_to_keep]
+    Parameters:
+        columns (list): Header of the raw CSV.
+
+    Returns:
+        list: Columns to pass to `pd.read_csv(usecols=...)`.
+    """
+    final_columns = set(chat_config.FINAL_COLUMNS)
+    usecols = []
+    for col in columns:
+        if is_removed(col) or get_photo_id(col) > MAX_PHOTO_ID:
+            continue
+        amenity = AMENITY_SLOT.match(col)
+        if col in final_columns or col in LABEL_COLUMNS or REVIEW_SLOT.match(col) or (amenity and int(amenity.group(1)) < NUM_AMENITIES):
+            usecols.append(col)
+    return usecols
+
+def plan_renames(df):
+    """
+    Maps amenity `isPresent` slots to `amenity_<name>` and review rating slots to their label, using the first
+    non-empty name / label in each slot. Returns the renames and the slot columns to drop afterwards.
+    """
+    renames = {}
+    drop = []
+    for col in df.columns:
+        amenity = AMENITY_SLOT.match(col)
+        if amenity and amenity.group(2) == 'name':
+            is_present_col = f'listingAmenities/{amenity.group(1)}/isPresent'
+            if is_present_col in df.columns:
+                renames[is_present_col] = f'amenity_{df[col].dropna().iloc[0]}'
+            drop.append(col)
+        review = REVIEW_SLOT.match(col)
+        if review and review.group(2) == 'label':
+            renames[f'reviewDetailsInterface/reviewSummary/{review.group(1)}/localizedRating'] = df[col].dropna().iloc[0]
+            drop.append(col)
+    return renames, drop
 
 def sanitize_column_name(col):
     return str("_").join(str("_").join(col.split(" ")).split("_"))
@@ -98,62 +109,130 @@ def numerize_string_series(input_series, remove_string):
     return pd.to_numeric(numeric_part[0], errors='coerce')
 
 def save_booleans_as_ints(df):
-    for col in df.columns:
-        if ("amenity" in col) | ("allows" in col):
-            df[col] = df[col].fillna(0).astype(int)
+    # 1 / 0, and missing where the dump doesn't say: an unknown flag must not read as false
+    flag_cols = [col for col in df.columns if ("amenity" in col) | ("allows" in col)]
+    df[flag_cols] = df[flag_cols].apply(pd.to_numeric, errors='coerce')
     return df
 
 def process_csv(csv_path):
-    sdf = pd.read_csv(csv_path)
-    df = shorten_amenities(reduce_columns(sdf))
-    df = shorten_reviews(df)
-    df = remove_too_many_photos(df, max_id=30)
+    # Column plan from the header: dropped columns are never parsed, renames and drops happen in one pass
+    usecols = plan_columns(pd.read_csv(csv_path, nrows=0).columns)
+    df = pd.read_csv(csv_path, usecols=usecols).dropna(axis='columns', how='all')
+    renames, drop = plan_renames(df)
+    df = df.drop(columns=drop).rename(columns=renames)
     df = lose_mostly_empty(df, 0.8)
-    df = save_booleans_as_ints(df)
-    df['bed_count'] = numerize_string_series(df['bedLabel'], "beds")
-    df['bathroom_count'] = numerize_string_series(df['bathroomLabel'], "bath")
-    df['bedroom_count'] = numerize_string_series(df['bedroomLabel'], "bedroom")
+    # Consolidate the per-column blocks left by the flag conversion before adding columns
+    df = save_booleans_as_ints(df).copy()
+    df = df.assign(
+        bed_count=numerize_string_series(df['bedLabel'], "beds"),
+        bathroom_count=numerize_string_series(df['bathroomLabel'], "bath"),
+        bedroom_count=numerize_string_series(df['bedroomLabel'], "bedroom"),
+    )
     valid_columns = [col for col in chat_config.FINAL_COLUMNS if col in df.columns]
     print(valid_columns)
-    return df[valid_columns].sort_values(by=['reviewDetailsInterface/reviewCount'], ascending=False).fillna(" ")
+    return df[valid_columns].sort_values(by=['reviewDetailsInterface/reviewCount'], ascending=False)
+
+def transform_file(file_path, file_save_path, write_csv=False):
+    df = process_csv(file_path)
+    save_clean(df, file_save_path, write_csv)
+    return df
+
+def save_clean(df, file_save_path, write_csv=False):
+    # The typed columnar snapshot is what the backend loads; the CSV is an optional export
+    snapshot.write_snapshot(df, snapshot.snapshot_path_for(file_save_path))
+    if write_csv:
+        df.fillna(" ").to_csv(file_save_path)
 
-def process_new_files(file_dir, clean_dir, processed_files_json):
+def snapshot_existing(clean_dir):
+    frames = []
+    for filename in sorted(os.listdir(clean_dir)):
+        if filename.endswith(".csv") and filename != master_dataset.MASTER_NAME:
+            file_path = clean_dir + "/" + filename
+            print(f"Snapshotting cleaned file: {filename}")
+            df = pd.read_csv(file_path, index_col=0)
+            snapshot.write_snapshot(df, snapshot.snapshot_path_for(file_path))
+            frames.append(df)
+    if frames:
+        print("Master dataset:", master_dataset.upsert(clean_dir, frames))
+
+def process_new_files(file_dir, clean_dir, processed_files_json, write_csv=False, workers=1):
    """
-   Loops through files in a reference directory, checks for new files against a processed_files.json file,
-   processes new files, and updates the processed_files.json file.
+   Loops through files in a reference directory, skips files whose contents are already in the manifest
+   (clean/manifest.json), processes new or changed files and upserts their listings into the master snapshot.
 
    Args:
        reference_dir (str): Path to the reference directory containing files to process.
-       processed_files_json (str, optional): Path to the processed_files.json file. Defaults to "processed_files.json".
+       processed_files_json (str, optional): Path to the legacy processed_files.json file (filenames only); files
+           listed there are recorded in the manifest without being processed again.
+       write_csv (bool, optional): Also export each cleaned file as CSV next to its snapshot.
+       workers (int, optional): Number of processes transforming files in parallel. Defaults to 1 (in-process).
+
+   Returns:
+       list: Names of the files that failed to transform. They are reported and skipped, whatever the number of
+           workers, and left out of the manifest so the next run retries them.
    """
 
+   manifest = master_dataset.load_manifest(clean_dir)
    try:
        with open(processed_files_json, "r") as f:
-           processed_files = set(json.load(f))
+           legacy_files = set(json.load(f))
    except (FileNotFoundError, json.JSONDecodeError):
-       processed_files = set()
+       legacy_files = set()
+   manifest_files = {entry["file"] for entry in manifest["files"].values()}
 
-   new_files = []
-   for filename in os.listdir(file_dir):
+   pending = {}
+   for filename in sorted(os.listdir(file_dir)):
         file_path = file_dir + "/" + filename
-        if not os.path.isdir(file_path):
-            if filename not in processed_files:
-            # Process the new file here
-                print(f"Processing new file: {filename}")
-                if file_path.endswith(".csv"):
-                    # Clean data and append to csv
-                    df = process_csv(file_path)
-                    print(df.info())
-                    file_save_path = clean_dir + "/" + filename
-                    df.to_csv(file_save_path)
-                    new_files.append(filename)
-            else:
-                print(f'Already processed ------------------ {filename}')
-
-   if new_files:
-        with open(processed_files_json, "w") as f:
-           json.dump(list(processed_files | set(new_files)), f)
-        print('List of processed files:', list(new_files))
+        if os.path.isdir(file_path) or not file_path.endswith(".csv"):
+            continue
+        sha256 = master_dataset.file_sha256(file_path)
+        if sha256 in manifest["files"] or sha256 in pending.values():
+            print(f'Already processed ------------------ {filename}')
+        elif filename in legacy_files and filename not in manifest_files:
+            # Processed before content hashes were tracked; --snapshot-existing merges its cleaned output
+            master_dataset.record_file(manifest, sha256, filename, None, legacy=True)
+            print(f'Already processed (processed_files.json) ------------------ {filename}')
+        else:
+            pending[filename] = sha256
+
+   cleaned = {}
+   failed = []
+   def report(filename, transform):
+        try:
+            cleaned[filename] = transform()
+        except Exception as exc:
+            # Left out of the manifest, so the next run retries the file
+            print(f"Failed to process {filename}: {exc!r}")
+            failed.append(filename)
+            return
+        print(f"Processed new file: {filename} ({len(cleaned[filename])} listings)")
+
+   if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            futures = {
+                pool.submit(transform_file, file_dir + "/" + filename, clean_dir + "/" + filename, write_csv): filename
+                for filename in pending
+            }
+            for future in as_completed(futures):
+                report(futures[future], future.result)
+   else:
+        for filename in pending:
+            print(f"Processing new file: {filename}")
+            report(filename, lambda: transform_file(file_dir + "/" + filename, clean_dir + "/" + filename, write_csv))
+
+   if cleaned:
+        # Filenames carry the scrape time, so later scrapes win for listings present in several files
+        new_files = sorted(cleaned)
+        stats = master_dataset.upsert(clean_dir, [cleaned[filename] for filename in new_files])
+        for filename in new_files:
+            master_dataset.record_file(manifest, pending[filename], filename, len(cleaned[filename]))
+        manifest["master"] = {**stats, "updated_at": time.time()}
+        print('List of processed files:', new_files)
+        print('Master dataset:', stats)
+   if failed:
+        print('Failed files:', sorted(failed))
+   master_dataset.save_manifest(clean_dir, manifest)
+   return sorted(failed)
 
 if __name__=="__main__":
     parser = ArgumentParser(description="Process references directory with options for subdirectories")
@@ -161,10 +240,24 @@ if __name__=="__main__":
                         help="Path to the references directory (default: references/)")
     parser.add_argument("--clean", "-c", type=str, default="clean/",
                         help="Path to clean data directory")    
+    parser.add_argument("--csv", action="store_true",
+                        help="Also export cleaned data as CSV next to the columnar snapshot")
+    parser.add_argument("--snapshot-existing", action="store_true",
+                        help="Write columnar snapshots for the cleaned CSVs already in the clean directory, merge them into the master snapshot and exit")
+    parser.add_argument("--compact-master", action="store_true",
+                        help="Rewrite the master snapshot as one full snapshot (merging its delta layers) and exit")
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="Number of files to transform in parallel (default: 1)")
     args = parser.parse_args()
 
     # Construct directory paths
     references_directory = os.path.abspath(os.path.expanduser(args.references))
     clean_directory = os.path.abspath(os.path.expanduser(args.clean))
     processed_files_json_path = clean_directory + "/" + "processed_files.json"
-    process_new_files(references_directory, clean_directory, processed_files_json_path)
+    if args.compact_master:
+        print("Master dataset compacted:", master_dataset.compact(clean_directory), "listings")
+    elif args.snapshot_existing:
+        snapshot_existing(clean_directory)
+    else:
+        failed = process_new_files(references_directory, clean_directory, processed_files_json_path, args.csv, args.workers)
+        sys.exit(1 if failed else 0)
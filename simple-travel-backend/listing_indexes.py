@@ -0,0 +1,247 @@
+"""
+Indexes built once per loaded listings frame and used by filter_engine.FilterEngine.
+"""
+import numpy as np
+import pandas as pd
+
+import chat_config
+
+
+def canonical_flag(column):
+    # `lose_mostly_empty` can leave both 'amenity_Hot water' and 'amenity_Hot_water'; treat them as one flag
+    prefix, sep, rest = column.partition('_')
+    return prefix + sep + rest.replace(' ', '_')
+
+
+class FlagBitmapIndex:
+    """
+    Packed per-flag bitmaps for the amenity and guest-control columns.
+
+    Each flag is stored as `np.packbits` of its "is true" mask (one bit per listing), so a query
+    over several flags is a handful of `bitwise_and` calls over n/8 bytes instead of a pandas
+    comparison per column. A missing (unknown) flag is neither true nor false: flags with missing values
+    also keep a "known" bitmap, and only known listings match `== False`. The "is true" bitmaps are the rows
+    of one (flags x n/8) `matrix`, padded to whole 64-bit words, so counting every flag over a set of listings
+    is a single pass (see facets.py).
+    """
+
+    def __init__(self, frame):
+        self.size = len(frame)
+        bitmaps = {}
+        known = {}
+        self.aliases = {}
+        # First frame column of each flag, the name filters use for it
+        self.columns = {}
+        for col in frame.columns:
+            if not col.startswith(chat_config.FLAG_COLUMN_PREFIXES):
+                continue
+            values = pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            bits = np.packbits(values == 1)
+            present = np.packbits(~np.isnan(values))
+            key = canonical_flag(col)
+            bitmaps[key] = bitmaps[key] | bits if key in bitmaps else bits
+            known[key] = known[key] | present if key in known else present
+            self.aliases[col] = key
+            self.columns.setdefault(key, col)
+        self.keys = list(bitmaps)
+        width = -(-self.size // 8)
+        self.matrix = np.zeros((len(self.keys), -(-width // 8) * 8), dtype=np.uint8)
+        for position, key in enumerate(self.keys):
+            self.matrix[position, :width] = bitmaps[key]
+        self.bitmaps = {key: self.matrix[position, :width] for position, key in enumerate(self.keys)}
+        self.counts = {key: int(np.unpackbits(bits, count=self.size).sum()) for key, bits in self.bitmaps.items()}
+        self._all = np.packbits(np.ones(self.size, dtype=bool))
+        # Only flags with missing values need their "known" bitmap
+        self.known = {key: bits for key, bits in known.items() if not np.array_equal(bits, self._all)}
+        self.false_counts = {
+            key: int(np.unpackbits(self.known.get(key, self._all), count=self.size).sum()) - self.counts[key]
+            for key in self.keys
+        }
+
+    def __contains__(self, column):
+        return column in self.aliases
+
+    def count(self, column, value=True):
+        # Listings where the flag is `value`; unknown ones count for neither
+        key = self.aliases[column]
+        return self.counts[key] if value else self.false_counts[key]
+
+    def match(self, required=(), excluded=()):
+        """
+        Returns the packed bitmap of listings that have every `required` flag and, known to be false, none of the
+        `excluded` ones.
+        """
+        result = self._all.copy()
+        for column in required:
+            np.bitwise_and(result, self.bitmaps[self.aliases[column]], out=result)
+        for column in excluded:
+            key = self.aliases[column]
+            np.bitwise_and(result, np.invert(self.bitmaps[key]), out=result)
+            if key in self.known:
+                np.bitwise_and(result, self.known[key], out=result)
+        return result
+
+    def to_mask(self, packed):
+        return np.unpackbits(packed, count=self.size).view(bool)
+
+    def nbytes(self):
+        return self.matrix.nbytes + sum(bits.nbytes for bits in self.known.values())
+
+
+# Numeric columns that get a sorted range index
+RANGE_COLUMNS = [
+    'pricing/rate/amount',
+    'guestControls/personCapacity',
+    'bed_count',
+    'bedroom_count',
+    'bathroom_count',
+    'reviewDetailsInterface/reviewCount',
+]
+
+
+class SortedRangeIndex:
+    """
+    Sorted copies of numeric columns with the row permutation that sorts them.
+
+    A range predicate becomes two binary searches over the sorted values, and the matching rows
+    are a contiguous slice of the permutation, so it costs O(log n + k) instead of a full scan.
+    Missing values are left out of the index, matching pandas comparison semantics for NaN. float32
+    columns stay float32, so bounds are compared at the precision a scan of the column uses.
+    """
+
+    def __init__(self, frame, columns=RANGE_COLUMNS):
+        self.size = len(frame)
+        self.sorted_values = {}
+        self.permutations = {}
+        for col in columns:
+            if col not in frame.columns:
+                continue
+            values = pd.to_numeric(frame[col], errors='coerce').to_numpy()
+            values = values.astype(np.float32 if values.dtype == np.float32 else np.float64)
+            present = np.flatnonzero(~np.isnan(values))
+            order = np.argsort(values[present], kind='stable')
+            self.permutations[col] = present[order]
+            self.sorted_values[col] = values[present][order]
+
+    def __contains__(self, column):
+        return column in self.sorted_values
+
+    def bounds(self, column, predicates):
+        """
+        Returns the [start, stop) slice of the sorted column matched by every (op, value) predicate.
+        """
+        values = self.sorted_values[column]
+        start, stop = 0, len(values)
+        for op, value in predicates:
+            # searchsorted would compare in float64; cast the bound to the column's dtype instead
+            value = values.dtype.type(value)
+            if op in ('>=', '=='):
+                start = max(start, int(np.searchsorted(values, value, side='left')))
+            if op == '>':
+                start = max(start, int(np.searchsorted(values, value, side='right')))
+            if op in ('<=', '=='):
+                stop = min(stop, int(np.searchsorted(values, value, side='right')))
+            if op == '<':
+                stop = min(stop, int(np.searchsorted(values, value, side='left')))
+        return start, max(start, stop)
+
+    def rows(self, column, start, stop):
+        return np.sort(self.permutations[column][start:stop])
+
+    def nbytes(self):
+        return sum(self.sorted_values[col].nbytes + self.permutations[col].nbytes for col in self.sorted_values)
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * np.pi / 180
+# Grid cell size in degrees, about 2.2 km of latitude
+GEO_CELL_DEGREES = 0.02
+
+
+def haversine_km(lat, lng, point_lat, point_lng):
+    """
+    Great-circle distances in km from arrays of coordinates to one point (NaN where coordinates are missing).
+    """
+    lat, lng = np.radians(lat), np.radians(lng)
+    point_lat, point_lng = np.radians(point_lat), np.radians(point_lng)
+    a = np.sin((lat - point_lat) / 2) ** 2 + np.cos(lat) * np.cos(point_lat) * np.sin((lng - point_lng) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeoGridIndex:
+    """
+    Listing coordinates bucketed into a fixed latitude / longitude grid.
+
+    Rows are sorted by cell, latitude band first, so the cells of one band that overlap a bounding box
+    are a contiguous slice found with two binary searches. A radius or box query only checks the rows
+    in the slices of the bands it covers, so its cost follows the number of nearby listings rather than
+    the size of the dataset. Listings without coordinates never match.
+    """
+
+    def __init__(self, frame, cell_degrees=GEO_CELL_DEGREES):
+        self.size = len(frame)
+        self.cell_degrees = cell_degrees
+        self.lat = pd.to_numeric(frame[chat_config.LATITUDE_COLUMN], errors='coerce').to_numpy(dtype=np.float64)
+        self.lng = pd.to_numeric(frame[chat_config.LONGITUDE_COLUMN], errors='coerce').to_numpy(dtype=np.float64)
+        present = np.flatnonzero(~np.isnan(self.lat) & ~np.isnan(self.lng))
+        self.cells_per_band = int(np.ceil(360 / cell_degrees)) + 1
+        keys = self._band(self.lat[present]) * self.cells_per_band + self._cell(self.lng[present])
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.rows = present[order]
+
+    def _band(self, lat):
+        return np.floor((np.asarray(lat) + 90) / self.cell_degrees).astype(np.int64)
+
+    def _cell(self, lng):
+        return np.floor((np.asarray(lng) + 180) / self.cell_degrees).astype(np.int64)
+
+    def _slices(self, south, west, north, east):
+        bands = np.arange(self._band(south), self._band(north) + 1) * self.cells_per_band
+        starts = np.searchsorted(self.keys, bands + self._cell(west), side='left')
+        stops = np.searchsorted(self.keys, bands + self._cell(east), side='right')
+        return starts, stops
+
+    def _candidates(self, south, west, north, east):
+        starts, stops = self._slices(south, west, north, east)
+        lengths = stops - starts
+        positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+        return self.rows[positions]
+
+    @staticmethod
+    def radius_box(lat, lng, radius_km):
+        # (south, west, north, east) around a circle, widened in longitude by the latitude
+        lat_span = radius_km / KM_PER_DEGREE
+        lng_span = lat_span / max(np.cos(np.radians(lat)), 1e-6)
+        return max(lat - lat_span, -90.0), max(lng - lng_span, -180.0), min(lat + lat_span, 90.0), min(lng + lng_span, 180.0)
+
+    def estimate(self, south, west, north, east):
+        """
+        Returns the number of listings in the grid cells overlapping a box (an upper bound of the matches).
+        """
+        starts, stops = self._slices(south, west, north, east)
+        return int((stops - starts).sum())
+
+    def near(self, lat, lng, radius_km, rows=None):
+        """
+        Returns the sorted rows (within `rows`, if given) at most `radius_km` from (lat, lng).
+        """
+        candidates = self._candidates(*self.radius_box(lat, lng, radius_km)) if rows is None else rows
+        distances = haversine_km(self.lat[candidates], self.lng[candidates], lat, lng)
+        matched = candidates[distances <= radius_km]
+        return np.sort(matched) if rows is None else matched
+
+    def within(self, south, west, north, east, rows=None):
+        """
+        Returns the sorted rows (within `rows`, if given) inside a bounding box.
+        """
+        candidates = self._candidates(south, west, north, east) if rows is None else rows
+        lat, lng = self.lat[candidates], self.lng[candidates]
+        matched = candidates[(lat >= south) & (lat <= north) & (lng >= west) & (lng <= east)]
+        return np.sort(matched) if rows is None else matched
+
+    def distances(self, rows, lat, lng):
+        return haversine_km(self.lat[rows], self.lng[rows], lat, lng)
+
+    def nbytes(self):
+        return int(self.lat.nbytes + self.lng.nbytes + self.keys.nbytes + self.rows.nbytes)
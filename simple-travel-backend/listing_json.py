@@ -0,0 +1,161 @@
+"""
+JSON encoding of /chat listing payloads straight from the frame's NumPy arrays.
+
+The default projection (`chat_config.RESPONSE_COLUMNS`) is pre-rendered once per loaded dataset into
+one JSON object per listing, so a response is a join of cached byte fragments for the matched rows.
+Custom `fields` projections are encoded column by column on demand. Detail columns (descriptions,
+photos) are decoded for the encoded rows only. Missing values are written as "" (what `fillna("")`
+produced before). orjson is used when installed, the stdlib otherwise.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import chat_config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Listings above this count are encoded per request instead of caching a fragment per listing (0 disables the cache)
+FRAGMENT_CACHE_MAX_ROWS = int(os.getenv("LISTING_JSON_CACHE_MAX_ROWS", "200000"))
+FLOAT32_DIGITS = 7
+
+
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _float32_values(values):
+    # float32 holds about 7 significant digits; rounding there writes a stored 4.87 as 4.87, not 4.869999885559082
+    values = values.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exponent = np.nan_to_num(np.floor(np.log10(np.abs(values))), nan=0, neginf=0, posinf=0)
+    scale = 10.0 ** (FLOAT32_DIGITS - 1 - np.minimum(exponent, FLOAT32_DIGITS - 1))
+    return np.round(values * scale) / scale
+
+
+def _column_values(values):
+    # NumPy column (or nullable flags) -> Python values, with missing values replaced by ""
+    if isinstance(values, pd.arrays.IntegerArray):
+        items = values.to_numpy(dtype=np.int64, na_value=0).tolist()
+        missing = values.isna()
+    elif values.dtype.kind in 'biu':
+        return values.tolist()
+    else:
+        if values.dtype == np.float32:
+            values = _float32_values(values)
+        items = values.tolist()
+        missing = np.isnan(values) if values.dtype.kind == 'f' else pd.isna(values)
+    for position in np.flatnonzero(missing):
+        items[position] = ""
+    return items
+
+
+def _take(frame, details, column, rows):
+    if details is not None and column in details:
+        return details.take(column, rows)
+    series = frame[column]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Decode the requested rows only, not the whole column
+        return np.asarray(series.array.take(rows), dtype=object)
+    if isinstance(series.dtype, pd.Int8Dtype):
+        return series.array[rows]
+    return series.to_numpy()[rows]
+
+
+def _records(frame, rows, columns, details=None):
+    names = list(columns.values())
+    values = [_column_values(_take(frame, details, column, rows)) for column in columns]
+    return (dict(zip(names, row)) for row in zip(*values))
+
+
+def render_fragments(frame, rows, columns, details=None):
+    """
+    Encodes the given rows of `frame` as one JSON object (bytes) per listing.
+
+    Parameters:
+        frame (pd.DataFrame): Listings frame.
+        rows (np.ndarray): Row positions to encode.
+        columns (dict): Column -> response field name, in output order.
+        details (snapshot.DetailColumns, optional): Columns kept out of `frame`.
+    """
+    return [dumps(record) for record in _records(frame, rows, columns, details)]
+
+
+def render_array(frame, rows, columns, details=None):
+    """
+    Encodes the given rows of `frame` as one JSON array (bytes), see `render_fragments`.
+    """
+    return dumps(list(_records(frame, rows, columns, details)))
+
+
+class ListingSerializer:
+    """
+    Encodes listing projections of one loaded frame as JSON arrays.
+    """
+
+    def __init__(self, frame, columns=chat_config.RESPONSE_COLUMNS, max_cached_rows=FRAGMENT_CACHE_MAX_ROWS,
+                 details=None):
+        self.frame = frame
+        self.details = details
+        self.columns = {column: name for column, name in columns.items() if self._has(column)}
+        self.fragments = None
+        if 0 < len(frame) <= max_cached_rows:
+            self.fragments = render_fragments(frame, np.arange(len(frame)), self.columns, details)
+
+    def _has(self, column):
+        return column in self.frame.columns or (self.details is not None and column in self.details)
+
+    def encode(self, rows, fields=None):
+        """
+        Returns the JSON array (bytes) of the listings at `rows`, restricted to `fields` when given.
+        """
+        if fields is None and self.fragments is not None:
+            fragments = self.fragments
+            return b"[" + b",".join([fragments[row] for row in rows.tolist()]) + b"]"
+        return render_array(self.frame, rows, self._columns(fields), self.details)
+
+    def iter_lines(self, rows, fields=None, chunk_size=500):
+        """
+        Yields the listings at `rows` as NDJSON (one object per line), `chunk_size` listings per chunk.
+        """
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            if fields is None and self.fragments is not None:
+                fragments = [self.fragments[row] for row in chunk.tolist()]
+            else:
+                fragments = render_fragments(self.frame, chunk, self._columns(fields), self.details)
+            yield b"\n".join(fragments) + b"\n"
+
+    def _columns(self, fields):
+        if fields is None:
+            return self.columns
+        columns = {column: name for column, name in self.columns.items() if name in fields}
+        order = {name: position for position, name in enumerate(fields)}
+        return dict(sorted(columns.items(), key=lambda item: order[item[1]]))
+
+    def detail(self, row):
+        """
+        Returns the JSON object (bytes) of every column of the listing at `row`, under the dataset's column names.
+        """
+        columns = [col for col in chat_config.FINAL_COLUMNS if self._has(col)]
+        return render_fragments(self.frame, np.array([row]), {col: col for col in columns}, self.details)[0]
+
+    def nbytes(self):
+        return sum(len(fragment) for fragment in self.fragments) if self.fragments is not None else 0
+
+
+def chat_payload(filters, listings, extra=None):
+    """
+    Assembles the /chat response body around an already encoded `listings` array.
+    """
+    body = b'{"filters":' + dumps(filters) + b',"listings":' + listings
+    for key, value in (extra or {}).items():
+        body += b"," + dumps(key) + b":" + dumps(value)
+    return body + b"}"
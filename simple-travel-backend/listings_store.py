@@ -0,0 +1,309 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import chat_config
+import facets
+import filter_engine
+import filter_shards
+import listing_json
+import prompt_builder
+import ranking
+import semantic_index
+import snapshot
+
+# Copy-on-write keeps the shared frame intact when a request derives a new one from it
+pd.set_option("mode.copy_on_write", True)
+# Keep chat_config.DETAIL_COLUMNS out of the frame and decode them per listing (off: load them like any column)
+LAZY_DETAIL_COLUMNS = os.getenv("LAZY_DETAIL_COLUMNS", "1") == "1"
+
+logger = logging.getLogger(__name__)
+
+
+def process_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def read_listings(source_path, rows=None, columns=None):
+    """
+    Reads a dataset source (snapshot directory or CSV) into (frame, snapshot.DetailColumns).
+
+    The detail columns are memory-mapped when reading a snapshot. With `rows` (sorted positions, e.g. a filter
+    shard) only those listings are read, renumbered from 0. With `columns` the frame holds only those columns.
+    """
+    lazy = chat_config.DETAIL_COLUMNS if LAZY_DETAIL_COLUMNS else []
+    if os.path.isdir(source_path):
+        names = [column["name"] for column in snapshot.read_schema(source_path)["columns"]]
+        details = snapshot.read_details(source_path, lazy)
+        if rows is not None:
+            details = details.subset(rows)
+        names = [col for col in names if col not in details and (columns is None or col in columns)]
+        return snapshot.read_snapshot(source_path, names, rows), details
+    frame = snapshot.apply_schema(pd.read_csv(source_path))
+    if rows is not None:
+        frame = frame.take(rows).reset_index(drop=True)
+    details = snapshot.DetailColumns.from_frame(frame, lazy)
+    frame = frame.drop(columns=details.columns)
+    return (frame if columns is None else frame[[col for col in frame.columns if col in columns]]), details
+
+
+class ListingsSnapshot:
+    """
+    One loaded version of the listings dataset.
+
+    Attributes:
+        frame (pd.DataFrame): Typed listings frame, without the detail columns. Never mutated after load.
+        details (snapshot.DetailColumns): Description and photo columns, decoded per listing on demand.
+        version (int): Monotonic counter, bumped on every (re)load in this process.
+        source_key (tuple): (path, mtime, version marker) the frame was loaded from.
+        load_seconds (float): Wall time spent parsing and typing the dataset.
+        reload_seconds (float): Wall time to build the whole snapshot, including indexes and JSON fragments.
+        frame_bytes (int): Deep memory usage of the frame.
+        detail_bytes (int): Size of the detail columns (page cache when memory-mapped from a snapshot).
+        engine (filter_engine.FilterEngine): Evaluator for filter ASTs over this frame.
+        serializer (listing_json.ListingSerializer): JSON encoder for /chat listing payloads.
+        prompt_schema (prompt_builder.PromptSchema): Column descriptions for the LLM prompt.
+        semantic (semantic_index.SemanticIndex | None): Description embeddings for relevance ranking.
+        facets (facets.FacetIndex): Facet codes for the counts /chat returns with `"facets": true`.
+        ranking (ranking.RankingIndex): Static scores of the `recommended` order.
+        shards (filter_shards.ShardedEngine | None): Multi-process filter evaluation, when `FILTER_SHARDS` is set.
+    """
+
+    def __init__(self, frame, version, source_key, load_seconds, loaded_at, semantic=None, details=None):
+        self.frame = frame
+        self.details = details if details is not None else snapshot.DetailColumns(len(frame))
+        self.version = version
+        self.source_key = source_key
+        self.load_seconds = load_seconds
+        self.loaded_at = loaded_at
+        self.frame_bytes = int(frame.memory_usage(deep=True).sum())
+        self.detail_bytes = self.details.nbytes()
+        self.engine = filter_engine.FilterEngine(frame, details=self.details)
+        self.serializer = listing_json.ListingSerializer(frame, details=self.details)
+        self.prompt_schema = prompt_builder.PromptSchema(frame)
+        self.semantic = semantic
+        self.facets = facets.FacetIndex(frame, self.engine.flags)
+        self.ranking = ranking.RankingIndex(frame)
+        self.shards = (
+            filter_shards.ShardedEngine(source_key[0], self.engine, read_listings)
+            if filter_shards.enabled(len(frame)) else None
+        )
+        self.reload_seconds = load_seconds
+        self._id_order = None
+
+    def evaluate(self, filter_ast):
+        # Sorted row positions matched by a validated filter, on the shard workers when there are any
+        return (self.shards or self.engine).evaluate(filter_ast)
+
+    def close(self):
+        # Called once a newer version replaced this one; requests still holding it evaluate in-process
+        if self.shards is not None:
+            self.shards.close()
+
+    @property
+    def columns(self):
+        # Every column a filter or projection may name, including the detail columns. The coordinates only count
+        # when some listing has them: the dumps merged into the master carry none, and `near` / `bbox` filters on
+        # all-NaN columns would be accepted only to match nothing
+        columns = self.frame.columns.append(pd.Index(self.details.columns))
+        if not self.prompt_schema.geo:
+            columns = columns.drop([chat_config.LATITUDE_COLUMN, chat_config.LONGITUDE_COLUMN], errors='ignore')
+        return columns
+
+    def view(self):
+        # Shallow copy: shares column data with the snapshot, any write copies first
+        return self.frame.copy(deep=False)
+
+    def full_frame(self):
+        """
+        Returns the frame with every detail column decoded, for tools and benchmarks (not the request path).
+        """
+        return self.details.attach(self.view())
+
+    def row_for_id(self, listing_id):
+        """
+        Returns the row position of the listing with this `idStr`, or None.
+        """
+        if not np.iinfo(np.int64).min <= listing_id <= np.iinfo(np.int64).max:
+            return None
+        if self._id_order is None:
+            self._id_order = np.argsort(self.frame['idStr'].to_numpy(), kind='stable')
+        ids = self.frame['idStr'].to_numpy()
+        position = int(np.searchsorted(ids, listing_id, sorter=self._id_order))
+        if position < len(ids) and ids[self._id_order[position]] == listing_id:
+            return int(self._id_order[position])
+        return None
+
+
+class ListingsStore:
+    """
+    Process-wide cache of the cleaned listings dataset.
+
+    The dataset is loaded once per process (or once in the gunicorn master when the app is
+    preloaded, so forked workers share the pages) and reloaded only when the file's mtime or
+    its version marker (`<dataset>.version`) changes. A columnar snapshot next to the CSV
+    (`<dataset>.snapshot/`, see snapshot.py) is memory-mapped instead of parsing the CSV.
+    While neither exists, `fallback_path` is served; the check that notices the dataset appear
+    switches to it like any other change.
+
+    With `watch` on, a background thread checks the source every `check_interval` seconds and
+    builds the new frame and its indexes off the request path, then swaps the current snapshot
+    reference; requests that already hold the previous snapshot finish against it. The thread is
+    started by the first request in each process, so it runs in gunicorn workers, not the master.
+    """
+
+    def __init__(self, path, check_interval=5.0, watch=True, fallback_path=None):
+        self.path = path
+        self.fallback_path = fallback_path
+        self.snapshot_path = snapshot.snapshot_path_for(path)
+        self.check_interval = check_interval
+        self.watch = watch
+        self.load_count = 0
+        self.reload_errors = 0
+        self.last_error = None
+        self._snapshot = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+        self.reload_listeners = []
+
+    def _source_path(self):
+        # The snapshot path is a symlink to its current generation; resolving it once per check
+        # means a swapped snapshot shows up as a new source path and is picked up atomically
+        path = self._dataset_path()
+        snapshot_path = snapshot.snapshot_path_for(path)
+        if os.path.exists(os.path.join(snapshot_path, snapshot.SCHEMA_FILE)):
+            return os.path.realpath(snapshot_path)
+        return path
+
+    def _dataset_path(self):
+        # The configured dataset once it (or its snapshot) exists, else the fallback
+        if self.fallback_path is None or os.path.exists(self.path):
+            return self.path
+        if os.path.exists(os.path.join(self.snapshot_path, snapshot.SCHEMA_FILE)):
+            return self.path
+        return self.fallback_path
+
+    def _source_key(self):
+        source_path = self._source_path()
+        if os.path.isdir(source_path):
+            mtime = os.stat(os.path.join(source_path, snapshot.SCHEMA_FILE)).st_mtime_ns
+        else:
+            mtime = os.stat(source_path).st_mtime_ns
+        try:
+            with open(self._dataset_path() + ".version") as f:
+                marker = f.read().strip()
+        except FileNotFoundError:
+            marker = None
+        return (source_path, mtime, marker)
+
+    def _load(self, source_key):
+        started = time.perf_counter()
+        frame, details = read_listings(source_key[0])
+        load_seconds = time.perf_counter() - started
+        version = self._snapshot.version + 1 if self._snapshot else 1
+        semantic = semantic_index.index_for(frame, source_key[0], details)
+        loaded = ListingsSnapshot(frame, version, source_key, load_seconds, time.time(), semantic, details)
+        loaded.reload_seconds = time.perf_counter() - started
+        # Single reference swap: requests holding the previous snapshot keep using it
+        previous, self._snapshot = self._snapshot, loaded
+        if previous is not None:
+            previous.close()
+        self.load_count += 1
+        logger.info(
+            "Loaded listings v%d from %s: %d rows in %.1f ms (%.1f ms with indexes), %.1f MB (%.0f bytes per listing)"
+            " + %.1f MB of detail columns",
+            version, source_key[0], len(frame), load_seconds * 1000, loaded.reload_seconds * 1000,
+            loaded.frame_bytes / 1e6, loaded.frame_bytes / max(len(frame), 1), loaded.detail_bytes / 1e6,
+        )
+        for listener in self.reload_listeners:
+            listener(loaded)
+        return loaded
+
+    def reload(self, force=False):
+        """
+        Loads the dataset if its source changed since the current snapshot (or always, with `force`).
+
+        Returns:
+            tuple: (current ListingsSnapshot, whether a new version was loaded).
+        """
+        with self._lock:
+            self._last_check = time.monotonic()
+            source_key = self._source_key()
+            if force or self._snapshot is None or self._snapshot.source_key != source_key:
+                return self._load(source_key), True
+            return self._snapshot, False
+
+    def _watch(self):
+        while True:
+            time.sleep(self.check_interval)
+            try:
+                self.reload()
+            except Exception as exc:
+                # Keep serving the previous version; the next check retries
+                self.reload_errors += 1
+                self.last_error = repr(exc)
+                logger.exception("Listings reload failed: %r", exc)
+
+    def start_watcher(self):
+        # Threads don't survive fork, so each process starts its own
+        if self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch, name="listings-watcher", daemon=True).start()
+
+    def snapshot(self):
+        current = self._snapshot
+        if self.watch:
+            self.start_watcher()
+            return current if current is not None else self.reload()[0]
+        now = time.monotonic()
+        if current is not None and now - self._last_check < self.check_interval:
+            return current
+        return self.reload()[0]
+
+    def get(self):
+        return self.snapshot().view()
+
+    def preload(self):
+        # Loads without starting the watcher, so the gunicorn master never runs one
+        return self.reload()[0]
+
+    def stats(self):
+        current = self._snapshot
+        stats = {
+            "pid": os.getpid(),
+            "path": current.source_key[0] if current else self.path,
+            "load_count": self.load_count,
+            "watching": self._watcher_pid == os.getpid(),
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
+            "process_rss_bytes": process_rss_bytes(),
+        }
+        if current is not None:
+            stats.update({
+                "version": current.version,
+                "rows": len(current.frame),
+                "load_seconds": current.load_seconds,
+                "reload_seconds": current.reload_seconds,
+                "loaded_at": current.loaded_at,
+                "frame_bytes": current.frame_bytes,
+                "frame_bytes_per_listing": current.frame_bytes / max(len(current.frame), 1),
+                "detail_bytes": current.detail_bytes,
+                "detail_columns": len(current.details.columns),
+                "semantic_index_bytes": current.semantic.nbytes() if current.semantic is not None else None,
+                "text_index_bytes": current.engine.text.nbytes(),
+                "facet_bytes": current.facets.nbytes(),
+                "ranking_bytes": current.ranking.nbytes(),
+                "filter_shards": current.shards.stats() if current.shards is not None else None,
+            })
+        return stats
@@ -0,0 +1,125 @@
+"""
+Concurrent LLM calls for /chat.
+
+Calls run as `ainvoke` coroutines on one asyncio event loop per process (a daemon thread), so a slow Groq
+response holds a socket, not a worker. Request threads submit a call and wait for it with a deadline.
+At most `max_concurrency` upstream calls run at once, and identical in-flight queries are coalesced
+(single flight): the second request for the same normalized query waits on the first one's call instead of
+making its own.
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+
+class LLMTimeout(TimeoutError):
+    pass
+
+
+class LLMClient:
+    """
+    Runs `chain_factory().ainvoke(payload)` on a background event loop.
+
+    Parameters:
+        chain_factory (callable): Returns the LangChain runnable to call (created lazily, once per process).
+        timeout (float): Deadline in seconds for one upstream call, and for a caller waiting on it.
+        max_concurrency (int): Upstream calls allowed in flight at once.
+    """
+
+    def __init__(self, chain_factory, timeout=20.0, max_concurrency=8):
+        self.chain_factory = chain_factory
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+        self._loop = None
+        self._loop_pid = None
+        self._semaphore = None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _event_loop(self):
+        # Threads don't survive fork, so each gunicorn worker starts its own loop
+        with self._lock:
+            if self._loop_pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+                self._loop = loop
+                self._loop_pid = os.getpid()
+                self._semaphore = None
+                self._in_flight = {}
+            return self._loop
+
+    async def _call(self, payload):
+        timeout = self.timeout
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            self.calls += 1
+            try:
+                return await asyncio.wait_for(self.chain_factory().ainvoke(payload), timeout)
+            except asyncio.TimeoutError as exc:
+                raise LLMTimeout(f"LLM did not answer within {timeout:.1f}s") from exc
+
+    async def _single_flight(self, key, payload):
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(payload))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.coalesced += 1
+        # A caller giving up must not cancel the call other callers are waiting on
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        self._in_flight.pop(key, None)
+        # Retrieve the exception even when every caller already gave up, so asyncio doesn't log it
+        if not task.cancelled():
+            task.exception()
+
+    def invoke(self, key, payload, timeout=None):
+        """
+        Calls the LLM (or joins an identical in-flight call) and blocks until it answers.
+
+        Parameters:
+            key (str): Coalescing key, usually the normalized query.
+            payload (dict): Prompt variables for the chain.
+            timeout (float, optional): Caller deadline. Defaults to the client's `timeout`.
+
+        Raises:
+            LLMTimeout: If no answer arrives before the deadline.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        future = asyncio.run_coroutine_threadsafe(self._single_flight(key, payload), self._event_loop())
+        try:
+            return future.result(timeout)
+        except LLMTimeout:
+            self._count("timeouts")
+            raise
+        except concurrent.futures.TimeoutError as exc:
+            future.cancel()
+            self._count("timeouts")
+            raise LLMTimeout(f"LLM did not answer within {timeout:.1f}s") from exc
+        except Exception:
+            self._count("errors")
+            raise
+
+    def _count(self, counter):
+        # invoke runs on every request thread; `calls` and `coalesced` only change on the loop thread
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "in_flight": len(self._in_flight),
+                "max_concurrency": self.max_concurrency,
+            }
@@ -0,0 +1,179 @@
+"""
+Merged, deduplicated master listings snapshot built from every cleaned scraper dump.
+
+`hotel-data-transformer.py` records each raw dump it ingests in a manifest (`clean/manifest.json`) keyed
+by the SHA-256 of the file contents, so a re-scraped file with an old name is ingested again while a
+renamed copy is skipped. Cleaned listings are upserted by `idStr` into the master snapshot
+(`clean/listings.snapshot`): a per-row content hash stored with the snapshot tells which listings are new
+or changed. Listings missing from a newer scrape are kept.
+
+Only the new and changed rows are written, as a delta layer on top of the master (`snapshot.append_layer`),
+with their description embeddings computed by the master's fitted model (semantic_index.py); an ingest
+reads the master's ids and hashes, not its columns. Once the deltas hold more than `COMPACT_RATIO` of the
+base rows, or `MAX_LAYERS` layers are stacked, the master is compacted: rewritten as one full snapshot,
+with the embedding model fitted again. The backend serves the master snapshot and picks up each write
+atomically (see snapshot.py).
+"""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import chat_config
+import semantic_index
+import snapshot
+
+MASTER_NAME = "listings.csv"
+MANIFEST_NAME = "manifest.json"
+KEY_COLUMN = 'idStr'
+SORT_COLUMN = 'reviewDetailsInterface/reviewCount'
+# Delta rows (new and replacement listings) as a fraction of the base rows that triggers a compaction
+COMPACT_RATIO = float(os.getenv("MASTER_COMPACT_RATIO", "0.2"))
+# Layers (base and deltas) a master may stack before it is compacted
+MAX_LAYERS = int(os.getenv("MASTER_MAX_LAYERS", "8"))
+
+
+def master_path_for(clean_dir):
+    # Dataset path the backend is pointed at; only its snapshot (listings.snapshot) is written
+    return os.path.join(clean_dir, MASTER_NAME)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(clean_dir):
+    try:
+        with open(os.path.join(clean_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"files": {}}
+
+
+def save_manifest(clean_dir, manifest):
+    path = os.path.join(clean_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def record_file(manifest, sha256, filename, rows, **details):
+    manifest["files"][sha256] = {"file": filename, "rows": rows, "ingested_at": time.time(), **details}
+
+
+def conform(df):
+    """
+    Types a cleaned frame over the full `chat_config.COLUMN_DTYPES` schema, so dumps with different
+    amenity columns can be merged and hashed consistently (absent columns, flags included, are missing).
+    """
+    return snapshot.apply_schema(df.reindex(columns=list(chat_config.COLUMN_DTYPES)))
+
+
+def row_hashes(typed):
+    # Integer columns are typed float64 when a batch has gaps, so hash every number as float64
+    numeric = {col: np.float64 for col, dtype in typed.dtypes.items() if dtype.kind in 'iuf'}
+    return pd.util.hash_pandas_object(typed.astype(numeric), index=False).to_numpy()
+
+
+def upsert(clean_dir, frames):
+    """
+    Upserts cleaned listings into the master snapshot, keyed by `idStr`.
+
+    Parameters:
+        clean_dir (str): Directory holding the master snapshot.
+        frames (list): Cleaned frames in ingestion order; for duplicate ids the last one wins.
+
+    Returns:
+        dict: Counts of inserted, updated and unchanged listings, the master size and how it was written
+            ("delta", "compacted" or None when nothing changed).
+    """
+    master_snapshot = snapshot.snapshot_path_for(master_path_for(clean_dir))
+    combined = pd.concat(frames, ignore_index=True)
+    # Rows without a numeric id (broken CSV lines) are dropped before typing, so ids stay int64 and exact
+    combined = combined[pd.to_numeric(combined[KEY_COLUMN], errors='coerce').notna()]
+    new = conform(combined).drop_duplicates(KEY_COLUMN, keep='last').reset_index(drop=True)
+    hashes = row_hashes(new)
+
+    exists = os.path.exists(os.path.join(master_snapshot, snapshot.SCHEMA_FILE))
+    if exists:
+        master_ids = snapshot.read_snapshot(master_snapshot, [KEY_COLUMN])[KEY_COLUMN]
+        master_hashes = snapshot.read_extra(master_snapshot, 'row_hash')
+        if master_hashes is None:
+            master_hashes = row_hashes(conform(snapshot.read_snapshot(master_snapshot)))
+    else:
+        master_ids = new[KEY_COLUMN].iloc[:0]
+        master_hashes = hashes[:0]
+
+    positions = pd.Index(master_ids).get_indexer(new[KEY_COLUMN])
+    known = positions >= 0
+    changed = ~known
+    changed[known] = master_hashes[positions[known]] != hashes[known]
+    stats = {
+        "inserted": int((~known).sum()),
+        "updated": int((changed & known).sum()),
+        "unchanged": int((~changed).sum()),
+        "rows": len(master_ids) + int((~known).sum()),
+        "write": None,
+    }
+    # A master written before the semantic index existed is compacted once to add it
+    if exists and not semantic_index.has_index(master_snapshot):
+        compact(clean_dir, new[changed], positions[changed & known], hashes[changed])
+        stats["write"] = "compacted"
+    elif not changed.any():
+        return stats
+    elif not exists or _needs_compaction(master_snapshot, int(changed.sum())):
+        compact(clean_dir, new[changed], positions[changed & known], hashes[changed])
+        stats["write"] = "compacted"
+    else:
+        delta = new[changed].reset_index(drop=True)
+        model = semantic_index.SemanticIndex.load(master_snapshot)
+        extras = {"row_hash": hashes[changed], "semantic-vectors": model.embed_texts(semantic_index.document_texts(delta))}
+        snapshot.append_layer(master_snapshot, delta, positions[changed & known], extras, semantic_index.MODEL_EXTRAS)
+        stats["write"] = "delta"
+    return stats
+
+
+def _needs_compaction(master_snapshot, delta_rows):
+    sizes = snapshot.layer_sizes(master_snapshot)
+    return len(sizes) + 1 > MAX_LAYERS or sum(sizes[1:]) + delta_rows > COMPACT_RATIO * sizes[0]
+
+
+def compact(clean_dir, new=None, replaces=(), hashes=None):
+    """
+    Rewrites the master snapshot as one full snapshot (merging its delta layers and, optionally, the listings
+    in `new`, which replace the master rows at `replaces`) and fits its description embeddings again.
+
+    Returns:
+        int: Listings in the compacted master.
+    """
+    master_snapshot = snapshot.snapshot_path_for(master_path_for(clean_dir))
+    if os.path.exists(os.path.join(master_snapshot, snapshot.SCHEMA_FILE)):
+        master = conform(snapshot.read_snapshot(master_snapshot))
+        master_hashes = snapshot.read_extra(master_snapshot, 'row_hash')
+        if master_hashes is None:
+            master_hashes = row_hashes(master)
+    else:
+        master = (new if new is not None else conform(pd.DataFrame())).iloc[:0]
+        master_hashes = np.zeros(0, dtype=np.uint64)
+    keep = np.ones(len(master), dtype=bool)
+    keep[np.asarray(replaces, dtype=np.int64)] = False
+    parts, part_hashes = [master[keep]], [master_hashes[keep]]
+    if new is not None and len(new):
+        parts.append(new)
+        part_hashes.append(hashes)
+    merged = conform(pd.concat(parts, ignore_index=True))
+    merged_hashes = np.concatenate(part_hashes)
+    # Same order as the per-file outputs: most reviewed first
+    order = merged[SORT_COLUMN].sort_values(ascending=False, kind='stable').index.to_numpy()
+    merged = merged.take(order).reset_index(drop=True)
+    extras = {"row_hash": merged_hashes[order], **semantic_index.SemanticIndex.build(merged).extras()}
+    snapshot.write_snapshot(merged, master_snapshot, extras=extras)
+    return len(merged)
@@ -0,0 +1,192 @@
+"""
+Server-side pagination, sorting and field projection for /chat results.
+
+A paged response carries `total` and a `cursor` for the current page. The cursor is stateless: it
+encodes the validated filter AST, sort order (with the query text for relevance order), page size and
+requested fields, so a follow-up page (`{"cursor": ..., "page": n}`) needs no LLM call and reuses the
+match set cached by `query_cache`.
+Row positions are only stable within one dataset version; after a reload the cursor's filter is
+simply evaluated again against the new data.
+"""
+import base64
+import binascii
+import json
+
+import numpy as np
+
+import chat_config
+import filter_engine
+from query_cache import normalize_query
+
+SORT_COLUMNS = {
+    'price': 'pricing/rate/amount',
+    'stars': 'stars',
+    'review_count': 'reviewDetailsInterface/reviewCount',
+}
+# Ranked by similarity of the listing descriptions to the query text (see semantic_index.py)
+RELEVANCE = 'relevance'
+# Nearest first to the point of the filter's `near` predicate
+DISTANCE = 'distance'
+# Best first by the blend of ratings, review volume and price fit (see ranking.py)
+RECOMMENDED = 'recommended'
+# Cheapest first for price, best first for ratings and review counts
+DEFAULT_SORT_ORDER = {
+    'price': 'asc', 'stars': 'desc', 'review_count': 'desc', RELEVANCE: 'desc', DISTANCE: 'asc', RECOMMENDED: 'desc',
+}
+FIXED_SORT_ORDER = {RELEVANCE: 'desc', DISTANCE: 'asc', RECOMMENDED: 'desc'}
+RESPONSE_FIELDS = set(chat_config.RESPONSE_COLUMNS.values())
+
+
+class PageError(ValueError):
+    pass
+
+
+class PageRequest:
+    """
+    Pagination, sort and projection options of one /chat request.
+
+    Attributes:
+        page (int): 1-based page number.
+        page_size (int | None): Listings per page, or None to return every match (unpaged).
+        sort_by (str | None): One of SORT_COLUMNS, RELEVANCE, DISTANCE or RECOMMENDED, or None to keep dataset order.
+        order (str | None): 'asc' or 'desc'.
+        fields (list | None): Response field names to include, or None for all of them.
+        text (str | None): Query text the listings are ranked against when sorting by RELEVANCE.
+    """
+
+    def __init__(self, page=1, page_size=None, sort_by=None, order=None, fields=None, text=None):
+        self.page = page
+        self.page_size = page_size
+        self.sort_by = sort_by
+        self.order = order
+        self.fields = fields
+        self.text = text
+
+    @property
+    def paged(self):
+        return self.page_size is not None
+
+    @property
+    def sort_key(self):
+        if self.sort_by == RELEVANCE:
+            return f"{RELEVANCE}:{normalize_query(self.text or '')}"
+        return f"{self.sort_by}:{self.order}" if self.sort_by else None
+
+    def page_rows(self, rows):
+        if not self.paged:
+            return rows
+        start = (self.page - 1) * self.page_size
+        return rows[start:start + self.page_size]
+
+    def needed_rows(self):
+        # Matches that must be in order to serve this page (None: all of them)
+        return self.page * self.page_size if self.paged else None
+
+    def has_next(self, total):
+        return self.paged and self.page * self.page_size < total
+
+
+def _positive_int(value, name):
+    if isinstance(value, bool) or not isinstance(value, int):
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise PageError(f"'{name}' must be a positive integer") from None
+    if value < 1:
+        raise PageError(f"'{name}' must be a positive integer")
+    return value
+
+
+def parse_page_request(request_json, default_page_size, max_page_size):
+    """
+    Reads `page`, `page_size`, `sort_by`, `order` and `fields` from a /chat request body.
+
+    Paging only applies when `page` or `page_size` is given; `sort_by` and `fields` also work unpaged.
+
+    Raises:
+        PageError: If any option is malformed.
+    """
+    page_size = None
+    if 'page' in request_json or 'page_size' in request_json:
+        page_size = _positive_int(request_json.get('page_size', default_page_size), 'page_size')
+        page_size = min(page_size, max_page_size)
+    page = _positive_int(request_json.get('page', 1), 'page')
+
+    sort_by = request_json.get('sort_by')
+    order = None
+    if sort_by is not None:
+        if sort_by not in DEFAULT_SORT_ORDER:
+            raise PageError(f"'sort_by' must be one of: {', '.join(DEFAULT_SORT_ORDER)}")
+        order = request_json.get('order', DEFAULT_SORT_ORDER[sort_by])
+        if order not in ('asc', 'desc') or FIXED_SORT_ORDER.get(sort_by, order) != order:
+            raise PageError("'order' must be 'asc' or 'desc' ('desc' for relevance and recommended, 'asc' for distance)")
+
+    fields = request_json.get('fields')
+    if fields is not None:
+        if not isinstance(fields, list) or not fields or not all(isinstance(field, str) for field in fields):
+            raise PageError("'fields' must be a non-empty list of field names")
+        unknown = [field for field in fields if field not in RESPONSE_FIELDS]
+        if unknown:
+            raise PageError(f"Unknown fields: {', '.join(unknown)}")
+        fields = list(dict.fromkeys(fields))
+    return PageRequest(page, page_size, sort_by, order, fields)
+
+
+def encode_cursor(filter_ast, page_request, page=None):
+    state = {
+        "f": filter_ast,
+        "p": page or page_request.page,
+        "n": page_request.page_size,
+        "s": page_request.sort_by,
+        "o": page_request.order,
+        "c": page_request.fields,
+    }
+    if page_request.sort_by == RELEVANCE:
+        state["t"] = page_request.text
+    raw = json.dumps(state, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor, columns, page=None, max_page_size=None):
+    """
+    Decodes a cursor from `encode_cursor` back into (filter AST, PageRequest).
+
+    The filter is validated again, so a tampered cursor can't reference unknown columns, and its page size
+    is capped at `max_page_size`. An explicit `page` overrides the one stored in the cursor, which lets
+    clients jump to any page.
+
+    Raises:
+        PageError: If the cursor is malformed.
+        filter_engine.FilterError: If the embedded filter is invalid.
+    """
+    if not isinstance(cursor, str):
+        raise PageError("'cursor' must be a string")
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        state = json.loads(raw.decode("utf-8"))
+        filter_ast = state["f"]
+        options = {"page": state["p"], "page_size": state["n"]}
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError) as exc:
+        raise PageError("Malformed cursor") from exc
+    if state.get("s") is not None:
+        options.update(sort_by=state["s"], order=state.get("o"))
+    if state.get("c") is not None:
+        options["fields"] = state["c"]
+    if page is not None:
+        options["page"] = page
+    page_request = parse_page_request(options, state["n"], max_page_size or state["n"])
+    if page_request.sort_by == RELEVANCE:
+        if not isinstance(state.get("t"), str):
+            raise PageError("Malformed cursor")
+        page_request.text = state["t"]
+    return filter_engine.validate(filter_ast, columns), page_request
+
+
+def sort_rows(engine, rows, sort_by, order):
+    """
+    Orders matched row positions by a SORT_COLUMNS key. Ties keep dataset order and missing values go last.
+    """
+    values = engine.array(SORT_COLUMNS[sort_by])[rows].astype(np.float64)
+    if order == 'desc':
+        values = -values
+    return rows[np.argsort(values, kind='stable')]
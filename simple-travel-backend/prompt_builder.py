@@ -0,0 +1,147 @@
+"""
+Schema section (`$context`) of `chat_config.HOTEL_QUERY_PROMPT`, generated from the loaded listings.
+
+Each filterable column is described from the data itself: true/false flags, numeric ranges, and the
+distinct (or most common) values of the text columns in `chat_config.PROMPT_TEXT_COLUMNS`. Per query, only
+the core columns and the columns whose keywords appear in the query (EASY_NAME_MAP labels, the rule
+parser's synonyms, `chat_config.PROMPT_KEYWORDS` and the values of the text columns) are described in full;
+the remaining ones are listed by name, so the prompt stays small without hiding any column from the model.
+"""
+import re
+
+import numpy as np
+
+import chat_config
+import query_parser
+from filter_engine import resolve_column
+from query_cache import normalize_query
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+# Label words that say nothing about which column a query means
+GENERIC_WORDS = {'allows', 'amenity', 'and', 'available', 'count', 'during', 'or', 'rule', 'the', 'total', 'you'}
+# Coordinates are queried through the `location` predicates (GEO_LINE), not compared directly
+NOT_DESCRIBED = {'idStr', chat_config.LATITUDE_COLUMN, chat_config.LONGITUDE_COLUMN}
+GEO_LINE = ('location: for distances use {"column": "location", "op": "near", "value": {"place": <landmark or area>, '
+            '"radius_km": <km>}}, or "bbox" with {"south", "west", "north", "east"}')
+TEXT_VALUES_LISTED = 12
+TEXT_VALUES_SAMPLED = 5
+
+
+def estimate_tokens(text):
+    # About one token per word or punctuation mark, which is close to what Llama's tokenizer counts here
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def _stem(word):
+    return word[:-1] if len(word) > 3 and word.endswith('s') else word
+
+
+def _words(text):
+    return [_stem(word) for word in WORD_PATTERN.findall(text.lower())]
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else f"{value:.2f}".rstrip('0')
+
+
+def describe_column(column, values):
+    """
+    Returns the schema line of one column, e.g. `bed_count: number, 1 to 16`.
+
+    Parameters:
+        column (str): Column name.
+        values (pd.Series): The column's values.
+    """
+    if column.startswith(chat_config.FLAG_COLUMN_PREFIXES):
+        return f"{column}: true/false"
+    if values.dtype.kind in 'iuf':
+        present = values.to_numpy(dtype=float)
+        present = present[~np.isnan(present)]
+        if not len(present):
+            return f"{column}: number"
+        return f"{column}: number, {_number(present.min())} to {_number(present.max())}"
+    counts = values[values.astype(str).str.strip() != ""].value_counts()
+    # Categorical columns count every category, including ones no listing uses
+    counts = counts[counts > 0]
+    if len(counts) <= TEXT_VALUES_LISTED:
+        return f"{column}: one of " + ", ".join(repr(str(value)) for value in counts.index)
+    sample = ", ".join(repr(str(value)) for value in counts.index[:TEXT_VALUES_SAMPLED])
+    return f"{column}: text, {len(counts)} values, e.g. {sample}"
+
+
+class PromptSchema:
+    """
+    Column descriptions and relevance keywords for one loaded listings frame.
+
+    Parameters:
+        frame (pd.DataFrame): Listings frame.
+    """
+
+    def __init__(self, frame):
+        columns = [
+            col for col in frame.columns
+            if col in chat_config.PROMPT_TEXT_COLUMNS or (frame[col].dtype.kind in 'iuf' and col not in NOT_DESCRIBED)
+        ]
+        # The master snapshot has every schema column, so check that some listing is actually located
+        self.geo = (
+            chat_config.LATITUDE_COLUMN in frame.columns and chat_config.LONGITUDE_COLUMN in frame.columns
+            and bool(frame[chat_config.LATITUDE_COLUMN].notna().any())
+        )
+        self.lines = {col: describe_column(col, frame[col]) for col in columns}
+        self.core = {resolve_column(col, columns) for col in chat_config.PROMPT_CORE_COLUMNS} - {None}
+        self.keywords = {}
+        for col, words in self._column_words(frame, columns).items():
+            for word in words - GENERIC_WORDS:
+                if len(word) < 2:
+                    continue
+                self.keywords.setdefault(word, set()).add(col)
+
+    @staticmethod
+    def _column_words(frame, columns):
+        phrases = {col: [] for col in columns}
+
+        def add(col, texts):
+            col = resolve_column(col, columns)
+            if col is not None:
+                phrases[col].extend(texts)
+
+        for col, label in chat_config.EASY_NAME_MAP.items():
+            add(col, [label])
+        for col in columns:
+            if col.startswith('amenity_'):
+                add(col, [col[len('amenity_'):]])
+        for synonyms in (query_parser.AMENITY_SYNONYMS, query_parser.GUEST_CONTROL_PHRASES, chat_config.PROMPT_KEYWORDS):
+            for col, texts in synonyms.items():
+                add(col, texts)
+        for col in chat_config.PROMPT_TEXT_COLUMNS:
+            if col in columns:
+                add(col, frame[col].dropna().astype(str).unique().tolist())
+        return {col: set(word for text in texts for word in _words(text)) for col, texts in phrases.items()}
+
+    def relevant_columns(self, query):
+        """
+        Returns the columns worth describing in full for `query`: the core columns plus keyword matches.
+        """
+        matched = set(self.core)
+        for word in _words(normalize_query(query)):
+            matched |= self.keywords.get(word, set())
+        return [col for col in self.lines if col in matched]
+
+    def context(self, query=None):
+        """
+        Builds the `$context` text for `query`; every column is described in full when `query` is None.
+        """
+        geo = [GEO_LINE] if self.geo else []
+        if query is None:
+            return "\n".join([*self.lines.values(), *geo])
+        relevant = self.relevant_columns(query)
+        lines = [self.lines[col] for col in relevant] + geo
+        others = [col for col in self.lines if col not in relevant]
+        flags = [col for col in others if col.startswith(chat_config.FLAG_COLUMN_PREFIXES)]
+        rest = [col for col in others if col not in flags]
+        if flags:
+            lines.append("Other true/false columns: " + ", ".join(flags))
+        if rest:
+            lines.append("Other columns: " + ", ".join(rest))
+        return "\n".join(lines)
@@ -0,0 +1,102 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_query(text):
+    # Case, unicode width, surrounding punctuation and repeated whitespace don't change the filter
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" .,!?;:")
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire `ttl` seconds after they were stored.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class QueryCache:
+    """
+    Three-level cache for /chat.
+
+    Level 1 (`filters`) maps the normalized user text to the generated filter AST, so repeated
+    questions skip the LLM. Level 2 (`results`) maps (dataset version, canonical filter key) to
+    the matching row ids (and, per sort order, the sorted ids), so repeated filters and follow-up
+    pages skip evaluation. Level 3 (`responses`) maps (dataset version, response key) to the
+    encoded and compressed body (rendered_responses.RenderedResponse), so a repeated page skips
+    encoding too. Levels 2 and 3 are cleared whenever the listings store loads a new dataset version.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600.0, responses_maxsize=None):
+        self.filters = TTLCache(maxsize, ttl)
+        self.results = TTLCache(maxsize, ttl)
+        self.responses = TTLCache(maxsize if responses_maxsize is None else responses_maxsize, ttl)
+
+    def get_filter(self, query):
+        return self.filters.get(normalize_query(query))
+
+    def put_filter(self, query, filter_ast):
+        self.filters.put(normalize_query(query), filter_ast)
+
+    def discard_filter(self, query):
+        self.filters.discard(normalize_query(query))
+
+    def get_rows(self, version, filter_key, sort_key=None):
+        return self.results.get((version, filter_key, sort_key))
+
+    def put_rows(self, version, filter_key, rows, sort_key=None):
+        self.results.put((version, filter_key, sort_key), rows)
+
+    def get_response(self, version, key):
+        return self.responses.get((version, key))
+
+    def put_response(self, version, key, rendered):
+        self.responses.put((version, key), rendered)
+
+    def on_dataset_reload(self, snapshot):
+        self.results.clear()
+        self.responses.clear()
+
+    def stats(self):
+        return {"filters": self.filters.stats(), "results": self.results.stats(), "responses": self.responses.stats()}
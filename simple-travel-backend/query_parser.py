@@ -0,0 +1,200 @@
+"""
+Rule-based fast path from natural language to a listings filter.
+
+Handles the simple combinations described in `chat_config.HOTEL_QUERY_PROMPT`: bed / bedroom /
+bathroom / guest counts, price bounds, amenity flags named after `chat_config.EASY_NAME_MAP`, guest
+controls, room categories and distances to `chat_config.LANDMARKS` ("within 2 km of Siam"). `parse_query` returns None unless every word of the query is
+understood, so anything ambiguous still goes to the LLM.
+"""
+import re
+from functools import lru_cache
+
+import chat_config
+from filter_engine import resolve_column
+from query_cache import normalize_query
+
+NUMBER = r"(\d+(?:\.\d+)?)"
+PRICE_NUMBER = r"(?:\$|฿|thb\s*)?" + NUMBER + r"(?:\s*(?:baht|thb|usd|dollars?))?(?:\s*(?:per|a|/)\s*night)?"
+
+COMPARATORS = {
+    '>=': ["at least", "minimum of", "minimum", "min", "no less than", ">="],
+    '>': ["more than", "greater than", "over", "above", ">"],
+    '<=': ["at most", "maximum of", "maximum", "max", "no more than", "up to", "budget of", "budget", "<="],
+    '<': ["less than", "cheaper than", "under", "below", "<"],
+}
+COMPARATOR_PATTERN = "|".join(
+    re.escape(phrase) for phrase in sorted(sum(COMPARATORS.values(), []), key=len, reverse=True)
+)
+COMPARATOR_OPS = {phrase: op for op, phrases in COMPARATORS.items() for phrase in phrases}
+
+COUNT_UNITS = {
+    'bedroom_count': r"bed\s?rooms?|bdrms?|br",
+    'bathroom_count': r"bath\s?rooms?|baths?|ba",
+    'bed_count': r"beds?",
+    'guestControls/personCapacity': r"guests?|people|persons?|pax|adults?",
+}
+PRICE_COLUMN = 'pricing/rate/amount'
+
+AMENITY_SYNONYMS = {
+    'amenity_Wifi': ["wi-fi", "wi fi", "internet"],
+    'amenity_Air conditioning': ["ac", "a/c", "aircon", "air con", "air conditioner", "air-conditioning"],
+    'amenity_Pool': ["swimming pool", "swimming"],
+    'amenity_Patio or balcony': ["balcony", "balconies", "patio"],
+    'amenity_BBQ grill': ["bbq", "barbecue", "grill"],
+    'amenity_Washer': ["washing machine", "laundry"],
+    'amenity_Refrigerator': ["fridge"],
+    'amenity_Gym': ["fitness", "fitness center"],
+    'amenity_Hot_water': ["hot water"],
+    'amenity_Cable TV': ["cable"],
+    'amenity_Coffee maker': ["coffee machine", "coffee"],
+    'amenity_Dishes and silverware': ["dishes", "cutlery"],
+}
+GUEST_CONTROL_PHRASES = {
+    'guestControls/allowsPets': ["pets", "pet", "dogs", "dog", "cats", "cat"],
+    'guestControls/allowsChildren': ["children", "child", "kids", "kid", "family"],
+    'guestControls/allowsInfants': ["infants", "infant", "babies", "baby", "toddlers", "toddler"],
+    'guestControls/allowsSmoking': ["smoking", "smokers", "smoker", "smoke"],
+    'guestControls/allowsEvents': ["events", "event", "parties", "party"],
+}
+ROOM_CATEGORY_PHRASES = {
+    'entire_home': ["entire home", "entire place", "entire apartment", "entire house", "whole place", "whole home",
+                    "whole apartment", "whole house"],
+    'private_room': ["private room", "private rooms"],
+    'hotel_room': ["hotel room", "hotel rooms"],
+    'shared_room': ["shared room", "shared rooms", "dorm", "hostel"],
+}
+NEGATIONS = r"(?:no|non|without|not allowing|doesn't allow|free of)"
+LANDMARK_NAMES = {name.casefold(): name for name in chat_config.LANDMARKS}
+LANDMARK_PATTERN = "|".join(re.escape(name) for name in sorted(LANDMARK_NAMES, key=len, reverse=True))
+DISTANCE_UNIT = r"(?:km|kms|kilometers?|kilometres?)"
+
+# Words that carry no filter meaning once the recognised phrases are removed. Place names are not filler: the
+# master snapshot merges every scraped city, so "pool in bangkok" has to reach the LLM with its city intact
+FILLER_WORDS = set("""
+a an the i i'm im we want wanna need needs needed looking look find show me us give get some any
+place places stay stays rental rentals listing listings apartment apartments condo condos flat flats
+house houses unit units room rooms home homes hotel hotels accommodation with has have having that which and also
+plus should must be is are it its it's please pls in for price priced prices cost costs costing
+per night nightly of to can allowed allow allows friendly welcome welcomed ok okay accepted include
+includes including available there where my our would like something one amenities amenity total
+""".split())
+
+
+@lru_cache(maxsize=8)
+def _phrase_matcher(columns):
+    phrases = {}
+    for col, label in chat_config.EASY_NAME_MAP.items():
+        if col.startswith('amenity_'):
+            for phrase in (label, col[len('amenity_'):].replace('_', ' ')):
+                phrase = phrase.lower()
+                phrases.setdefault(phrase, col)
+                phrases.setdefault(phrase + 's', col)
+    for col, synonyms in AMENITY_SYNONYMS.items():
+        for phrase in synonyms:
+            phrases.setdefault(phrase, col)
+    for col, synonyms in GUEST_CONTROL_PHRASES.items():
+        for phrase in synonyms:
+            phrases.setdefault(phrase, col)
+    # `lose_mostly_empty` renames duplicated columns, so map each phrase to the spelling present in the data
+    resolved = {}
+    for phrase, col in phrases.items():
+        candidate = resolve_column(col, columns)
+        if candidate is not None:
+            resolved[phrase] = candidate
+    # Longest phrases first, so "smoke alarm" wins over "smoke" and "hot water kettle" over "hot water"
+    alternatives = "|".join(re.escape(phrase) for phrase in sorted(resolved, key=len, reverse=True))
+    pattern = re.compile(rf"(?:\b({NEGATIONS})[\s-]+)?(?<!\w)({alternatives})(?![\w-])")
+    return pattern, resolved
+
+
+def _number(text):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def _near(landmark, radius_km):
+    return [('location', 'near', {"place": LANDMARK_NAMES[landmark], "radius_km": radius_km})]
+
+
+def _consume(text, pattern, handler):
+    conditions = []
+
+    def replace(match):
+        conditions.extend(handler(match))
+        return " "
+
+    return re.sub(pattern, replace, text), conditions
+
+
+def parse_query(query, columns):
+    """
+    Converts a simple natural-language listings query into filter conditions.
+
+    Parameters:
+        query (str): The user's query.
+        columns (iterable): Columns available in the listings frame.
+
+    Returns:
+        list | None: (column, operator, value) tuples, or None when any part of the query is not understood.
+    """
+    columns = frozenset(columns)
+    text = normalize_query(query)
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", text)
+    text = re.sub(r"(\d+(?:\.\d+)?)k\b", lambda m: str(_number(m.group(1)) * 1000), text)
+    conditions = []
+
+    if chat_config.LATITUDE_COLUMN in columns and chat_config.LONGITUDE_COLUMN in columns:
+        distance_steps = [
+            (rf"\b(?:(?:within|in) )?{NUMBER}\s*{DISTANCE_UNIT} (?:of|from|around|near) (?:the )?({LANDMARK_PATTERN})\b",
+             lambda m: _near(m.group(2), _number(m.group(1)))),
+            (rf"\b(?:near|close to|next to|around|by) (?:the )?({LANDMARK_PATTERN})\b",
+             lambda m: _near(m.group(1), chat_config.NEAR_RADIUS_KM)),
+        ]
+        for pattern, handler in distance_steps:
+            text, found = _consume(text, pattern, handler)
+            conditions.extend(found)
+
+    for col, unit in COUNT_UNITS.items():
+        unit = rf"(?:{unit})\b"
+        steps = [
+            (rf"\bbetween {NUMBER} and {NUMBER} {unit}", lambda m, c=col: [(c, '>=', _number(m.group(1))), (c, '<=', _number(m.group(2)))]),
+            (rf"\b{NUMBER}\s*(?:-|to)\s*{NUMBER} {unit}", lambda m, c=col: [(c, '>=', _number(m.group(1))), (c, '<=', _number(m.group(2)))]),
+            (rf"(?:^|\s)({COMPARATOR_PATTERN}) {NUMBER}\s*{unit}", lambda m, c=col: [(c, COMPARATOR_OPS[m.group(1)], _number(m.group(2)))]),
+            (rf"\b{NUMBER}\s*{unit}\s*(?:or (?:more|less|fewer)|at (?:least|most)|max(?:imum)?|min(?:imum)?)",
+             lambda m, c=col: [(c, '<=' if re.search(r"less|fewer|most|max", m.group(0)) else '>=', _number(m.group(1)))]),
+            (rf"\b{NUMBER}\s*\+?\s*{unit}", lambda m, c=col: [(c, '>=', _number(m.group(1)))]),
+        ]
+        for pattern, handler in steps:
+            text, found = _consume(text, pattern, handler)
+            conditions.extend(found)
+
+    price_steps = [
+        (rf"\bbetween {PRICE_NUMBER} and {PRICE_NUMBER}", lambda m: [(PRICE_COLUMN, '>=', _number(m.group(1))), (PRICE_COLUMN, '<=', _number(m.group(2)))]),
+        (rf"(?:^|\s)({COMPARATOR_PATTERN}) {PRICE_NUMBER}", lambda m: [(PRICE_COLUMN, COMPARATOR_OPS[m.group(1)], _number(m.group(2)))]),
+        (rf"{PRICE_NUMBER}\s*(?:max(?:imum)?|or less|at most|tops)\b", lambda m: [(PRICE_COLUMN, '<=', _number(m.group(1)))]),
+    ]
+    for pattern, handler in price_steps:
+        text, found = _consume(text, pattern, handler)
+        conditions.extend(found)
+
+    if 'roomTypeCategory' in columns:
+        for category, phrases in ROOM_CATEGORY_PHRASES.items():
+            pattern = r"\b(?:" + "|".join(re.escape(p) for p in phrases) + r")\b"
+            text, found = _consume(text, pattern, lambda m, v=category: [('roomTypeCategory', '==', v)])
+            conditions.extend(found)
+
+    pattern, phrase_columns = _phrase_matcher(columns)
+    text, found = _consume(text, pattern, lambda m: [(phrase_columns[m.group(2)], '==', m.group(1) is None)])
+    conditions.extend(found)
+
+    leftover = [word for word in re.findall(r"[^\s,.!?;:()&]+", text) if word not in FILLER_WORDS]
+    if leftover or not conditions:
+        return None
+    return conditions
+
+
+def build_filter(conditions):
+    """
+    Builds the filter AST (see filter_engine.py) for parsed conditions.
+    """
+    return {"and": [{"column": col, "op": op, "value": value} for col, op, value in conditions]}
@@ -0,0 +1,143 @@
+"""
+"Recommended" order for /chat results: a blend of guest ratings, review sub-scores, review volume and price.
+
+`RankingIndex` is built once per loaded dataset. The static part of each listing's score is precomputed:
+`stars` and the mean of the review sub-scores (`Cleanliness`, `Value`, `Location`, ...) as Bayesian averages,
+pulled towards the dataset mean until a listing has `PRIOR_REVIEWS` reviews, and the log of the review count.
+Only the price fit depends on the query: cheaper listings score higher, relative to the 5th-95th percentile
+prices of the match set. A page only needs its rows in order, so `rank` selects the best `limit` matches with
+`np.partition` and sorts just those; the rest follow unordered.
+"""
+import os
+
+import numpy as np
+
+STARS_COLUMN = 'stars'
+REVIEW_COUNT_COLUMN = 'reviewDetailsInterface/reviewCount'
+PRICE_COLUMN = 'pricing/rate/amount'
+SUBSCORE_COLUMNS = ['Accuracy', 'Communication', 'Cleanliness', 'Location', 'Check-in', 'Value']
+COMPONENTS = ('stars', 'reviews', 'popularity', 'price')
+# Comma-separated component=weight pairs; components left out weigh 0
+RANKING_WEIGHTS = os.getenv("RANKING_WEIGHTS", "stars=0.35,reviews=0.35,popularity=0.1,price=0.2")
+# Reviews a listing needs before its own ratings count as much as the dataset mean
+PRIOR_REVIEWS = float(os.getenv("RANKING_PRIOR_REVIEWS", "10"))
+# Smallest top-k selected per match set; larger pages round up to a power of two so the selection is cached
+MIN_TOP_K = 64
+
+
+def parse_weights(spec):
+    """
+    Parses "stars=0.4,price=0.2" into {component: weight}.
+
+    Raises:
+        ValueError: On an unknown component or a malformed weight.
+    """
+    weights = dict.fromkeys(COMPONENTS, 0.0)
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in weights:
+            raise ValueError(f"Unknown ranking component {name!r}, expected one of: {', '.join(COMPONENTS)}")
+        weights[name] = float(value)
+    return weights
+
+
+def top_k(needed):
+    """
+    Rows that must be in order to serve the first `needed` results (None: all of them).
+    """
+    if needed is None:
+        return None
+    return max(MIN_TOP_K, 1 << (int(needed) - 1).bit_length())
+
+
+def _column(frame, column):
+    if column not in frame.columns:
+        return np.full(len(frame), np.nan)
+    return frame[column].to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def bayesian_average(ratings, counts, prior_count=PRIOR_REVIEWS):
+    """
+    (prior_count * dataset mean + count * rating) / (prior_count + count); missing ratings get the dataset mean.
+    """
+    known = ~np.isnan(ratings)
+    mean = float(ratings[known].mean()) if known.any() else 0.0
+    counts = np.where(known, counts, 0.0)
+    return (prior_count * mean + counts * np.where(known, ratings, 0.0)) / np.maximum(prior_count + counts, 1e-9)
+
+
+class RankingIndex:
+    """
+    Precomputed static ranking scores of one listings frame.
+
+    Parameters:
+        frame (pd.DataFrame): Listings frame.
+        weights (dict | None): {component: weight}, defaults to `RANKING_WEIGHTS`.
+    """
+
+    def __init__(self, frame, weights=None):
+        self.size = len(frame)
+        self.weights = weights if weights is not None else parse_weights(RANKING_WEIGHTS)
+        counts = np.nan_to_num(_column(frame, REVIEW_COUNT_COLUMN)).clip(0)
+        subscores = np.column_stack([_column(frame, column) for column in SUBSCORE_COLUMNS])
+        # Listings without any sub-score stay NaN and get the dataset mean
+        known = (~np.isnan(subscores)).sum(axis=1)
+        subscores = np.where(known > 0, np.nansum(subscores, axis=1) / np.maximum(known, 1), np.nan)
+        # Every component is scaled to 0-1
+        components = {
+            'stars': bayesian_average(_column(frame, STARS_COLUMN), counts) / 5,
+            'reviews': bayesian_average(subscores, counts) / 5,
+            'popularity': np.log1p(counts) / max(np.log1p(counts.max()) if len(counts) else 0.0, 1.0),
+        }
+        static = np.zeros(self.size)
+        for name, values in components.items():
+            static += self.weights[name] * values
+        self.static = static.astype(np.float32)
+        self.prices = _column(frame, PRICE_COLUMN).astype(np.float32)
+
+    def scores(self, rows):
+        """
+        Blended scores of the listings at `rows`, with the price fit relative to these rows.
+        """
+        scores = self.static[rows]
+        weight = self.weights['price']
+        if not weight or not len(rows):
+            return scores
+        prices = self.prices[rows]
+        known = prices[~np.isnan(prices)]
+        if not len(known):
+            return scores
+        low, high = np.percentile(known, [5, 95])
+        # Cheapest 5% fit 1, priciest 5% and missing prices 0
+        fit = np.clip((high - prices) / max(float(high - low), 1e-9), 0, 1)
+        return scores + np.float32(weight) * np.nan_to_num(fit).astype(np.float32)
+
+    def rank(self, rows, limit=None):
+        """
+        Orders matched rows best first. Ties keep dataset order.
+
+        Parameters:
+            rows (np.ndarray): Ascending row positions, e.g. the rows matched by a filter.
+            limit (int | None): Only the best `limit` rows are put in order (see `top_k`); None orders all.
+
+        Returns:
+            np.ndarray: The same rows; the first `limit` ranked, the others after them in no particular order.
+        """
+        if not len(rows):
+            return rows
+        scores = self.scores(rows)
+        if limit is None or limit >= len(rows):
+            return rows[np.argsort(-scores, kind='stable')]
+        # Select the best `limit` in linear time (ties at the cut go to the earliest rows), then sort only those
+        kth = -np.partition(-scores, limit - 1)[limit - 1]
+        chosen = scores > kth
+        chosen[np.flatnonzero(scores == kth)[:limit - int(chosen.sum())]] = True
+        best = np.flatnonzero(chosen)
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return np.concatenate([rows[best], rows[~chosen]])
+
+    def nbytes(self):
+        return self.static.nbytes + self.prices.nbytes
@@ -0,0 +1,99 @@
+"""
+Rendered /chat response bodies with their compressed variants and ETags.
+
+A /chat body only depends on the dataset, the filter AST and the page options, so once encoded it is kept in
+the query cache's `responses` level (see query_cache.py) and served again without matching or encoding. The
+gzip / brotli variants are compressed the first time a client asks for them, or up front for the firstcall
+pages rendered when a dataset loads.
+
+ETags are strong: a hash of the rendered body itself, with the content encoding appended for compressed
+variants. Workers that render the same bytes agree on them without sharing state, and any change to the body
+(a new dataset, ranking weights, field projection or encoder) changes the ETag.
+"""
+import gzip
+import hashlib
+import threading
+
+import pagination
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=5)
+
+
+def response_key(filter_key, page_request, facets=False):
+    """
+    The options a /chat body depends on, besides the dataset: filter, order, page, fields and facets.
+
+    The raw query text is part of the key for relevance order, since the page cursor carries it.
+    """
+    text = page_request.text if page_request.sort_by == pagination.RELEVANCE else None
+    return (filter_key, page_request.sort_key, page_request.page, page_request.page_size,
+            tuple(page_request.fields) if page_request.fields else None, text, facets)
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Weak comparison of an `If-None-Match` header against `etag`, as RFC 9110 specifies for it.
+
+    Proxies that compress or transform the body mark ETags weak (`W/"..."`); those still match.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+class RenderedResponse:
+    """
+    One encoded /chat body and its compressed variants.
+
+    Attributes:
+        body (bytes): The uncompressed JSON body.
+        tag (str): Hash of the body; the ETag of each variant is derived from it.
+        total (int): Listings matched by the filter, for metrics and logs.
+    """
+
+    def __init__(self, body, total):
+        self.body = body
+        self.tag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.total = total
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def etag(self, encoding=None):
+        return f'"{self.tag}-{encoding}"' if encoding else f'"{self.tag}"'
+
+    def encoded(self, encoding=None):
+        """
+        Returns the body in `encoding` ("br", "gzip" or None), compressing it once per encoding.
+        """
+        if encoding is None:
+            return self.body
+        body = self._encoded.get(encoding)
+        if body is None:
+            with self._lock:
+                body = self._encoded.get(encoding)
+                if body is None:
+                    body = self._encoded[encoding] = compress(self.body, encoding)
+        return body
+
+    def precompress(self, min_bytes=0):
+        # Every encoding a client may ask for, e.g. for the firstcall pages rendered at load time
+        if len(self.body) >= min_bytes:
+            for encoding in ENCODINGS:
+                self.encoded(encoding)
+
+    def nbytes(self):
+        return len(self.body) + sum(len(body) for body in self._encoded.values())
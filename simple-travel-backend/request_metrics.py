@@ -0,0 +1,269 @@
+"""
+Per-request stage timings, Prometheus metrics and opt-in profiling for the Flask app.
+
+`stage(name)` times a block of the current request (loading the listings, the rule parser, the LLM call,
+filtering, ranking, encoding, compression). When the request finishes, `finish_request` reports the stages
+in a `Server-Timing` header, logs one JSON line for the request and records them in the process-wide metrics
+that `GET /metrics` renders in the Prometheus text format.
+
+Metrics are kept per worker process, like `GET /stats`: every sample carries a `pid` label, so series
+from different gunicorn workers never overwrite each other. A request that sends `X-Profile: cprofile` (or
+`pyinstrument`, if installed) together with a valid `X-Admin-Token` is profiled, and the profile is written to
+`PROFILE_DIR` and named in the `X-Profile-File` response header.
+"""
+import cProfile
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+PROFILE_DIR = os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "simple-travel-profiles")
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+PROFILERS = ("cprofile", "pyinstrument")
+# Server-Timing metric names are HTTP tokens
+TOKEN = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """
+    Monotonic counter with labels.
+    """
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self, const_labels):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_label_text(const_labels + key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with labels, as Prometheus expects it.
+    """
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self, const_labels):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, dict(values, counts=list(values["counts"]))) for key, values in self._series.items())
+        for key, values in series:
+            labels = const_labels + key
+            for bound, count in zip(self.buckets, values["counts"]):
+                lines.append(f"{self.name}_bucket{_label_text(labels + (('le', _number(bound)),))} {count}")
+            lines.append(f"{self.name}_bucket{_label_text(labels + (('le', '+Inf'),))} {values['count']}")
+            lines.append(f"{self.name}_sum{_label_text(labels)} {_number(values['sum'])}")
+            lines.append(f"{self.name}_count{_label_text(labels)} {values['count']}")
+        return lines
+
+
+class Registry:
+    """
+    The metrics of this process, plus collectors called at scrape time for values other modules keep.
+
+    A collector returns (name, type, help, [(labels dict, value), ...]) tuples.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help_text):
+        self.metrics.append(Counter(name, help_text))
+        return self.metrics[-1]
+
+    def histogram(self, name, help_text, buckets=SECONDS_BUCKETS):
+        self.metrics.append(Histogram(name, help_text, buckets))
+        return self.metrics[-1]
+
+    def render(self):
+        const_labels = (("pid", os.getpid()),)
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(const_labels))
+        for collector in self.collectors:
+            for name, kind, help_text, samples in collector():
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f"{name}{_label_text(const_labels + tuple(sorted(labels.items())))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+REQUESTS = registry.counter("http_requests_total", "HTTP requests by endpoint and status code.")
+REQUEST_SECONDS = registry.histogram("http_request_duration_seconds", "Request latency by endpoint.")
+STAGE_SECONDS = registry.histogram("chat_stage_duration_seconds", "Time spent in each stage of a request.")
+QUERY_PATHS = registry.counter("chat_queries_total", "/chat queries by the path that produced the filter.")
+RESULT_ROWS = registry.histogram("chat_result_listings", "Listings matched per /chat query.", ROW_BUCKETS)
+LLM_TOKENS = registry.counter("llm_tokens_total", "Tokens of LLM calls, by kind (prompt or completion).")
+
+
+@contextmanager
+def stage(name):
+    """
+    Times the enclosed block as stage `name` of the current request (added up if the stage repeats).
+    """
+    if not has_request_context() or "stage_seconds" not in g:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        g.stage_seconds[name] = g.stage_seconds.get(name, 0.0) + time.perf_counter() - started
+
+
+def start_request(profiler=None):
+    """
+    Starts timing the current request, and profiling it with `profiler` ("cprofile" or "pyinstrument") if given.
+
+    Returns:
+        str | None: Why the profiler could not start, if it was asked for and didn't.
+    """
+    g.request_started = time.perf_counter()
+    g.stage_seconds = {}
+    if profiler is None:
+        return None
+    if profiler not in PROFILERS or (profiler == "pyinstrument" and pyinstrument is None):
+        return f"unavailable profiler {profiler!r}"
+    try:
+        if profiler == "pyinstrument":
+            g.profiler = pyinstrument.Profiler()
+            g.profiler.start()
+        else:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+    except (RuntimeError, ValueError) as exc:
+        # Only one profiler can be active at a time; a concurrent profiled request gets an error header
+        g.pop("profiler", None)
+        return str(exc)
+    return None
+
+
+def _write_profile(profiler, endpoint):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint or 'request'}-{os.getpid()}-{threading.get_ident()}"
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        path = os.path.join(PROFILE_DIR, name + ".prof")
+        profiler.dump_stats(path)
+    else:
+        profiler.stop()
+        path = os.path.join(PROFILE_DIR, name + ".html")
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+    return path
+
+
+def server_timing(stage_seconds, total_seconds):
+    # e.g. `llm;dur=512.3, filter;dur=1.2, total;dur=520.4`
+    entries = [f"{TOKEN.sub('_', name)};dur={seconds * 1000:.1f}" for name, seconds in stage_seconds.items()]
+    return ", ".join(entries + [f"total;dur={total_seconds * 1000:.1f}"])
+
+
+def finish_request(response, endpoint, method, path, logger=None):
+    """
+    Adds the `Server-Timing` (and profile) headers to `response`, records the request's metrics and logs it.
+
+    Parameters:
+        response (flask.Response): The response about to be sent.
+        endpoint (str | None): Flask endpoint name, used as the metric label.
+        method (str): HTTP method.
+        path (str): Request path, for the log line.
+        logger (logging.Logger, optional): Gets one JSON line per request, at INFO.
+
+    Returns:
+        flask.Response: `response`.
+    """
+    if "request_started" not in g:
+        return response
+    total_seconds = time.perf_counter() - g.request_started
+    stage_seconds = g.stage_seconds
+    endpoint = endpoint or "unmatched"
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        response.headers["X-Profile-File"] = _write_profile(profiler, endpoint)
+
+    # Streamed bodies are still being generated: the timings cover everything up to the first byte
+    response.headers["Server-Timing"] = server_timing(stage_seconds, total_seconds)
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    REQUEST_SECONDS.observe(total_seconds, endpoint=endpoint)
+    for name, seconds in stage_seconds.items():
+        STAGE_SECONDS.observe(seconds, stage=name)
+    query_path = g.get("query_path")
+    if query_path is not None:
+        QUERY_PATHS.inc(path=query_path)
+    result_rows = g.get("result_rows")
+    if result_rows is not None:
+        RESULT_ROWS.observe(result_rows)
+
+    if logger is not None:
+        record = {
+            "method": method,
+            "path": path,
+            "endpoint": endpoint,
+            "status": response.status_code,
+            "duration_ms": round(total_seconds * 1000, 2),
+            "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in stage_seconds.items()},
+        }
+        for key in ("query_path", "result_rows", "prompt_tokens"):
+            if key in g:
+                record[key] = g.get(key)
+        logger.info("request %s", json.dumps(record))
+    return response
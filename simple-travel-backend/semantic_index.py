@@ -0,0 +1,356 @@
+"""
+In-process semantic search over listing descriptions.
+
+Each listing's name and description texts (`chat_config.SEMANTIC_TEXT_COLUMNS`) become a TF-IDF vector,
+reduced to `DIMENSIONS` dense dimensions with a truncated SVD (latent semantic analysis), so words that
+co-occur in the descriptions ("river", "chao phraya", "pier") end up close together. A query is embedded the
+same way and listings are ranked by cosine similarity, either exactly over the candidate rows (NumPy brute
+force) or through an inverted-file (IVF) index: the vectors are clustered with k-means and only the clusters
+closest to the query are scored.
+
+The transformer builds the index with the master snapshot and stores it as snapshot extras
+(`extra-semantic-*.npy`, memory-mapped on load). Datasets without a stored index build one when they load,
+up to `BUILD_MAX_ROWS` listings.
+"""
+import math
+import os
+import re
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+import chat_config
+import snapshot
+
+DIMENSIONS = int(os.getenv("SEMANTIC_DIMENSIONS", "64"))
+IVF_NPROBE = int(os.getenv("SEMANTIC_NPROBE", "8"))
+# Datasets above this size without a stored index are served without semantic ranking
+BUILD_MAX_ROWS = int(os.getenv("SEMANTIC_BUILD_MAX_ROWS", "200000"))
+VOCABULARY_SIZE = 50000
+FIT_SAMPLE_ROWS = 20000
+# IVF lists are only built (and used) for candidate sets at least this big; brute force is faster below
+IVF_MIN_ROWS = 20000
+# Clusters keep being probed until this many candidates are found
+IVF_MIN_CANDIDATES = 1000
+CHUNK_NONZEROS = 1 << 20
+EXTRA_PREFIX = "semantic-"
+# Stored arrays describing the fitted model rather than individual listings: still valid after rows are added
+MODEL_EXTRAS = [EXTRA_PREFIX + name for name in ("vocabulary", "idf", "components", "centroids")]
+
+WORD = re.compile(r"[a-z][a-z0-9]+")
+STOP_WORDS = set("""
+a about above after again all also am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here
+hers him his how i if in into is it its itself just me more most my no nor not now of off on once only or
+other our ours out over own same she should so some such than that the their them then there these they
+this those through to too under until up very was we were what when where which while who whom why will
+with would you your yours
+""".split())
+
+# Compressed sparse rows: row i's columns are indices[indptr[i]:indptr[i + 1]]
+Csr = namedtuple("Csr", ["indptr", "indices", "data", "shape"])
+
+
+@lru_cache(maxsize=1 << 18)
+def _term(word):
+    if word in STOP_WORDS:
+        return None
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    return [term for term in map(_term, WORD.findall(text.lower())) if term is not None]
+
+
+def document_texts(frame):
+    columns = [col for col in chat_config.SEMANTIC_TEXT_COLUMNS if col in frame.columns]
+    parts = [frame[col].tolist() for col in columns]
+    return [" . ".join(str(value) for value in values if value) for values in zip(*parts)] if parts else [""] * len(frame)
+
+
+def _term_matrix(documents, terms, idf):
+    # L2-normalized TF-IDF rows (sublinear term frequency) over the `terms` vocabulary, from token lists
+    indptr = [0]
+    indices = []
+    counts = []
+    for tokens in documents:
+        tf = Counter(terms[term] for term in tokens if term in terms)
+        indices.extend(tf)
+        counts.extend(tf.values())
+        indptr.append(len(indices))
+    indptr = np.array(indptr, dtype=np.int64)
+    indices = np.array(indices, dtype=np.int64)
+    data = (1 + np.log(np.array(counts, dtype=np.float64))) * idf[indices]
+    norms = np.sqrt(_row_sums(indptr, data * data))
+    data /= np.repeat(np.where(norms > 0, norms, 1), np.diff(indptr))
+    return Csr(indptr, indices, data, (len(documents), len(idf)))
+
+
+def _row_sums(indptr, values):
+    sums = np.concatenate([[0.0], np.cumsum(values)])
+    return sums[indptr[1:]] - sums[indptr[:-1]]
+
+
+def _csr_dot(matrix, dense):
+    """
+    Returns `matrix @ dense` for a Csr matrix, in row chunks of about CHUNK_NONZEROS products.
+    """
+    indptr, indices, data, (rows, _) = matrix
+    out = np.zeros((rows, dense.shape[1]))
+    dense = dense.astype(np.float32)
+    start = 0
+    while start < rows:
+        stop = min(max(int(np.searchsorted(indptr, indptr[start] + CHUNK_NONZEROS, side='right')) - 1, start + 1), rows)
+        low, high = indptr[start], indptr[stop]
+        starts = indptr[start:stop]
+        filled = np.flatnonzero(indptr[start + 1:stop + 1] > starts)
+        if len(filled):
+            products = data[low:high, None].astype(np.float32) * dense[indices[low:high]]
+            out[start + filled] = np.add.reduceat(products, starts[filled] - low, axis=0)
+        start = stop
+    return out
+
+
+def _transpose(matrix):
+    indptr, indices, data, (rows, columns) = matrix
+    row_ids = np.repeat(np.arange(rows), np.diff(indptr))
+    order = np.argsort(indices, kind='stable')
+    column_ptr = np.concatenate([[0], np.cumsum(np.bincount(indices, minlength=columns))])
+    return Csr(column_ptr, row_ids[order], data[order], (columns, rows))
+
+
+def _truncated_svd(matrix, dimensions, seed, power_iterations=2):
+    # Randomized SVD (Halko et al.): right singular vectors of the top `dimensions` components
+    transposed = _transpose(matrix)
+    width = min(dimensions + 10, *matrix.shape)
+    basis = _csr_dot(matrix, np.random.default_rng(seed).standard_normal((matrix.shape[1], width)))
+    for _ in range(power_iterations):
+        basis, _ = np.linalg.qr(basis)
+        basis = _csr_dot(matrix, _csr_dot(transposed, basis))
+    basis, _ = np.linalg.qr(basis)
+    _, _, right = np.linalg.svd(_csr_dot(transposed, basis).T, full_matrices=False)
+    return right[:dimensions].T
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def _kmeans(vectors, clusters, seed, iterations=8):
+    # Spherical k-means on a sample, then every vector is assigned to its closest centroid
+    rng = np.random.default_rng(seed)
+    sample = vectors[np.sort(rng.choice(len(vectors), min(len(vectors), clusters * 64), replace=False))]
+    centroids = sample[rng.choice(len(sample), clusters, replace=False)].astype(np.float64)
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = np.bincount(assignment, minlength=clusters) == 0
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+    centroids = centroids.astype(np.float32)
+    return (centroids,) + _inverted_lists(vectors, centroids)
+
+
+def _inverted_lists(vectors, centroids):
+    # (members of each cluster in cluster order, offsets of each cluster's members): every vector joins its closest centroid
+    assignment = np.concatenate([
+        np.argmax(vectors[start:start + 65536] @ centroids.T, axis=1) for start in range(0, len(vectors), 65536)
+    ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+    order = np.argsort(assignment, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=len(centroids)))])
+    return order, offsets
+
+
+class SemanticIndex:
+    """
+    Listing embeddings of one dataset version, with exact and IVF ranking.
+
+    Attributes:
+        vocabulary (list): Index terms.
+        idf (np.ndarray): Inverse document frequency per term.
+        components (np.ndarray): Term -> embedding projection (terms x dimensions).
+        vectors (np.ndarray): Unit-length listing embeddings (rows x dimensions, float32).
+        centroids, list_order, list_offsets (np.ndarray | None): IVF clusters and their members, if built.
+    """
+
+    def __init__(self, vocabulary, idf, components, vectors, centroids=None, list_order=None, list_offsets=None):
+        self.vocabulary = vocabulary
+        self.terms = {term: position for position, term in enumerate(vocabulary)}
+        self.idf = idf
+        self.components = components
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_order = list_order
+        self.list_offsets = list_offsets
+
+    @property
+    def size(self):
+        return len(self.vectors)
+
+    @classmethod
+    def build(cls, frame, dimensions=DIMENSIONS, seed=0):
+        """
+        Fits the vocabulary and projection on (a sample of) `frame` and embeds every listing.
+        """
+        texts = document_texts(frame)
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(len(texts), min(len(texts), FIT_SAMPLE_ROWS), replace=False))
+        sample_tokens = [tokenize(texts[row]) for row in sample.tolist()]
+        document_frequency = Counter()
+        for tokens in sample_tokens:
+            document_frequency.update(set(tokens))
+        # Words in a single description or in most of them don't help ranking
+        min_df, max_df = (2, 0.5 * len(sample)) if len(sample) >= 100 else (1, len(sample))
+        vocabulary = sorted(
+            (term for term, count in document_frequency.items() if min_df <= count <= max_df),
+            key=lambda term: (-document_frequency[term], term),
+        )[:VOCABULARY_SIZE]
+        idf = np.array([math.log((1 + len(sample)) / (1 + document_frequency[term])) + 1 for term in vocabulary])
+        terms = {term: position for position, term in enumerate(vocabulary)}
+
+        dimensions = min(dimensions, len(vocabulary), max(len(sample) - 1, 1))
+        if not vocabulary:
+            components = np.zeros((0, 0), dtype=np.float32)
+            return cls(vocabulary, idf, components, np.zeros((len(texts), 0), dtype=np.float32))
+        sample_matrix = _term_matrix(sample_tokens, terms, idf)
+        components = _truncated_svd(sample_matrix, dimensions, seed)
+        index = cls(vocabulary, idf.astype(np.float32), components.astype(np.float32), np.zeros((0, 0), dtype=np.float32))
+        if len(sample) == len(texts):
+            index.vectors = _normalize(_csr_dot(sample_matrix, components)).astype(np.float32)
+        else:
+            index.vectors = index.embed_texts(texts)
+        if len(texts) >= IVF_MIN_ROWS:
+            index.centroids, index.list_order, index.list_offsets = _kmeans(index.vectors, round(math.sqrt(len(texts))), seed)
+        return index
+
+    def extras(self):
+        """
+        Arrays to store with the snapshot (`snapshot.write_snapshot(..., extras=...)`).
+        """
+        arrays = {
+            "vocabulary": np.array(self.vocabulary, dtype=str),
+            "idf": self.idf,
+            "components": self.components,
+            "vectors": self.vectors,
+        }
+        if self.centroids is not None:
+            arrays.update(centroids=self.centroids, list_order=self.list_order, list_offsets=self.list_offsets)
+        return {EXTRA_PREFIX + name: values for name, values in arrays.items()}
+
+    def embed_texts(self, texts):
+        """
+        Embeds listing texts (see `document_texts`) with the fitted vocabulary and projection, without refitting.
+        """
+        if not self.components.size:
+            return np.zeros((len(texts), self.components.shape[1]), dtype=np.float32)
+        vectors = [
+            _csr_dot(_term_matrix([tokenize(text) for text in texts[start:start + FIT_SAMPLE_ROWS]], self.terms, self.idf), self.components)
+            for start in range(0, len(texts), FIT_SAMPLE_ROWS)
+        ]
+        vectors = np.concatenate(vectors) if vectors else np.zeros((0, self.components.shape[1]))
+        return _normalize(vectors).astype(np.float32)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads the index stored with the snapshot at `path`, or returns None if it has none.
+        """
+        if not has_index(path):
+            return None
+        arrays = {
+            name: snapshot.read_extra(path, EXTRA_PREFIX + name, mmap_mode='r' if name == "vectors" else None)
+            for name in ("vocabulary", "idf", "components", "vectors", "centroids", "list_order", "list_offsets")
+        }
+        arrays["vocabulary"] = arrays["vocabulary"].tolist()
+        if arrays["centroids"] is not None and arrays["list_order"] is None:
+            # A stacked snapshot keeps the clusters but not the lists: rows were added since they were built
+            arrays["list_order"], arrays["list_offsets"] = _inverted_lists(arrays["vectors"], arrays["centroids"])
+        return cls(**arrays)
+
+    def embed(self, text):
+        """
+        Returns the unit-length embedding of `text`, or None when none of its words are indexed.
+        """
+        tf = Counter(self.terms[term] for term in tokenize(text) if term in self.terms)
+        if not tf or not self.components.size:
+            return None
+        indices = np.fromiter(tf, dtype=np.int64, count=len(tf))
+        weights = (1 + np.log(np.fromiter(tf.values(), dtype=np.float64, count=len(tf)))) * self.idf[indices]
+        vector = weights @ self.components[indices]
+        norm = np.linalg.norm(vector)
+        return (vector / norm).astype(np.float32) if norm > 0 else None
+
+    def rank(self, text, rows, mode="auto", nprobe=IVF_NPROBE):
+        """
+        Orders `rows` by similarity to `text`, most similar first (ties keep dataset order).
+
+        Parameters:
+            text (str): Free-text query.
+            rows (np.ndarray): Ascending candidate row positions, e.g. the rows matched by a filter.
+            mode (str): "exact" scores every row, "ivf" only the rows in the closest clusters (the others
+                follow in dataset order), "auto" uses IVF for large candidate sets when the index has clusters.
+            nprobe (int): Clusters to probe in IVF mode.
+
+        Returns:
+            np.ndarray: The same rows, reordered. Unchanged when no word of `text` is indexed.
+        """
+        query = self.embed(text)
+        if query is None or not len(rows):
+            return rows
+        if mode == "auto":
+            mode = "ivf" if len(rows) >= IVF_MIN_ROWS else "exact"
+        candidates = rows
+        if mode == "ivf" and self.centroids is not None:
+            candidates = self._probe(query, rows, nprobe)
+        scores = self.vectors[candidates] @ query
+        ranked = candidates[np.argsort(-scores, kind='stable')]
+        if len(candidates) == len(rows):
+            return ranked
+        probed = np.zeros(self.size, dtype=bool)
+        probed[candidates] = True
+        return np.concatenate([ranked, rows[~probed[rows]]])
+
+    def _probe(self, query, rows, nprobe):
+        allowed = None
+        if len(rows) < self.size:
+            allowed = np.zeros(self.size, dtype=bool)
+            allowed[rows] = True
+        found = []
+        count = 0
+        wanted = min(len(rows), IVF_MIN_CANDIDATES)
+        for probed, cluster in enumerate(np.argsort(-(self.centroids @ query)).tolist(), start=1):
+            members = self.list_order[self.list_offsets[cluster]:self.list_offsets[cluster + 1]]
+            if allowed is not None:
+                members = members[allowed[members]]
+            found.append(members)
+            count += len(members)
+            if probed >= nprobe and count >= wanted:
+                break
+        return np.sort(np.concatenate(found))
+
+    def nbytes(self):
+        return int(sum(values.nbytes for values in self.extras().values()))
+
+
+def has_index(path):
+    return EXTRA_PREFIX + "vectors" in snapshot.read_schema(path).get("extras", [])
+
+
+def index_for(frame, path=None, details=None):
+    """
+    Returns the stored index of the snapshot at `path` when it matches `frame`, else builds one (or None
+    when the frame has more than BUILD_MAX_ROWS listings). Description columns kept in `details`
+    (a `snapshot.DetailColumns`) are decoded only when an index has to be built.
+    """
+    if path is not None and os.path.isdir(path):
+        index = SemanticIndex.load(path)
+        if index is not None and index.size == len(frame):
+            return index
+    if len(frame) > BUILD_MAX_ROWS:
+        return None
+    return SemanticIndex.build(details.attach(frame, chat_config.SEMANTIC_TEXT_COLUMNS) if details is not None else frame)
@@ -0,0 +1,547 @@
+"""
+Typed columnar snapshot of a cleaned listings frame.
+
+A snapshot is a directory holding one `.npy` file per numeric column, which the backend
+memory-maps read-only, a UTF-8 blob plus byte offsets per text column, integer codes plus the
+list of categories per categorical column, and int8 values plus a missing mask per nullable flag column.
+`schema.json` records the stored dtype of every column.
+Long text and photo columns (`chat_config.DETAIL_COLUMNS`) can stay on disk and be read per listing
+through `read_details`. Each write goes to a new generation directory (`<path>.g<id>`) and `<path>`
+is a symlink swapped to it with one `os.replace`, so readers either see the previous snapshot or
+the complete new one, never a mix.
+
+A snapshot can also be a stack of layers (`append_layer`): a generation whose `schema.json` (format 3) lists
+a full base generation followed by delta generations holding only new or replaced rows. Each delta records
+which earlier rows it supersedes. Readers see the stack as one snapshot of its live rows, concatenated in
+memory instead of memory-mapped, until it is compacted by writing a full snapshot again.
+"""
+import json
+import mmap
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+import chat_config
+
+SNAPSHOT_FORMAT = 2
+# A stack of layer generations (see `append_layer`)
+STACK_FORMAT = 3
+# Format 1 stored character offsets for text columns and had no categorical columns
+READABLE_FORMATS = (1, 2, STACK_FORMAT)
+SCHEMA_FILE = "schema.json"
+# Integer columns with gaps are stored as float32 while every value is exact in it, else float64
+FLOAT32_EXACT_LIMIT = 2 ** 24
+
+
+def snapshot_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + ".snapshot"
+
+
+def apply_schema(df, dtypes=None):
+    """
+    Coerces the columns of a cleaned listings frame to the dtypes in `chat_config.COLUMN_DTYPES`.
+
+    Parameters:
+        df (pd.DataFrame): Frame produced by the transformer or read back from a cleaned CSV.
+        dtypes (dict, optional): Column -> dtype overrides. Defaults to `chat_config.COLUMN_DTYPES`.
+
+    Returns:
+        pd.DataFrame: Frame restricted to the schema columns, in schema order.
+    """
+    dtypes = dtypes or chat_config.COLUMN_DTYPES
+    df = df.reset_index(drop=True)
+    columns = {}
+    for col, dtype in dtypes.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if dtype == 'Int8':
+            # Unknown stays missing, distinct from 0 (false)
+            columns[col] = pd.to_numeric(series, errors='coerce').astype('Int8')
+        elif dtype in ('int32', 'int64'):
+            columns[col] = _integer_column(pd.to_numeric(series, errors='coerce'), dtype)
+        elif dtype in ('float32', 'float64'):
+            columns[col] = pd.to_numeric(series, errors='coerce').astype(dtype)
+        elif dtype == 'category':
+            values = series.astype(object)
+            columns[col] = values.where(values.isna(), values.astype(str)).astype('category')
+        else:
+            columns[col] = series.astype(object).where(series.notna(), None)
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(df)))
+
+
+def _integer_column(numeric, dtype):
+    if numeric.isna().any():
+        # Missing values need a float column; it survives the round trip exactly while the values are small
+        exact = numeric.abs().max() < FLOAT32_EXACT_LIMIT
+        return numeric.astype(np.float32 if dtype == 'int32' and exact else np.float64)
+    if dtype == 'int32' and len(numeric) and not np.iinfo(np.int32).min <= numeric.min() <= numeric.max() <= np.iinfo(np.int32).max:
+        return numeric.astype(np.int64)
+    return numeric.astype(dtype)
+
+
+def encode_text(values):
+    """
+    Packs text values into one UTF-8 blob with byte offsets, so any row can be sliced out without parsing the others.
+
+    Parameters:
+        values (list): Strings, None or NaN for missing values.
+
+    Returns:
+        tuple: (blob bytes, int64 offsets of length len(values) + 1, bool array of present values).
+    """
+    valid = np.asarray(pd.notna(np.array(values, dtype=object)), dtype=bool)
+    encoded = [str(value).encode("utf-8") if present else b"" for value, present in zip(values, valid.tolist())]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+    return b"".join(encoded), offsets, valid
+
+
+def decode_text(blob, offsets, valid, rows=None):
+    """
+    Decodes the rows of a blob written by `encode_text` (all rows when `rows` is None) into an object array.
+    """
+    if rows is None:
+        starts, ends, present = offsets[:-1].tolist(), offsets[1:].tolist(), np.asarray(valid)
+    else:
+        starts, ends, present = offsets[rows].tolist(), offsets[rows + 1].tolist(), valid[rows]
+    values = np.empty(len(starts), dtype=object)
+    values[:] = [blob[start:end].decode("utf-8") for start, end in zip(starts, ends)]
+    values[~present] = None
+    return values
+
+
+def _write_text_column(directory, name, series):
+    blob, offsets, valid = encode_text(series.tolist())
+    with open(os.path.join(directory, name + ".txt"), "wb") as f:
+        f.write(blob)
+    np.save(os.path.join(directory, name + ".offsets.npy"), offsets)
+    np.save(os.path.join(directory, name + ".valid.npy"), valid)
+
+
+def _read_text_column(directory, name, byte_offsets=True, rows=None):
+    valid = np.load(os.path.join(directory, name + ".valid.npy"))
+    offsets = np.load(os.path.join(directory, name + ".offsets.npy"))
+    with open(os.path.join(directory, name + ".txt"), "rb") as f:
+        blob = f.read()
+    if rows is not None:
+        if byte_offsets:
+            return decode_text(blob, offsets, valid, rows)
+        return _read_text_column(directory, name, byte_offsets)[rows]
+    text = blob.decode("utf-8")
+    if byte_offsets and len(text) != len(blob):
+        return decode_text(blob, offsets, valid)
+    # ASCII-only blobs (and format 1 blobs, which stored character offsets) are sliced as one decoded string
+    values = np.empty(len(valid), dtype=object)
+    bounds = offsets.tolist()
+    values[:] = [text[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    values[~valid] = None
+    return values
+
+
+def _map_text_column(directory, name):
+    # Memory-maps a text column for `DetailColumns`: nothing is decoded until rows are asked for
+    with open(os.path.join(directory, name + ".txt"), "rb") as f:
+        blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+    offsets = np.load(os.path.join(directory, name + ".offsets.npy"), mmap_mode='r')
+    valid = np.load(os.path.join(directory, name + ".valid.npy"), mmap_mode='r')
+    return blob, offsets, valid
+
+
+def write_snapshot(df, path, extras=None):
+    """
+    Writes `df` as a columnar snapshot directory at `path`, replacing any previous snapshot.
+
+    Parameters:
+        df (pd.DataFrame): Cleaned listings frame. It is typed with `apply_schema` first.
+        path (str): Target snapshot path, usually `snapshot_path_for(<csv path>)`.
+        extras (dict, optional): Name -> NumPy array stored alongside the columns (see `read_extra`).
+
+    Returns:
+        dict: The schema written to `schema.json`.
+    """
+    generation_path = _write_generation(apply_schema(df), path, extras)
+    return _swap(path, generation_path)
+
+
+def _write_generation(typed, path, extras=None):
+    # Writes a typed frame as a new, not yet linked generation directory next to `path`
+    generation_path = f"{path}.g{time.time_ns():x}"
+    os.makedirs(generation_path)
+
+    columns = []
+    for i, col in enumerate(typed.columns):
+        name = f"c{i:03d}"
+        series = typed[col]
+        if series.dtype == object:
+            _write_text_column(generation_path, name, series)
+            dtype = 'string'
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(generation_path, name + ".npy"), np.ascontiguousarray(series.cat.codes.to_numpy()))
+            _write_text_column(generation_path, name + ".categories", pd.Series(series.cat.categories, dtype=object))
+            dtype = 'category'
+        elif isinstance(series.dtype, pd.Int8Dtype):
+            # Values (0 where missing) and the missing mask, both memory-mapped back into one nullable array
+            np.save(os.path.join(generation_path, name + ".npy"), series.to_numpy(dtype=np.int8, na_value=0))
+            np.save(os.path.join(generation_path, name + ".mask.npy"), series.isna().to_numpy())
+            dtype = 'Int8'
+        else:
+            np.save(os.path.join(generation_path, name + ".npy"), np.ascontiguousarray(series.to_numpy()))
+            dtype = str(series.dtype)
+        columns.append({"name": col, "file": name, "dtype": dtype})
+    for name, values in (extras or {}).items():
+        np.save(os.path.join(generation_path, f"extra-{name}.npy"), np.ascontiguousarray(values))
+
+    schema = {"format": SNAPSHOT_FORMAT, "rows": len(typed), "columns": columns, "extras": sorted(extras or {})}
+    with open(os.path.join(generation_path, SCHEMA_FILE), "w") as f:
+        json.dump(schema, f, indent=1)
+    return generation_path
+
+
+def _swap(path, generation_path):
+    # Points `path` at a complete generation and removes the generations no reader can still need
+    with open(os.path.join(generation_path, SCHEMA_FILE)) as f:
+        schema = json.load(f)
+    previous = os.path.realpath(path) if os.path.islink(path) else None
+    if os.path.isdir(path) and not os.path.islink(path):
+        # Snapshot written before generations existed; replaced once, non-atomically
+        shutil.rmtree(path)
+    link_path = f"{path}.link-{os.getpid()}"
+    os.symlink(os.path.basename(generation_path), link_path)
+    os.replace(link_path, path)
+    _remove_stale_generations(path, keep={generation_path, previous})
+    return schema
+
+
+def append_layer(path, df, replaces, extras=None, shared_extras=()):
+    """
+    Adds rows to the snapshot at `path` without rewriting it: `df` is written as a delta generation and `path`
+    is swapped to a stack of the current layers plus that delta.
+
+    Parameters:
+        path (str): Existing snapshot path (a full snapshot or a stack).
+        df (pd.DataFrame): New and replacement listings. It is typed with `apply_schema` first.
+        replaces (np.ndarray): Row positions in the current snapshot that `df` supersedes.
+        extras (dict, optional): Name -> per-row array for the rows of `df`. Only extras that every layer has
+            per row are readable from the stack.
+        shared_extras (iterable): Extras of the base layer that still apply to the whole stack (e.g. a fitted model).
+
+    Returns:
+        dict: The stack schema written to `schema.json`.
+    """
+    current = read_schema(path)
+    layers = _stack_layers(path, current)
+    live = _live_rows(path, current)
+    extras = dict(extras or {})
+    extras["replaces"] = np.flatnonzero(live)[np.asarray(replaces, dtype=np.int64)]
+    generation_path = _write_generation(apply_schema(df), path, extras)
+    with open(os.path.join(generation_path, SCHEMA_FILE)) as f:
+        delta = json.load(f)
+    layer_schemas = [read_schema(os.path.join(os.path.dirname(os.path.abspath(path)), layer)) for layer in layers]
+    row_extras = set(delta["extras"]) - {"replaces"}
+    row_extras = sorted(row_extras.intersection(*(set(schema["extras"]) for schema in layer_schemas)))
+    shared = sorted(set(shared_extras) & set(layer_schemas[0]["extras"]))
+    stack_path = f"{path}.g{time.time_ns():x}"
+    os.makedirs(stack_path)
+    schema = {
+        "format": STACK_FORMAT,
+        "rows": int(live.sum()) - len(np.unique(extras["replaces"])) + delta["rows"],
+        "columns": delta["columns"],
+        "layers": layers + [os.path.basename(generation_path)],
+        "extras": sorted(row_extras + shared),
+        "row_extras": row_extras,
+    }
+    with open(os.path.join(stack_path, SCHEMA_FILE), "w") as f:
+        json.dump(schema, f, indent=1)
+    _swap(path, stack_path)
+    return schema
+
+
+def _stack_layers(path, schema):
+    # Generation names (siblings of `path`) making up a snapshot, base first
+    return list(schema["layers"]) if schema.get("format") == STACK_FORMAT else [os.path.basename(os.path.realpath(path))]
+
+
+def _live_rows(path, schema):
+    # Mask over the concatenated rows of every layer: False for rows a later layer replaced
+    if schema.get("format") != STACK_FORMAT:
+        return np.ones(schema["rows"], dtype=bool)
+    directory = os.path.dirname(os.path.realpath(path))
+    sizes = [read_schema(os.path.join(directory, layer))["rows"] for layer in schema["layers"]]
+    live = np.ones(sum(sizes), dtype=bool)
+    for layer in schema["layers"][1:]:
+        live[np.load(os.path.join(directory, layer, "extra-replaces.npy"))] = False
+    return live
+
+
+def layer_sizes(path):
+    """
+    Rows stored in each layer of the snapshot at `path`, base first (one entry for a full snapshot).
+    """
+    schema = read_schema(path)
+    directory = os.path.dirname(os.path.realpath(path))
+    return [read_schema(os.path.join(directory, layer))["rows"] for layer in _stack_layers(path, schema)]
+
+
+def _remove_stale_generations(path, keep):
+    # The previous generation stays: readers that resolved the old link may still be opening its files
+    directory, name = os.path.split(os.path.abspath(path))
+    keep = {os.path.realpath(kept) for kept in keep if kept}
+    for kept in list(keep):
+        # The layers of a kept stack are kept with it
+        try:
+            with open(os.path.join(kept, SCHEMA_FILE)) as f:
+                layers = json.load(f).get("layers", [])
+        except (OSError, ValueError):
+            layers = []
+        keep.update(os.path.realpath(os.path.join(directory, layer)) for layer in layers)
+    for entry in os.listdir(directory):
+        candidate = os.path.join(directory, entry)
+        if entry.startswith(name + ".g") and os.path.realpath(candidate) not in keep:
+            shutil.rmtree(candidate, ignore_errors=True)
+
+
+def read_schema(path):
+    path = os.path.realpath(path)
+    with open(os.path.join(path, SCHEMA_FILE)) as f:
+        schema = json.load(f)
+    if schema.get("format") not in READABLE_FORMATS:
+        raise ValueError(f"Unsupported snapshot format {schema.get('format')} in {path}")
+    return schema
+
+
+def read_snapshot(path, columns=None, rows=None):
+    """
+    Loads a snapshot written by `write_snapshot`.
+
+    Numeric columns and category codes are memory-mapped read-only, so the OS page cache is shared
+    between all processes reading the same snapshot and nothing is parsed. Text columns are decoded
+    from their UTF-8 blob with one slice per row.
+
+    Parameters:
+        path (str): Snapshot directory.
+        columns (list, optional): Subset of columns to load. Defaults to all columns.
+        rows (np.ndarray, optional): Sorted row positions to load (e.g. one filter shard), copied out of the
+            memory-mapped columns and indexed 0..len(rows) - 1. Defaults to every row, memory-mapped.
+
+    Returns:
+        pd.DataFrame: Typed listings frame.
+    """
+    # Resolve the generation once so a concurrent write can't swap it mid-read
+    path = os.path.realpath(path)
+    schema = read_schema(path)
+    if schema["format"] == STACK_FORMAT:
+        return _read_stack(path, schema, columns, rows)
+    wanted = set(columns) if columns is not None else None
+    byte_offsets = schema["format"] >= 2
+    rows = None if rows is None else np.asarray(rows, dtype=np.int64)
+    data = {}
+    for column in schema["columns"]:
+        if wanted is not None and column["name"] not in wanted:
+            continue
+        if column["dtype"] == 'string':
+            data[column["name"]] = _read_text_column(path, column["file"], byte_offsets, rows)
+        elif column["dtype"] == 'category':
+            codes = np.load(os.path.join(path, column["file"] + ".npy"), mmap_mode='r')
+            categories = _read_text_column(path, column["file"] + ".categories")
+            codes = codes if rows is None else codes[rows]
+            data[column["name"]] = pd.Categorical.from_codes(codes, categories=pd.Index(categories, dtype=object))
+        elif column["dtype"] == 'Int8':
+            values = np.load(os.path.join(path, column["file"] + ".npy"), mmap_mode='r')
+            missing = np.load(os.path.join(path, column["file"] + ".mask.npy"), mmap_mode='r')
+            if rows is not None:
+                values, missing = values[rows], missing[rows]
+            data[column["name"]] = pd.arrays.IntegerArray(values, missing)
+        else:
+            values = np.load(os.path.join(path, column["file"] + ".npy"), mmap_mode='r')
+            data[column["name"]] = values if rows is None else values[rows]
+    return pd.DataFrame(data, index=pd.RangeIndex(schema["rows"] if rows is None else len(rows)), copy=False)
+
+
+def _stack_rows(path, schema, rows=None):
+    # (layer paths, per layer: positions of the stack's rows (or of `rows`) among the layer's rows, in order)
+    directory = os.path.dirname(path)
+    layers = [os.path.join(directory, layer) for layer in schema["layers"]]
+    sizes = [read_schema(layer)["rows"] for layer in layers]
+    physical = np.flatnonzero(_live_rows(path, schema))
+    if rows is not None:
+        physical = physical[np.asarray(rows, dtype=np.int64)]
+    starts = np.concatenate([[0], np.cumsum(sizes)])
+    layer_of = np.searchsorted(starts, physical, side='right') - 1
+    return layers, layer_of, physical - starts[layer_of]
+
+
+def _read_stack(path, schema, columns, rows):
+    layers, layer_of, local = _stack_rows(path, schema, rows)
+    parts = []
+    for position, layer in enumerate(layers):
+        selected = local[layer_of == position]
+        parts.append(read_snapshot(layer, columns, selected) if len(selected) else None)
+    # Layer parts are concatenated in layer order; `inverse` puts the rows back in stack order
+    order = np.argsort(layer_of, kind='stable')
+    inverse = np.empty(len(order), dtype=np.int64)
+    inverse[order] = np.arange(len(order))
+    data = {}
+    for column in schema["columns"]:
+        name = column["name"]
+        present = [part[name] for part in parts if part is not None and name in part.columns]
+        if (columns is not None and name not in columns) or not present:
+            continue
+        if all(isinstance(values.dtype, pd.CategoricalDtype) for values in present):
+            values = pd.api.types.union_categoricals([values.array for values in present])
+            values = pd.Categorical.from_codes(values.codes, categories=values.categories)
+        elif any(isinstance(values.dtype, pd.Int8Dtype) for values in present):
+            # Layers written before flags were nullable hold plain int8
+            values = pd.concat(present, ignore_index=True).array
+        else:
+            values = np.concatenate([values.to_numpy() for values in present])
+        data[name] = values[inverse]
+    return pd.DataFrame(data, index=pd.RangeIndex(len(layer_of)), copy=False)
+
+
+def read_extra(path, name, mmap_mode=None):
+    """
+    Loads an array stored with `write_snapshot(..., extras=...)`, or None if the snapshot has none by that name.
+    Pass `mmap_mode='r'` to memory-map it like the numeric columns.
+    """
+    path = os.path.realpath(path)
+    schema = read_schema(path)
+    if name not in schema.get("extras", []):
+        return None
+    if schema["format"] != STACK_FORMAT:
+        return np.load(os.path.join(path, f"extra-{name}.npy"), mmap_mode=mmap_mode)
+    if name not in schema["row_extras"]:
+        return read_extra(os.path.join(os.path.dirname(path), schema["layers"][0]), name, mmap_mode)
+    layers, layer_of, local = _stack_rows(path, schema)
+    values = [np.load(os.path.join(layer, f"extra-{name}.npy"), mmap_mode='r') for layer in layers]
+    result = np.empty((len(local),) + values[0].shape[1:], dtype=np.result_type(*values))
+    for position, layer_values in enumerate(values):
+        selected = layer_of == position
+        result[selected] = layer_values[local[selected]]
+    return result
+
+
+def read_details(path, columns):
+    """
+    Opens the given text columns of a snapshot as `DetailColumns`, memory-mapped and decoded per row on demand.
+    Columns the snapshot doesn't have are skipped. Format 1 snapshots are decoded once and kept in memory.
+    """
+    path = os.path.realpath(path)
+    schema = read_schema(path)
+    if schema["format"] == STACK_FORMAT:
+        layers, layer_of, local = _stack_rows(path, schema)
+        return StackedDetailColumns([read_details(layer, columns) for layer in layers], layer_of, local)
+    stored = {column["name"]: column["file"] for column in schema["columns"] if column["dtype"] == 'string'}
+    wanted = [col for col in columns if col in stored]
+    if schema["format"] < 2:
+        return DetailColumns.from_frame(read_snapshot(path, wanted), wanted)
+    return DetailColumns(schema["rows"], {col: _map_text_column(path, stored[col]) for col in wanted})
+
+
+class DetailColumns:
+    """
+    Long text and photo columns kept out of the listings frame and decoded only for the rows a response needs.
+
+    Each column is one UTF-8 blob with byte offsets per listing (see `encode_text`). Columns read from a
+    snapshot are memory-mapped, so they live in the page cache shared by all workers instead of as one Python
+    string per listing in each process.
+
+    Parameters:
+        size (int): Number of listings.
+        columns (dict): Column -> (blob, offsets, valid) as produced by `encode_text`.
+        rows (np.ndarray, optional): Positions in the blobs of listings 0..size - 1, for a row subset (see `subset`).
+    """
+
+    def __init__(self, size, columns=None, rows=None):
+        self.size = size
+        self._columns = columns or {}
+        self._rows = rows
+
+    @classmethod
+    def from_frame(cls, frame, columns):
+        """
+        Packs the given columns of an in-memory frame (those it has).
+        """
+        return cls(len(frame), {col: encode_text(frame[col].tolist()) for col in columns if col in frame.columns})
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def __contains__(self, column):
+        return column in self._columns
+
+    def take(self, column, rows):
+        """
+        Returns the values of `column` at the row positions `rows` as an object array (None where missing).
+        """
+        blob, offsets, valid = self._columns[column]
+        rows = np.asarray(rows, dtype=np.int64)
+        return decode_text(blob, offsets, valid, rows if self._rows is None else self._rows[rows])
+
+    def subset(self, rows):
+        """
+        Returns the detail columns of the listings at `rows`, renumbered 0..len(rows) - 1 and sharing the same blobs.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        return DetailColumns(len(rows), self._columns, rows if self._rows is None else self._rows[rows])
+
+    def attach(self, frame, columns=None):
+        """
+        Returns `frame` with detail columns added, decoded for the listings at its index positions.
+
+        Meant for building indexes and for tools; it decodes every listing of `frame`.
+
+        Parameters:
+            frame (pd.DataFrame): Listings frame or a row subset of it, indexed by row position.
+            columns (list, optional): Detail columns to add (those present). Defaults to all of them.
+        """
+        columns = [col for col in (self.columns if columns is None else columns) if col in self]
+        if not columns:
+            return frame
+        rows = frame.index.to_numpy()
+        decoded = pd.DataFrame({col: self.take(col, rows) for col in columns}, index=frame.index)
+        return pd.concat([frame, decoded], axis=1)
+
+    def nbytes(self, columns=None):
+        # Blob bytes are page cache for memory-mapped columns, process memory for in-memory ones
+        columns = self.columns if columns is None else columns
+        return int(sum(len(blob) + offsets.nbytes + valid.nbytes for blob, offsets, valid in map(self._columns.get, columns)))
+
+
+class StackedDetailColumns(DetailColumns):
+    """
+    Detail columns of a stacked snapshot: listing i is row `rows[i]` of the detail columns of layer `layer_of[i]`.
+    """
+
+    def __init__(self, layers, layer_of, rows):
+        super().__init__(len(rows))
+        self.layers = layers
+        self.layer_of = layer_of
+        self._rows = rows
+
+    @property
+    def columns(self):
+        return [col for col in self.layers[0].columns if all(col in layer for layer in self.layers)]
+
+    def __contains__(self, column):
+        return all(column in layer for layer in self.layers)
+
+    def take(self, column, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        layer_of, local = self.layer_of[rows], self._rows[rows]
+        values = np.empty(len(rows), dtype=object)
+        for position in np.unique(layer_of).tolist():
+            selected = layer_of == position
+            values[selected] = self.layers[position].take(column, local[selected])
+        return values
+
+    def subset(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        return StackedDetailColumns(self.layers, self.layer_of[rows], self._rows[rows])
+
+    def nbytes(self, columns=None):
+        return sum(layer.nbytes(columns if columns is not None else self.columns) for layer in self.layers)
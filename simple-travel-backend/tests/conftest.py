@@ -0,0 +1,28 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The backend modules are top-level scripts, importable from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def listings():
+    # Four listings covering numeric, flag, categorical, place and text columns, with missing values
+    return pd.DataFrame({
+        "idStr": ["1", "2", "3", "4"],
+        "name": ["Rooftop pool condo", "Quiet garden room", "Riverside loft", "Pool villa"],
+        "city": ["Bangkok", "Khet Huai Khwang", "Bangkok", None],
+        "address": ["Sukhumvit, Bangkok", "Huai Khwang, Bangkok", "Charoen Krung, Bangkok", "Hua Hin"],
+        "bed_count": np.array([1, 2, 3, 4], dtype=np.int32),
+        "pricing/rate/amount": np.array([900, 1500, 2500, np.nan], dtype=np.float32),
+        "amenity_Wifi": np.array([1, 0, 1, 1], dtype=np.int8),
+        "amenity_Hot_water": np.array([1, 1, 0, 0], dtype=np.int8),
+        "roomTypeCategory": pd.Categorical(["entire_home", "private_room", "entire_home", None]),
+        # Siam, 1 km north of it, Charoen Krung (about 3.3 km away) and no coordinates
+        "location/lat": np.array([13.7456, 13.7546, 13.7240, np.nan], dtype=np.float32),
+        "location/lng": np.array([100.5347, 100.5347, 100.5140, np.nan], dtype=np.float32),
+    })
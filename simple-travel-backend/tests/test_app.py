@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+
+@pytest.fixture
+def app_module():
+    import app
+
+    return app
+
+
+def test_query_chain_is_built_once(app_module, monkeypatch):
+    built = []
+
+    def slow_chat_groq(**kwargs):
+        # Widens the window in which every thread sees no chain yet
+        time.sleep(0.05)
+        built.append(kwargs)
+        return RunnableLambda(lambda prompt: prompt)
+
+    monkeypatch.setattr(app_module, "ChatGroq", slow_chat_groq)
+    monkeypatch.setattr(app_module, "query_chain", None)
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    chains = []
+    threads = [threading.Thread(target=lambda: chains.append(app_module.get_query_chain())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1
+    assert len(chains) == 8 and all(chain is chains[0] for chain in chains)
+
+
+def test_query_path_counts(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "query_path_counts", app_module.Counter())
+
+    def count():
+        for _ in range(1000):
+            app_module.count_query_path("rules")
+
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert app_module.app.test_client().get("/stats").get_json()["query_paths"] == {"rules": 8000}
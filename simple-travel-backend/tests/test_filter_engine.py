@@ -0,0 +1,198 @@
+import pandas as pd
+import pytest
+
+import filter_engine
+from filter_engine import FilterEngine, FilterError
+
+
+def leaf(column, op, value):
+    return {"column": column, "op": op, "value": value}
+
+
+@pytest.mark.parametrize("node", [
+    leaf("bed_count", ">=", 2),
+    {"and": [leaf("amenity_Wifi", "==", True), leaf("name", "contains", "pool")]},
+    {"or": [leaf("bed_count", "<", 2), {"not": leaf("city", "in", ["Bangkok"])}]},
+])
+def test_validate_keeps_valid_filters(node):
+    columns = list(filter_engine.KNOWN_COLUMNS)
+    validated = filter_engine.validate(node, columns)
+    assert filter_engine.filter_columns(validated) == filter_engine.filter_columns(node)
+
+
+def test_validate_resolves_amenity_spelling(listings):
+    validated = filter_engine.validate(leaf("amenity_Hot water", "==", True), listings.columns)
+    assert validated == leaf("amenity_Hot_water", "==", True)
+
+
+def test_validate_normalizes_empty_filter(listings):
+    assert filter_engine.validate({}, listings.columns) == {"and": []}
+
+
+@pytest.mark.parametrize("node, message", [
+    (leaf("__class__", "==", 1), "Unknown column"),
+    (leaf("bed_count; import os", "==", 1), "Unknown column"),
+    ({"and": [leaf("bed_count", ">", 1), {"not": leaf("nope", "==", 1)}]}, "Unknown column"),
+    (leaf("stars", ">=", 4), "not available in the current dataset"),
+    (leaf("bed_count", "like", 1), "Unsupported operator"),
+    (leaf("bed_count", "in", 2), "expects a list"),
+    (leaf("bed_count", ">", None), "expects a scalar"),
+    (leaf("name", "contains", 3), "expects a string"),
+    ({"and": leaf("bed_count", ">", 1)}, "expects a list"),
+    (["bed_count"], "must be objects"),
+])
+def test_validate_rejects(listings, node, message):
+    with pytest.raises(FilterError, match=message):
+        filter_engine.validate(node, listings.columns)
+
+
+def test_parse_filter_strips_code_fence():
+    assert filter_engine.parse_filter('```json\n{"and": []}\n```') == {"and": []}
+    with pytest.raises(FilterError):
+        filter_engine.parse_filter("df[df['bed_count'] > 2]")
+
+
+@pytest.mark.parametrize("node, rows", [
+    ({}, [0, 1, 2, 3]),
+    (leaf("pricing/rate/amount", "!=", 900), [1, 2, 3]),
+    (leaf("bed_count", "in", [1, 4]), [0, 3]),
+    ({"or": [leaf("roomTypeCategory", "==", "private_room"), leaf("bed_count", "==", 4)]}, [1, 3]),
+    ({"not": leaf("roomTypeCategory", "==", "entire_home")}, [1, 3]),
+    (leaf("roomTypeCategory", "not_in", ["entire_home"]), [1, 3]),
+    (leaf("name", "contains", "LOFT"), [2]),
+])
+def test_evaluate(listings, node, rows):
+    validated = filter_engine.validate(node, listings.columns)
+    assert FilterEngine(listings).evaluate(validated).tolist() == rows
+
+
+@pytest.mark.parametrize("node, rows", [
+    (leaf("amenity_Wifi", "==", True), [0, 2, 3]),
+    (leaf("amenity_Wifi", "==", False), [1]),
+    (leaf("amenity_Wifi", "!=", True), [1]),
+    (leaf("amenity_Hot water", "==", True), [0, 1]),
+    ({"and": [leaf("amenity_Wifi", "==", True), leaf("amenity_Hot_water", "==", True)]}, [0]),
+    ({"and": [leaf("amenity_Wifi", "==", True), leaf("amenity_Hot_water", "==", False), leaf("bed_count", "<", 4)]}, [2]),
+])
+def test_evaluate_flags(listings, node, rows):
+    validated = filter_engine.validate(node, listings.columns)
+    engine = FilterEngine(listings)
+    assert "amenity_Wifi" in engine.flags
+    assert engine.evaluate(validated).tolist() == rows
+    # Answered from the packed bitmaps or by scanning the columns, the matches are the same
+    assert FilterEngine(listings, build_indexes=False).evaluate(validated).tolist() == rows
+
+
+@pytest.mark.parametrize("node, rows", [
+    (leaf("bed_count", ">=", 2), [1, 2, 3]),
+    (leaf("bed_count", "==", 3), [2]),
+    (leaf("pricing/rate/amount", "<", 2000), [0, 1]),
+    # A listing without a price is outside every range
+    (leaf("pricing/rate/amount", ">", 0), [0, 1, 2]),
+    ({"and": [leaf("pricing/rate/amount", ">=", 900), leaf("pricing/rate/amount", "<=", 1500)]}, [0, 1]),
+    ({"and": [leaf("bed_count", ">", 1), leaf("pricing/rate/amount", "<", 2000)]}, [1]),
+    ({"and": [leaf("amenity_Wifi", "==", True), leaf("pricing/rate/amount", "<", 2000)]}, [0]),
+    ({"and": [leaf("bed_count", ">", 10), leaf("amenity_Wifi", "==", True)]}, []),
+])
+def test_evaluate_ranges(listings, node, rows):
+    validated = filter_engine.validate(node, listings.columns)
+    engine = FilterEngine(listings)
+    assert "bed_count" in engine.ranges
+    assert engine.evaluate(validated).tolist() == rows
+    assert FilterEngine(listings, build_indexes=False).evaluate(validated).tolist() == rows
+
+
+def test_validate_text_match(listings):
+    node = leaf("text", "text_match", "rooftop pool")
+    assert filter_engine.validate(node, listings.columns) == node
+    with pytest.raises(FilterError, match="Full-text search"):
+        filter_engine.validate(leaf("name", "text_match", "pool"), listings.columns)
+    with pytest.raises(FilterError, match="expects a string"):
+        filter_engine.validate(leaf("text", "text_match", ["pool"]), listings.columns)
+
+
+@pytest.mark.parametrize("node, rows", [
+    (leaf("text", "text_match", "pool"), [0, 3]),
+    (leaf("text", "text_match", "Riverside"), [2]),
+    (leaf("text", "text_match", "submarine"), []),
+    ({"and": [leaf("bed_count", ">", 10), leaf("text", "text_match", "pool")]}, []),
+    ({"and": [leaf("amenity_Wifi", "==", True), leaf("text", "text_match", "pool")]}, [0, 3]),
+    # Place names compare normalized: 'Khet Huai Khwang' == 'Huai Khwang'
+    (leaf("city", "==", "Huai Khwang"), [1]),
+    (leaf("city", "in", ["huaikhwang", "BANGKOK"]), [0, 1, 2]),
+    (leaf("city", "!=", "Bangkok"), [1, 3]),
+])
+def test_evaluate_text(listings, node, rows):
+    validated = filter_engine.validate(node, listings.columns)
+    assert FilterEngine(listings).evaluate(validated).tolist() == rows
+    assert FilterEngine(listings, build_indexes=False).evaluate(validated).tolist() == rows
+
+
+@pytest.mark.parametrize("node", [
+    leaf("location", "near", {"place": "Siam", "radius_km": 2}),
+    leaf("location", "near", {"lat": 13.7456, "lng": 100.5347, "radius_km": 0.5}),
+    leaf("location", "bbox", {"south": 13.7, "west": 100.5, "north": 13.8, "east": 100.6}),
+])
+def test_validate_geo(listings, node):
+    validated = filter_engine.validate(node, listings.columns)
+    assert validated["op"] == node["op"]
+    if "place" in node["value"]:
+        # Landmarks are resolved to coordinates when the filter is validated
+        assert validated["value"] == {"lat": 13.7456, "lng": 100.5347, "radius_km": 2.0}
+
+
+@pytest.mark.parametrize("node, message", [
+    (leaf("location", "bbox", {"south": 14, "west": 100, "north": 13, "east": 101}), "south <= north"),
+    (leaf("location", "near", {"lat": 95, "lng": 100, "radius_km": 1}), "'lat' must be a number"),
+    (leaf("location", "near", {"place": "Siam", "radius_km": -1}), "'radius_km' must be a number"),
+    (leaf("location", "near", {"place": "", "radius_km": 1}), "non-empty string"),
+    (leaf("location", "within", {"place": "Siam", "radius_km": 1}), "Distance filters"),
+])
+def test_validate_rejects_geo(listings, node, message):
+    with pytest.raises(FilterError, match=message):
+        filter_engine.validate(node, listings.columns)
+
+
+@pytest.mark.parametrize("node, rows", [
+    (leaf("location", "near", {"place": "Siam", "radius_km": 2}), [0, 1]),
+    (leaf("location", "near", {"lat": 13.7456, "lng": 100.5347, "radius_km": 5}), [0, 1, 2]),
+    (leaf("location", "bbox", {"south": 13.70, "west": 100.50, "north": 13.75, "east": 100.55}), [0, 2]),
+    ({"and": [leaf("location", "near", {"place": "Siam", "radius_km": 5}), leaf("bed_count", ">=", 2)]}, [1, 2]),
+])
+def test_evaluate_geo(listings, node, rows):
+    validated = filter_engine.validate(node, listings.columns)
+    assert FilterEngine(listings).evaluate(validated).tolist() == rows
+    assert FilterEngine(listings, build_indexes=False).evaluate(validated).tolist() == rows
+
+
+def test_sort_by_distance(listings):
+    node = filter_engine.validate(leaf("location", "near", {"place": "Siam", "radius_km": 5}), listings.columns)
+    engine = FilterEngine(listings)
+    assert engine.sort_by_distance(engine.evaluate(node)[::-1], node).tolist() == [0, 1, 2]
+    with pytest.raises(FilterError, match="needs a 'near' filter"):
+        engine.sort_by_distance(engine.evaluate({"and": []}), {"and": []})
+
+
+def test_evaluate_unknown_place(listings):
+    validated = filter_engine.validate(leaf("location", "near", {"place": "Atlantis", "radius_km": 1}), listings.columns)
+    with pytest.raises(FilterError, match="Unknown place"):
+        FilterEngine(listings).evaluate(validated)
+
+
+@pytest.mark.parametrize("node, rows", [
+    (leaf("amenity_Wifi", "==", True), [0, 3]),
+    (leaf("amenity_Wifi", "==", False), [1]),
+    # A listing whose scrape doesn't say whether it has wifi matches neither value
+    (leaf("amenity_Wifi", "!=", True), [1]),
+    (leaf("amenity_Wifi", "in", [True, False]), [0, 1, 3]),
+    (leaf("amenity_Wifi", "not_in", [True]), [1]),
+    ({"not": leaf("amenity_Wifi", "==", True)}, [1, 2]),
+    ({"and": [leaf("amenity_Wifi", "==", False), leaf("amenity_Hot_water", "==", True)]}, [1]),
+])
+def test_evaluate_unknown_flags(listings, node, rows):
+    listings["amenity_Wifi"] = pd.array([1, 0, None, 1], dtype="Int8")
+    validated = filter_engine.validate(node, listings.columns)
+    engine = FilterEngine(listings)
+    assert engine.flags.count("amenity_Wifi") == 2 and engine.flags.count("amenity_Wifi", False) == 1
+    assert engine.evaluate(validated).tolist() == rows
+    assert FilterEngine(listings, build_indexes=False).evaluate(validated).tolist() == rows
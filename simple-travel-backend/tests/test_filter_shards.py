@@ -0,0 +1,92 @@
+import zlib
+
+import numpy as np
+import pytest
+
+import filter_engine
+import filter_shards
+import listings_store
+import snapshot
+from filter_engine import FilterEngine
+
+
+def leaf(column, op, value):
+    return {"column": column, "op": op, "value": value}
+
+
+def test_partition_by_city(listings):
+    engine = FilterEngine(listings)
+    shards = filter_shards.partition(engine, 2, "city")
+    assert [rows.tolist() for rows in shards] == [[0, 2], [1, 3]]
+    # With an even share of one listing, the two Bangkok listings are split across shards
+    shards = filter_shards.partition(engine, 4, "city")
+    assert sorted(rows.tolist() for rows in shards) == [[0], [1], [2], [3]]
+
+
+def test_partition_by_hash(listings):
+    engine = FilterEngine(listings)
+    shards = filter_shards.partition(engine, 3, "hash")
+    assert np.array_equal(np.sort(np.concatenate(shards)), np.arange(4))
+    for shard, rows in enumerate(shards):
+        assert all(zlib.crc32(listings["idStr"][row].encode("utf-8")) % 3 == shard for row in rows)
+    with pytest.raises(ValueError, match="Unknown shard partition"):
+        filter_shards.partition(engine, 3, "country")
+
+
+@pytest.mark.parametrize("node, cities", [
+    (leaf("city", "==", "Bangkok"), {"bangkok"}),
+    (leaf("city", "in", ["Bangkok", "Huai Khwang"]), {"bangkok", "huaikhwang"}),
+    ({"and": [leaf("city", "in", ["Bangkok", "Huai Khwang"]), leaf("city", "==", "BANGKOK")]}, {"bangkok"}),
+    ({"and": [leaf("bed_count", ">", 1), leaf("city", "==", "Bangkok")]}, {"bangkok"}),
+    (leaf("city", "!=", "Bangkok"), None),
+    ({"or": [leaf("city", "==", "Bangkok"), leaf("bed_count", ">", 1)]}, None),
+    ({"and": []}, None),
+])
+def test_pinned_cities(node, cities):
+    assert filter_shards.pinned_cities(node) == cities
+
+
+def test_shared_columns_are_views(listings):
+    listings["amenity_Wifi"] = listings["amenity_Wifi"].astype("Int8")
+    listings.loc[2, "amenity_Wifi"] = None
+    rows = np.array([1, 2])
+    memory, layout = filter_shards.share_columns(listings, rows)
+    try:
+        columns = filter_shards.map_columns(memory, layout, len(rows))
+        assert "name" not in columns
+        assert columns["bed_count"].tolist() == [2, 3] and not columns["bed_count"].flags.writeable
+        assert columns["amenity_Wifi"].isna().tolist() == [False, True]
+        assert list(columns["roomTypeCategory"]) == ["private_room", "entire_home"]
+        np.testing.assert_array_equal(columns["pricing/rate/amount"], listings["pricing/rate/amount"].to_numpy()[rows])
+        del columns
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def test_sharded_engine(tmp_path, listings):
+    path = str(tmp_path / "listings.snapshot")
+    snapshot.write_snapshot(listings, path)
+    frame, details = listings_store.read_listings(path)
+    engine = FilterEngine(frame, details=details)
+    sharded = filter_shards.ShardedEngine(path, engine, listings_store.read_listings, 2, "city")
+    try:
+        assert sharded.wait_ready(timeout=60), sharded.last_error
+        for node in (
+            {"and": []},
+            leaf("bed_count", ">=", 2),
+            {"and": [leaf("amenity_Wifi", "==", True), leaf("name", "contains", "pool")]},
+            leaf("location", "near", {"place": "Siam", "radius_km": 5}),
+        ):
+            node = filter_engine.validate(node, frame.columns)
+            assert sharded.evaluate(node).tolist() == engine.evaluate(node).tolist()
+        assert sharded.stats()["pruned_shard_queries"] == 0
+        # Pinned to Bangkok, the filter skips the shard holding Huai Khwang and the listing without a city
+        assert sharded.evaluate(filter_engine.validate(leaf("city", "==", "Bangkok"), frame.columns)).tolist() == [0, 2]
+        assert sharded.evaluate(filter_engine.validate(leaf("city", "==", "Atlantis"), frame.columns)).tolist() == []
+        stats = sharded.stats()
+        assert (stats["queries"], stats["pruned_shard_queries"], stats["fallbacks"]) == (6, 3, 0)
+    finally:
+        sharded.close()
+    # Closed shards evaluate in-process
+    assert sharded.evaluate({"and": []}).tolist() == [0, 1, 2, 3]
@@ -0,0 +1,64 @@
+import logging
+import time
+
+import numpy as np
+import pytest
+
+import chat_config
+import filter_engine
+import listings_store
+import query_parser
+import snapshot
+from listings_store import ListingsSnapshot, ListingsStore
+
+NEAR_SIAM = {"column": "location", "op": "near", "value": {"place": "Siam", "radius_km": 2}}
+
+
+def load(frame):
+    return ListingsSnapshot(frame, 1, ("listings.snapshot", 0.0, None), 0.0, time.time())
+
+
+def test_coordinates_are_filterable_when_present(listings):
+    columns = load(listings).columns
+    assert chat_config.LATITUDE_COLUMN in columns
+    assert query_parser.parse_query("near siam", columns) == [("location", "near", {"place": "Siam", "radius_km": chat_config.NEAR_RADIUS_KM})]
+    assert filter_engine.validate(NEAR_SIAM, columns)["op"] == "near"
+
+
+def test_empty_coordinates_are_not_filterable(listings):
+    # The master snapshot has the coordinate columns, all NaN, when the merged dumps carry none
+    empty = listings.assign(**{chat_config.LATITUDE_COLUMN: np.float32(np.nan), chat_config.LONGITUDE_COLUMN: np.float32(np.nan)})
+    columns = load(empty).columns
+    assert chat_config.LATITUDE_COLUMN not in columns and "name" in columns
+    assert query_parser.parse_query("near siam", columns) is None
+    assert query_parser.parse_query("pool within 5 km of patong beach", columns) is None
+    with pytest.raises(filter_engine.FilterError, match="not available"):
+        filter_engine.validate(NEAR_SIAM, columns)
+
+
+def test_loads_and_reload_failures_are_logged(tmp_path, listings, caplog, monkeypatch):
+    path = str(tmp_path / "listings.csv")
+    snapshot.write_snapshot(listings, snapshot.snapshot_path_for(path))
+    store = ListingsStore(path, watch=False)
+    with caplog.at_level(logging.INFO, logger=listings_store.__name__):
+        store.preload()
+    assert [record.levelno for record in caplog.records] == [logging.INFO]
+    assert caplog.records[0].getMessage().startswith("Loaded listings v1 from ")
+
+    caplog.clear()
+    checks = []
+
+    def sleep(seconds):
+        # One freshness check, then stop the watcher loop
+        if checks:
+            raise StopIteration
+        checks.append(seconds)
+
+    monkeypatch.setattr(store, "reload", lambda: 1 / 0)
+    monkeypatch.setattr(listings_store.time, "sleep", sleep)
+    with pytest.raises(StopIteration):
+        store._watch()
+    assert store.reload_errors == 1
+    assert [(record.levelno, record.getMessage()) for record in caplog.records] == [
+        (logging.ERROR, "Listings reload failed: ZeroDivisionError('division by zero')"),
+    ]
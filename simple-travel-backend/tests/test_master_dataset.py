@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import master_dataset
+import semantic_index
+import snapshot
+
+
+@pytest.fixture
+def master(tmp_path):
+    return snapshot.snapshot_path_for(master_dataset.master_path_for(str(tmp_path)))
+
+
+def test_upsert_round_trip(tmp_path, master, listings, monkeypatch):
+    monkeypatch.setattr(master_dataset, "COMPACT_RATIO", 10.0)
+    clean_dir = str(tmp_path)
+    stats = master_dataset.upsert(clean_dir, [listings])
+    assert (stats["inserted"], stats["rows"], stats["write"]) == (4, 4, "compacted")
+    assert semantic_index.has_index(master)
+
+    # The same listings again: every content hash matches, nothing is written
+    stats = master_dataset.upsert(clean_dir, [listings])
+    assert (stats["unchanged"], stats["write"]) == (4, None)
+    assert snapshot.layer_sizes(master) == [4]
+
+    changed = listings.copy()
+    changed.loc[1, "pricing/rate/amount"] = 1200
+    added = listings.iloc[[0]].assign(idStr="5", name="Rooftop pool studio")
+    # Rows without a numeric id are dropped, and the last copy of a duplicated id wins
+    broken = listings.iloc[[2]].assign(idStr="not an id")
+    stats = master_dataset.upsert(clean_dir, [listings.iloc[[1]], changed, added, broken])
+    assert {key: stats[key] for key in ("inserted", "updated", "unchanged", "rows", "write")} == {
+        "inserted": 1, "updated": 1, "unchanged": 3, "rows": 5, "write": "delta",
+    }
+    assert snapshot.layer_sizes(master) == [4, 2]
+    frame = snapshot.read_snapshot(master)
+    assert sorted(frame["idStr"].tolist()) == [1, 2, 3, 4, 5]
+    assert frame.set_index("idStr").loc[2, "pricing/rate/amount"] == 1200
+    # The stored hashes follow the stack's rows, so the next ingest compares against the right rows
+    assert snapshot.read_extra(master, "row_hash").tolist() == master_dataset.row_hashes(master_dataset.conform(frame)).tolist()
+    assert snapshot.read_extra(master, "semantic-vectors").shape[0] == 5
+    stats = master_dataset.upsert(clean_dir, [changed, added])
+    assert (stats["unchanged"], stats["write"]) == (5, None)
+
+
+def test_upsert_compacts_past_the_threshold(tmp_path, master, listings, monkeypatch):
+    monkeypatch.setattr(master_dataset, "COMPACT_RATIO", 0.5)
+    clean_dir = str(tmp_path)
+    master_dataset.upsert(clean_dir, [listings])
+    # Two delta rows over four base rows is at the ratio, not past it
+    first = listings.iloc[[0, 1]].assign(name=["Rooftop pool condo II", "Quiet garden room II"])
+    assert master_dataset.upsert(clean_dir, [first])["write"] == "delta"
+    assert snapshot.layer_sizes(master) == [4, 2]
+
+    second = listings.iloc[[2]].assign(name="Riverside loft II")
+    stats = master_dataset.upsert(clean_dir, [second])
+    assert (stats["updated"], stats["write"]) == (1, "compacted")
+    assert snapshot.layer_sizes(master) == [4]
+    frame = snapshot.read_snapshot(master)
+    assert sorted(frame["name"].tolist()) == ["Pool villa", "Quiet garden room II", "Riverside loft II", "Rooftop pool condo II"]
+    assert snapshot.read_extra(master, "row_hash").tolist() == master_dataset.row_hashes(master_dataset.conform(frame)).tolist()
+
+
+def test_upsert_compacts_past_max_layers(tmp_path, master, listings, monkeypatch):
+    monkeypatch.setattr(master_dataset, "COMPACT_RATIO", 10.0)
+    monkeypatch.setattr(master_dataset, "MAX_LAYERS", 3)
+    clean_dir = str(tmp_path)
+    master_dataset.upsert(clean_dir, [listings])
+    writes = [master_dataset.upsert(clean_dir, [listings.iloc[[0]].assign(idStr=str(idStr))])["write"] for idStr in (5, 6, 7)]
+    assert writes == ["delta", "delta", "compacted"]
+    assert snapshot.layer_sizes(master) == [7]
+    assert np.array_equal(np.sort(snapshot.read_snapshot(master)["idStr"].to_numpy()), np.arange(1, 8))
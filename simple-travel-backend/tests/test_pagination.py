@@ -0,0 +1,109 @@
+import base64
+import json
+
+import numpy as np
+import pytest
+
+import chat_config
+import filter_engine
+import pagination
+from pagination import PageError, PageRequest
+
+COLUMNS = list(chat_config.FINAL_COLUMNS)
+FILTER = {"and": [{"column": "bed_count", "op": ">=", "value": 2}]}
+
+
+def raw_cursor(state):
+    # A cursor built by hand, as a client tampering with one (or another service) would
+    raw = json.dumps(state).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def test_cursor_round_trip():
+    page_request = PageRequest(2, 20, "price", "desc", ["name", "price"])
+    cursor = pagination.encode_cursor(FILTER, page_request, page=3)
+    assert "=" not in cursor
+    filter_ast, decoded = pagination.decode_cursor(cursor, COLUMNS)
+    assert filter_ast == FILTER
+    assert (decoded.page, decoded.page_size, decoded.sort_by, decoded.order, decoded.fields) == (3, 20, "price", "desc", ["name", "price"])
+
+
+def test_cursor_page_override():
+    cursor = pagination.encode_cursor(FILTER, PageRequest(1, 20))
+    assert pagination.decode_cursor(cursor, COLUMNS, page=5)[1].page == 5
+    with pytest.raises(PageError):
+        pagination.decode_cursor(cursor, COLUMNS, page=0)
+
+
+def test_relevance_cursor_keeps_query_text():
+    page_request = PageRequest(1, 10, pagination.RELEVANCE, "desc", text="Quiet place near the río")
+    _, decoded = pagination.decode_cursor(pagination.encode_cursor(FILTER, page_request), COLUMNS)
+    assert decoded.text == "Quiet place near the río"
+    assert decoded.sort_key == page_request.sort_key
+
+
+@pytest.mark.parametrize("cursor", [
+    None,
+    5,
+    "",
+    "!!!!",
+    "abc",
+    "__4=",
+    "not a cursor at all",
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(PageError):
+        pagination.decode_cursor(cursor, COLUMNS)
+
+
+@pytest.mark.parametrize("state", [
+    [1, 2],
+    "cursor",
+    {"after": "c3VwcG9ydA", "limit": 20},
+    {"f": FILTER, "p": 1},
+    {"f": FILTER, "p": 1, "n": None},
+])
+def test_foreign_cursor(state):
+    # Well-formed base64 JSON that `encode_cursor` never produces
+    with pytest.raises(PageError):
+        pagination.decode_cursor(raw_cursor(state), COLUMNS)
+
+
+@pytest.mark.parametrize("state, error", [
+    ({"f": {"column": "__class__", "op": "==", "value": 1}, "p": 1, "n": 20}, filter_engine.FilterError),
+    ({"f": {"column": "bed_count", "op": "exec", "value": 1}, "p": 1, "n": 20}, filter_engine.FilterError),
+    ({"f": FILTER, "p": -1, "n": 20}, PageError),
+    ({"f": FILTER, "p": 1, "n": 0}, PageError),
+    ({"f": FILTER, "p": 1, "n": 20, "s": "password", "o": "asc"}, PageError),
+    ({"f": FILTER, "p": 1, "n": 20, "s": pagination.RELEVANCE, "o": "desc"}, PageError),
+    ({"f": FILTER, "p": 1, "n": 20, "s": pagination.RECOMMENDED, "o": "asc"}, PageError),
+    ({"f": FILTER, "p": 1, "n": 20, "c": ["secret_column"]}, PageError),
+])
+def test_tampered_cursor(state, error):
+    with pytest.raises(error):
+        pagination.decode_cursor(raw_cursor(state), COLUMNS)
+
+
+def test_tampered_page_size_is_capped():
+    cursor = raw_cursor({"f": FILTER, "p": 1, "n": 10 ** 6})
+    assert pagination.decode_cursor(cursor, COLUMNS, max_page_size=100)[1].page_size == 100
+
+
+def test_parse_page_request():
+    page_request = pagination.parse_page_request({"page": "2", "sort_by": "stars"}, 20, 50)
+    assert (page_request.page, page_request.page_size, page_request.order) == (2, 20, "desc")
+    assert pagination.parse_page_request({"page_size": 500}, 20, 50).page_size == 50
+    assert not pagination.parse_page_request({}, 20, 50).paged
+    for body in ({"page": "two"}, {"page_size": "x"}, {"sort_by": "distance", "order": "desc"}, {"fields": []}):
+        with pytest.raises(PageError):
+            pagination.parse_page_request(body, 20, 50)
+
+
+def test_page_rows():
+    rows = np.arange(45)
+    page_request = PageRequest(3, 20)
+    assert page_request.page_rows(rows).tolist() == list(range(40, 45))
+    assert page_request.needed_rows() == 60
+    assert not page_request.has_next(45)
+    assert PageRequest(2, 20).has_next(45)
+    assert PageRequest().page_rows(rows) is rows
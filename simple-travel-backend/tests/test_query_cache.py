@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+import filter_engine
+import query_cache
+import snapshot
+from listings_store import ListingsStore
+from query_cache import QueryCache, TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    return clock
+
+
+@pytest.mark.parametrize("text", ["Pool with WiFi", "  pool   with wifi!! ", "ｐｏｏｌ with wifi."])
+def test_normalize_query(text):
+    assert query_cache.normalize_query(text) == "pool with wifi"
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    # "b" is now the least recently used entry
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    cache.put("a", 10)
+    assert cache.stats()["size"] == 2 and cache.get("a") == 10
+
+
+def test_ttl_expiry(clock):
+    cache = TTLCache(maxsize=8, ttl=60)
+    cache.put("a", 1)
+    clock.now += 59
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a") is None
+    # Expired entries are dropped when they are read
+    assert cache.stats()["size"] == 0
+    cache.put("a", 2)
+    clock.now += 30
+    assert cache.get("a") == 2
+
+
+def test_counters():
+    cache = TTLCache()
+    assert cache.get("a") is None
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("a")
+    cache.discard("a")
+    assert cache.get("a") is None
+    assert cache.stats() == {"size": 0, "hits": 2, "misses": 2}
+
+
+def test_filters_are_keyed_on_normalized_text():
+    cache = QueryCache()
+    node = {"column": "bed_count", "op": ">=", "value": 2}
+    cache.put_filter("Two beds, please!", node)
+    assert cache.get_filter("two beds, please") == node
+    cache.discard_filter("TWO BEDS, PLEASE")
+    assert cache.get_filter("two beds, please") is None
+
+
+def test_canonical_filter_key_ignores_key_order():
+    # Level 2 is keyed on the filter's shape, so differently written but equal filters share rows
+    first = {"and": [{"column": "bed_count", "op": ">=", "value": 2}]}
+    second = {"and": [{"value": 2, "op": ">=", "column": "bed_count"}]}
+    cache = QueryCache()
+    cache.put_rows(1, filter_engine.canonical_key(first), np.array([1, 2]))
+    assert cache.get_rows(1, filter_engine.canonical_key(second)).tolist() == [1, 2]
+    third = {"and": [{"column": "bed_count", "op": ">=", "value": 3}]}
+    assert filter_engine.canonical_key(third) != filter_engine.canonical_key(first)
+
+
+def test_rows_are_keyed_on_version_and_order():
+    cache = QueryCache()
+    cache.put_rows(1, "f", np.array([3, 1]), sort_key="price:asc")
+    assert cache.get_rows(1, "f") is None
+    assert cache.get_rows(2, "f", "price:asc") is None
+    assert cache.get_rows(1, "f", "price:asc").tolist() == [3, 1]
+
+
+def test_dataset_reload_clears_rows_and_responses(tmp_path, listings):
+    path = str(tmp_path / "listings.csv")
+    snapshot.write_snapshot(listings, snapshot.snapshot_path_for(path))
+    store = ListingsStore(path, watch=False)
+    cache = QueryCache()
+    store.reload_listeners.append(cache.on_dataset_reload)
+    first = store.preload()
+    cache.put_filter("wifi", {"column": "amenity_Wifi", "op": "==", "value": True})
+    cache.put_rows(first.version, "f", np.array([0, 2, 3]))
+    cache.put_response(first.version, "page", b"{}")
+    assert store.reload() == (first, False)
+    assert cache.get_rows(first.version, "f") is not None
+
+    with open(path + ".version", "w") as f:
+        f.write("2")
+    second, reloaded = store.reload()
+    assert reloaded and second.version == first.version + 1
+    assert cache.get_rows(first.version, "f") is None
+    assert cache.get_response(first.version, "page") is None
+    # Generated filters don't depend on the data, so they survive a reload
+    assert cache.get_filter("wifi") is not None
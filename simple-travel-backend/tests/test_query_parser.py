@@ -0,0 +1,65 @@
+import pytest
+
+import chat_config
+import filter_engine
+import query_parser
+
+COLUMNS = list(chat_config.FINAL_COLUMNS)
+PRICE = query_parser.PRICE_COLUMN
+
+
+@pytest.mark.parametrize("query, conditions", [
+    ("2 bedrooms with wifi and a pool",
+     [("bedroom_count", ">=", 2), ("amenity_Wifi", "==", True), ("amenity_Pool", "==", True)]),
+    ("at least 3 beds under $100 per night", [("bed_count", ">=", 3), (PRICE, "<", 100)]),
+    ("between 2 and 4 guests",
+     [("guestControls/personCapacity", ">=", 2), ("guestControls/personCapacity", "<=", 4)]),
+    ("pet friendly place no smoking",
+     [("guestControls/allowsPets", "==", True), ("guestControls/allowsSmoking", "==", False)]),
+    ("1.5k baht max", [(PRICE, "<=", 1500)]),
+    ("budget of 1,500", [(PRICE, "<=", 1500)]),
+    ("no wifi", [("amenity_Wifi", "==", False)]),
+    ("WiFi!!", [("amenity_Wifi", "==", True)]),
+])
+def test_parse_query(query, conditions):
+    assert query_parser.parse_query(query, COLUMNS) == conditions
+
+
+def test_longest_amenity_phrase_wins():
+    assert query_parser.parse_query("hot water kettle", COLUMNS) == [("amenity_Hot water kettle", "==", True)]
+    # EASY_NAME_MAP spells it 'amenity_Hot water'; the condition uses the dataset's spelling
+    assert query_parser.parse_query("hot water", COLUMNS) == [("amenity_Hot_water", "==", True)]
+
+
+def test_landmark_distances():
+    assert query_parser.parse_query("entire home within 2 km of Siam", COLUMNS) == [
+        ("location", "near", {"place": "Siam", "radius_km": 2}),
+        ("roomTypeCategory", "==", "entire_home"),
+    ]
+    assert query_parser.parse_query("near the Grand Palace", COLUMNS) == [
+        ("location", "near", {"place": "Grand Palace", "radius_km": chat_config.NEAR_RADIUS_KM}),
+    ]
+
+
+@pytest.mark.parametrize("query", [
+    "",
+    "apartment with a view of the river",
+    "2 bedrooms with a view",
+    "something nice",
+    "pool in bangkok",
+    "2 bedrooms in Patong with wifi",
+])
+def test_unparsed_queries_go_to_the_llm(query):
+    assert query_parser.parse_query(query, COLUMNS) is None
+
+
+def test_missing_columns_are_not_parsed():
+    without_coordinates = [column for column in COLUMNS if not column.startswith("location/")]
+    assert query_parser.parse_query("near Siam", without_coordinates) is None
+    assert query_parser.parse_query("wifi", [column for column in COLUMNS if column != "amenity_Wifi"]) is None
+
+
+def test_build_filter_validates(listings):
+    conditions = query_parser.parse_query("1 bed with wifi and hot water under 2000", listings.columns)
+    node = filter_engine.validate(query_parser.build_filter(conditions), listings.columns)
+    assert filter_engine.FilterEngine(listings).evaluate(node).tolist() == [0]
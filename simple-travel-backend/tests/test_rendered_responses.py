@@ -0,0 +1,62 @@
+import gzip
+
+import pytest
+
+import rendered_responses
+from rendered_responses import RenderedResponse, etag_matches
+
+ETAG = '"5d41402abc4b2a76b9719d911017c592-gzip"'
+
+
+@pytest.mark.parametrize("if_none_match, matches", [
+    (ETAG, True),
+    (f"W/{ETAG}", True),
+    (f'"other", {ETAG}', True),
+    (f'"other",W/{ETAG} , "third"', True),
+    ("*", True),
+    (" * ", True),
+    (None, False),
+    ("", False),
+    ('"other"', False),
+    ('"5d41402abc4b2a76b9719d911017c592"', False),
+    (ETAG.strip('"'), False),
+    (f"W/{ETAG.strip(chr(34))}", False),
+])
+def test_etag_matches(if_none_match, matches):
+    assert etag_matches(if_none_match, ETAG) is matches
+
+
+def test_etag_follows_body():
+    first = RenderedResponse(b'{"listings":[]}', 0)
+    assert first.tag == RenderedResponse(b'{"listings":[]}', 5).tag
+    assert first.tag != RenderedResponse(b'{"listings":[1]}', 1).tag
+    # Each encoding is its own representation, with its own ETag
+    assert len({first.etag(), first.etag("gzip"), first.etag("br")}) == 3
+    assert etag_matches(first.etag("gzip"), first.etag("gzip"))
+    assert not etag_matches(first.etag(), first.etag("gzip"))
+
+
+def test_encoded_variants():
+    rendered = RenderedResponse(b'{"listings":[' + b'{"name":"Pool villa"},' * 200 + b'{}]}', 201)
+    assert rendered.encoded() is rendered.body
+    assert gzip.decompress(rendered.encoded("gzip")) == rendered.body
+    assert rendered.encoded("gzip") is rendered.encoded("gzip")
+    rendered.precompress()
+    assert set(rendered._encoded) == set(rendered_responses.ENCODINGS)
+    assert rendered.nbytes() > len(rendered.body)
+
+
+def test_conditional_get():
+    import app
+
+    client = app.app.test_client()
+    first = client.get("/chat?query=firstcall", headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    for if_none_match in (etag, f"W/{etag}", f'"stale", {etag}', "*"):
+        response = client.get("/chat?query=firstcall", headers={"Accept-Encoding": "gzip", "If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert not response.data
+    stale = client.get("/chat?query=firstcall", headers={"Accept-Encoding": "gzip", "If-None-Match": '"stale"'})
+    assert stale.status_code == 200
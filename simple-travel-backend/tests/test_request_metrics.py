@@ -0,0 +1,17 @@
+import json
+import logging
+
+
+def test_request_line_is_logged_at_info(caplog, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "REQUEST_LOG", True)
+    assert app.app.logger.isEnabledFor(logging.INFO)
+    with caplog.at_level(logging.INFO, logger=app.app.logger.name):
+        response = app.app.test_client().get("/chat?query=firstcall")
+    assert response.status_code == 200
+    lines = [record for record in caplog.records if record.getMessage().startswith("request ")]
+    assert [record.levelno for record in lines] == [logging.INFO]
+    record = json.loads(lines[0].getMessage()[len("request "):])
+    assert (record["path"], record["status"]) == ("/chat", 200)
+    assert "load" in record["stages_ms"]
@@ -0,0 +1,92 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import listing_json
+import snapshot
+
+
+def test_unknown_flags_round_trip(tmp_path, listings):
+    path = str(tmp_path / "listings.snapshot")
+    listings["amenity_Wifi"] = [1, 0, None, 1]
+    snapshot.write_snapshot(listings, path)
+    wifi = snapshot.read_snapshot(path)["amenity_Wifi"]
+    assert str(wifi.dtype) == "Int8"
+    assert wifi.isna().tolist() == [False, False, True, False]
+    assert wifi.fillna(-1).tolist() == [1, 0, -1, 1]
+    assert snapshot.read_snapshot(path, rows=np.array([1, 2]))["amenity_Wifi"].isna().tolist() == [False, True]
+
+
+def test_stack_over_plain_int8_flags(tmp_path):
+    path = str(tmp_path / "listings.snapshot")
+    # A base written before flags were nullable stores them as plain int8
+    base = pd.DataFrame({"idStr": np.arange(1, 5), "amenity_Wifi": np.array([1, 0, 1, 1], dtype=np.int8)})
+    snapshot._swap(path, snapshot._write_generation(base, path))
+    snapshot.append_layer(path, pd.DataFrame({"idStr": [5], "amenity_Wifi": [None]}), replaces=np.array([1]))
+    frame = snapshot.read_snapshot(path)
+    assert frame["idStr"].tolist() == [1, 3, 4, 5]
+    assert str(frame["amenity_Wifi"].dtype) == "Int8"
+    assert frame["amenity_Wifi"].isna().tolist() == [False, False, False, True]
+
+
+def test_unknown_flags_render_empty(listings):
+    listings["amenity_Wifi"] = pd.array([1, 0, None, 1], dtype="Int8")
+    serializer = listing_json.ListingSerializer(listings, columns={"idStr": "id", "amenity_Wifi": "wifi"})
+    assert json.loads(serializer.encode(np.arange(4))) == [
+        {"id": "1", "wifi": 1}, {"id": "2", "wifi": 0}, {"id": "3", "wifi": ""}, {"id": "4", "wifi": 1},
+    ]
+    assert json.loads(serializer.encode(np.array([2]), fields=["wifi"])) == [{"wifi": ""}]
+
+
+def generations(path):
+    directory, name = os.path.split(path)
+    return sorted(entry for entry in os.listdir(directory) if entry.startswith(name + ".g"))
+
+
+def test_append_layer_round_trip(tmp_path, listings):
+    path = str(tmp_path / "listings.snapshot")
+    model = np.arange(3.0)
+    snapshot.write_snapshot(listings, path, extras={"row_hash": np.arange(4), "model": model})
+    first = listings.iloc[[1]].assign(name="Quiet garden suite")
+    snapshot.append_layer(path, first, replaces=np.array([1]), extras={"row_hash": np.array([10])},
+                          shared_extras=["model"])
+    assert snapshot.layer_sizes(path) == [4, 1]
+    assert snapshot.read_snapshot(path)["idStr"].tolist() == [1, 3, 4, 2]
+
+    # Positions are in the current stack order: 3 is the row the first delta added
+    second = pd.DataFrame({"idStr": [2, 5], "name": ["Garden suite", "New condo"]})
+    schema = snapshot.append_layer(path, second, replaces=np.array([3]), extras={"row_hash": np.array([20, 21])},
+                                   shared_extras=["model"])
+    assert schema["rows"] == 5 and snapshot.layer_sizes(path) == [4, 1, 2]
+    assert snapshot._live_rows(path, snapshot.read_schema(path)).tolist() == [True, False, True, True, False, True, True]
+    frame = snapshot.read_snapshot(path)
+    assert frame["idStr"].tolist() == [1, 3, 4, 2, 5]
+    assert frame["name"].tolist() == ["Rooftop pool condo", "Riverside loft", "Pool villa", "Garden suite", "New condo"]
+    assert snapshot.read_snapshot(path, ["name"], rows=np.array([4, 0]))["name"].tolist() == ["New condo", "Rooftop pool condo"]
+
+    # Row extras follow the live rows across layers; shared extras come from the base
+    assert snapshot.read_extra(path, "row_hash").tolist() == [0, 2, 3, 20, 21]
+    assert snapshot.read_extra(path, "model").tolist() == model.tolist()
+    snapshot.append_layer(path, pd.DataFrame({"idStr": [6]}), replaces=np.array([], dtype=np.int64))
+    assert snapshot.read_extra(path, "row_hash") is None and snapshot.read_extra(path, "model") is None
+
+
+def test_stale_generations_are_removed(tmp_path, listings):
+    path = str(tmp_path / "listings.snapshot")
+    snapshot.write_snapshot(listings, path)
+    base = generations(path)
+    for idStr in (5, 6):
+        snapshot.append_layer(path, pd.DataFrame({"idStr": [idStr]}), replaces=np.array([], dtype=np.int64))
+    # A stack keeps its layers; the stack it replaced stays for readers that still resolve it
+    stack = os.path.basename(os.path.realpath(path))
+    assert snapshot.read_schema(path)["layers"][0] == base[0]
+    assert len(generations(path)) == 5
+
+    snapshot.write_snapshot(listings, path)
+    assert set(generations(path)) == {os.path.basename(os.path.realpath(path)), stack,
+                                      *snapshot.read_schema(os.path.join(tmp_path, stack))["layers"]}
+    snapshot.write_snapshot(listings, path)
+    assert len(generations(path)) == 2
+    assert len(snapshot.read_snapshot(path)) == 4
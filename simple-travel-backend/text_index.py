@@ -0,0 +1,296 @@
+"""
+Full-text inverted index over listing names, addresses, cities and description sections.
+
+The columns in `chat_config.SEARCH_TEXT_COLUMNS` are tokenized when the dataset loads. Each term keeps a
+posting list (the rows containing it, in row order) with a precomputed BM25 weight, so a query is a few
+binary searches and array gathers instead of a `str.contains` scan over every row. A listing matches when it
+contains every query word; the last word also matches as a prefix, so "sukhu" finds Sukhumvit.
+
+Place names (the comma-separated parts of `chat_config.PLACE_COLUMNS`) are normalized first: administrative
+words are dropped and spellings are folded through `chat_config.PLACE_ALIASES`, so 'Khet Huai Khwang',
+'Huai Khwang' and 'Huaikhwang' share the key `huaikhwang`. Every spelling of a place is indexed as the words
+of its most common one, and a query word (or run of words) that spells a known place is rewritten the same way.
+"""
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import chat_config
+from semantic_index import STOP_WORDS
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_MIN_LENGTH = 3
+# A prefix expands to at most this many terms (the most frequent ones), so "ba" can't touch the whole vocabulary
+PREFIX_MAX_TERMS = 50
+# Longest run of query words joined when looking for a place spelled without spaces ("ao nang" -> aonang)
+PLACE_MAX_WORDS = 3
+# Thai vowel and tone marks are not \w, but they belong inside a word
+WORD = re.compile(r"[\w\u0e31\u0e34-\u0e3a\u0e47-\u0e4e]+")
+PLACE_ADMIN_WORDS = set(chat_config.PLACE_ADMIN_WORDS)
+# Thai administrative words are often written joined to the name ("ตำบลป่าตอง")
+PLACE_ADMIN_PREFIXES = tuple(word for word in chat_config.PLACE_ADMIN_WORDS if len(word) > 1 and not word.isascii())
+
+
+@lru_cache(maxsize=1 << 18)
+def _term(word):
+    if word in STOP_WORDS:
+        return None
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def _words(text):
+    return WORD.findall(text.casefold())
+
+
+def _place_word(word):
+    for prefix in PLACE_ADMIN_PREFIXES:
+        if word.startswith(prefix) and len(word) > len(prefix):
+            word = word[len(prefix):]
+            break
+    if word in PLACE_ADMIN_WORDS:
+        return None
+    return chat_config.PLACE_ALIASES.get(word, word)
+
+
+@lru_cache(maxsize=1 << 16)
+def _place_parts(text):
+    # ((normalized key, words), ...) for each comma-separated part of a place column value
+    parts = []
+    for part in text.split(','):
+        words = tuple(word for word in map(_place_word, _words(part)) if word)
+        if len(words) > 1 and words[0] + words[1] in PLACE_ADMIN_WORDS:
+            # Two-word administrative terms, e.g. "Chang Wat"
+            words = words[2:]
+        if words:
+            key = ''.join(words)
+            parts.append((chat_config.PLACE_ALIASES.get(key, key), words))
+    return tuple(parts)
+
+
+@lru_cache(maxsize=1 << 16)
+def place_key(value):
+    """
+    Returns the normalized key of a place name, e.g. 'Khet Huai Khwang,' -> 'huaikhwang' ('' when empty).
+
+    Only the first (most specific) comma-separated part counts: 'Kamala, Kathu' -> 'kamala'.
+    """
+    if not isinstance(value, str):
+        return ''
+    parts = _place_parts(value)
+    return parts[0][0] if parts else ''
+
+
+class TextIndex:
+    """
+    BM25 inverted index over the text columns of one listings frame.
+
+    Parameters:
+        frame (pd.DataFrame): Listings frame.
+    """
+
+    def __init__(self, frame):
+        self.size = len(frame)
+        fields = [(col, weight) for col, weight in chat_config.SEARCH_TEXT_COLUMNS.items() if col in frame.columns]
+        place_columns = {col for col in chat_config.PLACE_COLUMNS if col in frame.columns}
+        self.places = self._place_spellings(frame, place_columns)
+        self.place_keys = {col: self._column_place_keys(frame[col]) for col in place_columns}
+
+        vocabulary = {}
+        term_ids, frequencies = array('q'), array('d')
+        doc_terms = np.zeros(self.size, dtype=np.int64)
+        lengths = np.zeros(self.size)
+        columns = [frame[col].tolist() for col, _ in fields]
+        for doc, values in enumerate(zip(*columns)):
+            counts = Counter()
+            for (col, weight), value in zip(fields, values):
+                if not isinstance(value, str) or not value:
+                    continue
+                if col in place_columns:
+                    terms = [term for key, _ in _place_parts(value) for term in self.places[key]]
+                else:
+                    terms = filter(None, map(_term, _words(value)))
+                if weight == 1:
+                    counts.update(terms)
+                else:
+                    for term, count in Counter(terms).items():
+                        counts[term] += count * weight
+            lengths[doc] = sum(counts.values())
+            doc_terms[doc] = len(counts)
+            term_ids.extend([vocabulary.setdefault(term, len(vocabulary)) for term in counts])
+            frequencies.extend(counts.values())
+        doc_ids = np.repeat(np.arange(self.size), doc_terms)
+
+        # Terms are numbered in sorted order so a prefix is one contiguous id range
+        self.terms = sorted(vocabulary)
+        rank = np.empty(len(vocabulary), dtype=np.int64)
+        rank[[vocabulary[term] for term in self.terms]] = np.arange(len(self.terms))
+        term_ids = rank[np.frombuffer(term_ids, dtype=np.int64)] if len(term_ids) else np.zeros(0, dtype=np.int64)
+        order = np.argsort(term_ids, kind='stable')
+        self.postings = doc_ids[order].astype(np.int32)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(term_ids, minlength=len(self.terms)))])
+        document_frequency = np.diff(self.offsets)
+        idf = np.log(1 + (self.size - document_frequency + 0.5) / (document_frequency + 0.5))
+        tf = np.frombuffer(frequencies, dtype=np.float64)[order] if len(order) else np.zeros(0)
+        average_length = lengths.mean() if self.size and lengths.any() else 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[self.postings] / average_length)
+        self.weights = (np.repeat(idf, document_frequency) * tf * (BM25_K1 + 1) / (tf + norm)).astype(np.float32)
+
+    @staticmethod
+    def _place_spellings(frame, place_columns):
+        # Normalized place key -> terms of its most common spelling, preferring one that isn't an alias
+        spellings = {}
+        for col in place_columns:
+            for value, count in frame[col].value_counts().items():
+                if isinstance(value, str):
+                    for key, words in _place_parts(value):
+                        spellings.setdefault(key, Counter())[words] += count
+        places = {}
+        for key, counts in spellings.items():
+            unaliased = Counter({words: count for words, count in counts.items() if ''.join(words) == key})
+            words = (unaliased or counts).most_common(1)[0][0]
+            places[key] = tuple(term for term in map(_term, words) if term is not None) or words
+        return places
+
+    @staticmethod
+    def _column_place_keys(values):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # One key per category, looked up by code (-1, missing, picks the appended '')
+            keys = [place_key(value) for value in values.cat.categories]
+            return np.array(keys + [''], dtype=object)[values.cat.codes.to_numpy()]
+        keys = pd.Series(values.unique())
+        lookup = dict(zip(keys, keys.map(place_key)))
+        return np.array([lookup[value] if isinstance(value, str) else '' for value in values], dtype=object)
+
+    def query_terms(self, text):
+        """
+        Returns the index terms of a query: stop words and administrative words are dropped, and runs of
+        words that spell a known place become that place's terms.
+        """
+        words = _words(text)
+        terms = []
+        position = 0
+        while position < len(words):
+            for length in range(min(PLACE_MAX_WORDS, len(words) - position), 0, -1):
+                key = ''.join(word for word in map(_place_word, words[position:position + length]) if word)
+                place = self.places.get(chat_config.PLACE_ALIASES.get(key, key)) if key else None
+                if place is not None:
+                    terms.extend(place)
+                    position += length
+                    break
+            else:
+                word = words[position]
+                term = None if word in PLACE_ADMIN_WORDS else _term(word)
+                if term is not None:
+                    terms.append(term)
+                position += 1
+        return list(dict.fromkeys(terms))
+
+    def _term_range(self, term, prefix):
+        start = bisect_left(self.terms, term)
+        if not prefix or len(term) < PREFIX_MIN_LENGTH:
+            exact = start < len(self.terms) and self.terms[start] == term
+            return [start] if exact else []
+        stop = bisect_left(self.terms, term + '\U0010ffff', lo=start)
+        ids = list(range(start, stop))
+        if len(ids) > PREFIX_MAX_TERMS:
+            frequency = self.offsets[np.array(ids) + 1] - self.offsets[ids]
+            ids = sorted(np.array(ids)[np.argsort(-frequency, kind='stable')[:PREFIX_MAX_TERMS]].tolist())
+        return ids
+
+    def _postings(self, term_id):
+        start, stop = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.postings[start:stop], self.weights[start:stop]
+
+    def _union(self, ids):
+        # (sorted rows, scores) of a term's ids; a row matching several prefix terms keeps its best score
+        if len(ids) == 1:
+            return self._postings(ids[0])
+        if not ids:
+            return self.postings[:0], self.weights[:0]
+        rows = np.concatenate([self._postings(term_id)[0] for term_id in ids])
+        scores = np.concatenate([self._postings(term_id)[1] for term_id in ids])
+        order = np.argsort(rows, kind='stable')
+        rows, scores = rows[order], scores[order]
+        starts = np.flatnonzero(np.concatenate([[True], rows[1:] != rows[:-1]]))
+        return rows[starts], np.maximum.reduceat(scores, starts)
+
+    def _probe(self, ids, rows):
+        # Looks `rows` up in each posting list of a term instead of building the union of a long prefix
+        found = np.zeros(len(rows), dtype=bool)
+        best = np.zeros(len(rows))
+        for term_id in ids:
+            postings, weights = self._postings(term_id)
+            positions = np.minimum(np.searchsorted(postings, rows), len(postings) - 1)
+            hit = postings[positions] == rows
+            found |= hit
+            best[hit] = np.maximum(best[hit], weights[positions[hit]])
+        return found, best
+
+    def _score(self, text, rows=None):
+        """
+        Returns (sorted rows containing every query term, BM25 scores), or None when the query has no terms.
+        """
+        terms = self.query_terms(text)
+        if not terms:
+            return None
+        # Shortest posting lists first, so each later term only probes the rows still matching
+        ranges = [self._term_range(term, prefix=position == len(terms) - 1) for position, term in enumerate(terms)]
+        sizes = [sum(int(self.offsets[term_id + 1] - self.offsets[term_id]) for term_id in ids) for ids in ranges]
+        ranges = [ids for _, ids in sorted(zip(sizes, ranges), key=lambda item: item[0])]
+        restricted = rows is not None and len(rows) != self.size
+        if restricted and len(rows) < min(sizes):
+            matched, scores = np.asarray(rows, dtype=np.int64), np.zeros(len(rows))
+        else:
+            matched, scores = self._union(ranges.pop(0))
+            matched, scores = matched.astype(np.int64), scores.astype(np.float64)
+            if restricted and len(rows):
+                positions = np.minimum(np.searchsorted(rows, matched), len(rows) - 1)
+                found = rows[positions] == matched
+                matched, scores = matched[found], scores[found]
+            elif restricted:
+                matched, scores = matched[:0], scores[:0]
+        for ids in ranges:
+            if not len(matched):
+                break
+            found, best = self._probe(ids, matched)
+            matched, scores = matched[found], scores[found] + best[found]
+        return matched, scores
+
+    def match(self, text, rows=None):
+        """
+        Returns the sorted rows (within `rows`, if given) that contain every word of `text`; an empty query
+        matches all of them.
+        """
+        scored = self._score(text, rows)
+        if scored is None:
+            return np.arange(self.size) if rows is None else rows
+        return scored[0]
+
+    def search(self, text, rows=None, limit=None):
+        """
+        Ranks the rows matching `text` by BM25 score, best first (ties in row order).
+
+        Returns:
+            tuple: (rows, scores, total): the best `limit` matches as NumPy arrays, and the number of matches.
+        """
+        scored = self._score(text, rows)
+        if scored is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0), 0
+        matched, scores = scored
+        total = len(matched)
+        if limit is not None and limit < total:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            matched, scores = matched[top], scores[top]
+        order = np.lexsort((matched, -scores))
+        return matched[order], scores[order], total
+
+    def nbytes(self):
+        return int(self.postings.nbytes + self.weights.nbytes + self.offsets.nbytes)
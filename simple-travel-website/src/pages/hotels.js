@@ -18,24 +18,30 @@ export default function Hotels() {
   const [currentPage, setCurrentPage] = useState(1);
   const [hotelsPerPage] = useState(10);
   const [filters, setFilters] = useState([]);
+  const [totalHotels, setTotalHotels] = useState(0);
+  const [cursor, setCursor] = useState(null);
   const [placeholderIndex, setPlaceholderIndex] = useState(0);
   const [errorMessage, setErrorMessage] = useState('');
 
-  // Function to fetch hotels
-  const fetchHotels = async (userInput) => {
+  // Function to fetch hotels: a new query, or another page of the previous one when a cursor is given
+  const fetchHotels = async (userInput, pageNumber = 1, pageCursor = null) => {
     setLoading(true);
     setErrorMessage('');
-    setCurrentPage(1);
+    setCurrentPage(pageNumber);
     try {
-      const response = await fetch(`${API_BASE_URL}/chat`, {
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        method: 'POST',
-        body: JSON.stringify({
-            query: userInput
-        })
-      });
+      const params = pageCursor
+        ? { cursor: pageCursor, page: pageNumber }
+        : { query: userInput, page: pageNumber, page_size: hotelsPerPage };
+      // The initial listings and follow-up pages are the same for everyone: GET lets the browser and CDN cache them
+      const response = pageCursor || userInput === 'firstcall'
+        ? await fetch(`${API_BASE_URL}/chat?${new URLSearchParams(params)}`)
+        : await fetch(`${API_BASE_URL}/chat`, {
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            method: 'POST',
+            body: JSON.stringify(params)
+          });
       const data = await response.json();
       if (!response.ok) {
         setErrorMessage(data?.error?.message || 'Search failed. Please try again.');
@@ -57,10 +63,14 @@ export default function Hotels() {
         roomType: item.room_type,
     })));
       setFilters(data.filters || []);
+      setTotalHotels(data.total || 0);
+      setCursor(data.cursor || null);
     } catch (error) {
       console.error('Error:', error);
       setHotels([]);
       setFilters([]);
+      setTotalHotels(0);
+      setCursor(null);
       setErrorMessage('Backend unavailable. Make sure the backend is running on port 8001.');
     } finally {
       setLoading(false);
@@ -91,11 +101,10 @@ export default function Hotels() {
     fetchHotels(search.trim() || "firstcall");
   };
 
-  // Pagination logic
-  const indexOfLastHotel = currentPage * hotelsPerPage;
-  const indexOfFirstHotel = indexOfLastHotel - hotelsPerPage;
-  const currentHotels = hotels.slice(indexOfFirstHotel, indexOfLastHotel);
-  const paginate = pageNumber => setCurrentPage(pageNumber);
+  // Pagination logic: the backend returns one page at a time, later pages reuse its cursor
+  const currentHotels = hotels;
+  const pageCount = Math.ceil(totalHotels / hotelsPerPage);
+  const paginate = pageNumber => fetchHotels(null, pageNumber, cursor);
 
   return (
     <>
@@ -171,7 +180,7 @@ export default function Hotels() {
             )}
           </section>
 
-          {hotels.length > hotelsPerPage && (
+          {totalHotels > hotelsPerPage && (
             <div className="mt-6 flex flex-wrap items-center justify-center gap-2">
               <button
                 onClick={() => paginate(currentPage - 1)}
@@ -180,7 +189,7 @@ export default function Hotels() {
               >
                 Previous
               </button>
-              {Array.from({ length: Math.ceil(hotels.length / hotelsPerPage) }, (_, index) => (
+              {Array.from({ length: pageCount }, (_, index) => (
                 <button
                   key={index + 1}
                   onClick={() => paginate(index + 1)}
@@ -195,7 +204,7 @@ export default function Hotels() {
               ))}
               <button
                 onClick={() => paginate(currentPage + 1)}
-                disabled={currentPage === Math.ceil(hotels.length / hotelsPerPage)}
+                disabled={currentPage === pageCount}
                 className="rounded-lg border border-slate-300 bg-white px-3 py-2 text-sm disabled:opacity-50"
               >
                 Next